@@ -0,0 +1,216 @@
+"""
+Anti-cheat signature index for the SteamOKAutomaticScript.
+Kernel anti-cheats block the DLL injection, so games shipping one are
+rejected as soon as their files show up. The folder, DLL and driver names of
+each vendor are compiled into one lookup table plus one regular expression,
+so a single os.scandir pass over a game folder (or the incremental download
+scanner) tells which vendor, if any, protects the game.
+"""
+import os
+import re
+import time
+import logging
+import threading
+
+# Get logger
+logger = logging.getLogger()
+
+# Vendor -> folder names, file names and file name patterns (case-insensitive)
+ANTICHEAT_SIGNATURES = {
+    'EasyAntiCheat': {
+        'dirs': ['EasyAntiCheat', 'EasyAntiCheat_EOS'],
+        'files': ['EasyAntiCheat.exe', 'EasyAntiCheat.sys', 'EasyAntiCheat_x64.dll', 'EasyAntiCheat_x86.dll',
+                  'EasyAntiCheat_EOS.exe', 'EasyAntiCheat_EOS.sys', 'EasyAntiCheat_Setup.exe',
+                  'EasyAntiCheat_EOS_Setup.exe', 'start_protected_game.exe'],
+        'patterns': [],
+    },
+    'BattlEye': {
+        'dirs': ['BattlEye'],
+        'files': ['BEService.exe', 'BEService_x64.exe', 'BEClient.dll', 'BEClient_x64.dll', 'BEDaisy.sys'],
+        # Launchers that start the game under BattlEye, e.g. DayZ_BE.exe
+        'patterns': [r'.+_BE\.exe'],
+    },
+    'nProtect GameGuard': {
+        'dirs': ['GameGuard'],
+        'files': ['GameMon.des', 'GameMon64.des', 'npggNT.des', 'npggNT64.des', 'GameGuard.des', 'npgmup.des'],
+        'patterns': [],
+    },
+    'Denuvo Anti-Cheat': {
+        'dirs': ['Denuvo Anti-Cheat'],
+        'files': ['denuvo-anti-cheat.sys', 'denuvo-anti-cheat.exe', 'denuvo-anti-cheat-update-service.exe',
+                  'denuvo-anti-cheat-crash-report.exe'],
+        'patterns': [],
+    },
+    'XIGNCODE3': {
+        'dirs': ['XIGNCODE'],
+        'files': ['x3.xem', 'xcorona.xem', 'xcorona_x64.xem', 'xhunter1.sys', 'xhunters.log'],
+        'patterns': [],
+    },
+    'Anti-Cheat Expert': {
+        'dirs': ['AntiCheatExpert'],
+        'files': ['ACE-Base.sys', 'ACE-BASE64.sys', 'SGuard64.exe'],
+        'patterns': [],
+    },
+    'mhyprot': {
+        'dirs': [],
+        'files': ['mhyprot.sys', 'mhyprot2.sys', 'mhyprot3.sys'],
+        'patterns': [],
+    },
+    'PunkBuster': {
+        'dirs': [],
+        'files': ['PnkBstrA.exe', 'PnkBstrB.exe', 'pbsvc.exe'],
+        'patterns': [],
+    },
+    'Vanguard': {
+        'dirs': [],
+        'files': ['vgk.sys', 'vgc.exe'],
+        'patterns': [],
+    },
+}
+
+# Global index storage
+_index = None
+_index_lock = threading.Lock()
+
+
+class AntiCheatScan:
+    """
+    Result of scanning a folder for anti-cheat signatures.
+    """
+
+    def __init__(self, root, found, examined, elapsed):
+        """
+        Args:
+            root: Scanned folder
+            found: Vendor -> first matching path
+            examined: Directory entries looked at
+            elapsed: Seconds the scan took
+        """
+        self.root = root
+        self.found = found
+        self.examined = examined
+        self.elapsed = elapsed
+
+    @property
+    def vendor(self):
+        """The first vendor found, or None"""
+        return next(iter(self.found), None)
+
+    @property
+    def path(self):
+        """Matching path of the first vendor found, or None"""
+        return self.found[self.vendor] if self.found else None
+
+    def __bool__(self):
+        return bool(self.found)
+
+    def __repr__(self):
+        return f"AntiCheatScan({self.root}, found={self.found}, examined={self.examined}, {self.elapsed * 1000:.1f}ms)"
+
+
+class AntiCheatIndex:
+    """
+    Compiled anti-cheat signatures: exact folder and file names in dictionaries,
+    all name patterns in one regular expression.
+    """
+
+    def __init__(self, signatures=None):
+        """
+        Args:
+            signatures: Vendor -> {'dirs', 'files', 'patterns'} (defaults to ANTICHEAT_SIGNATURES)
+        """
+        signatures = ANTICHEAT_SIGNATURES if signatures is None else signatures
+        self.vendors = list(signatures)
+        self._dirs = {}
+        self._files = {}
+        self._group_vendors = {}
+        alternatives = []
+        for vendor, signature in signatures.items():
+            for name in signature.get('dirs') or []:
+                self._dirs.setdefault(name.lower(), vendor)
+            for name in signature.get('files') or []:
+                self._files.setdefault(name.lower(), vendor)
+            patterns = signature.get('patterns') or []
+            if patterns:
+                group = f"v{len(self._group_vendors)}"
+                self._group_vendors[group] = vendor
+                alternatives.append(f"(?P<{group}>{'|'.join(f'(?:{pattern})' for pattern in patterns)})")
+        self._pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def match(self, name, is_dir):
+        """
+        Look up one directory entry.
+
+        Args:
+            name: Entry name
+            is_dir: Whether the entry is a directory
+
+        Returns:
+            str: The vendor the entry belongs to, or None
+        """
+        lowered = name.lower()
+        vendor = (self._dirs if is_dir else self._files).get(lowered)
+        if vendor is None and not is_dir and self._pattern is not None:
+            match = self._pattern.fullmatch(name)
+            if match:
+                vendor = self._group_vendors[match.lastgroup]
+        return vendor
+
+    def scan(self, root, stop_at_first=False):
+        """
+        Scan a folder tree in one os.scandir pass.
+
+        Args:
+            root: Folder to scan
+            stop_at_first: Return as soon as one vendor is found
+
+        Returns:
+            AntiCheatScan: Vendors found (in the order they were met) and the cost of the scan
+        """
+        start = time.perf_counter()
+        found = {}
+        examined = 0
+        pending = [root]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        examined += 1
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        vendor = self.match(entry.name, is_dir)
+                        if vendor is not None and vendor not in found:
+                            found[vendor] = entry.path
+                            if stop_at_first:
+                                return AntiCheatScan(root, found, examined, time.perf_counter() - start)
+                        if is_dir:
+                            pending.append(entry.path)
+            except OSError as e:
+                logger.debug(f"Could not list {current}: {str(e)}")
+        return AntiCheatScan(root, found, examined, time.perf_counter() - start)
+
+
+def get_anticheat_index(config):
+    """
+    Get the process-wide anti-cheat index, with any extra signatures from anticheat.signatures.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        AntiCheatIndex: The compiled index
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            signatures = {vendor: dict(signature) for vendor, signature in ANTICHEAT_SIGNATURES.items()}
+            extra = (config.get('anticheat') or {}).get('signatures') or {}
+            for vendor, signature in extra.items():
+                merged = signatures.setdefault(vendor, {'dirs': [], 'files': [], 'patterns': []})
+                for key in ('dirs', 'files', 'patterns'):
+                    merged[key] = list(merged.get(key) or []) + list(signature.get(key) or [])
+            _index = AntiCheatIndex(signatures)
+    return _index
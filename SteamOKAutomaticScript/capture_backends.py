@@ -0,0 +1,434 @@
+"""
+Live screen capture backends for the SteamOKAutomaticScript.
+pyautogui.screenshot() goes through PIL ImageGrab and its conversions; the
+backends here grab straight into NumPy arrays:
+  - pyautogui: the original path, kept as the baseline
+  - pil: PIL ImageGrab without pyautogui's wrapping
+  - mss: the mss library (GDI BitBlt on Windows, XGetImage on Linux)
+  - xshm: X11 MIT shared-memory capture via ctypes, for Linux rigs running
+          under a (virtual) X server, e.g. Xvfb
+The live screen source grabs through the backend selected in the configuration.
+"""
+import sys
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+import numpy as np
+
+# Get logger
+logger = logging.getLogger()
+
+# Optional backends
+try:
+    from PIL import ImageGrab
+    PIL_GRAB_AVAILABLE = True
+except ImportError:
+    PIL_GRAB_AVAILABLE = False
+
+try:
+    import mss
+    MSS_AVAILABLE = True
+except ImportError:
+    MSS_AVAILABLE = False
+
+# Order in which "auto" tries the backends
+AUTO_ORDER = ('xshm', 'mss', 'pil', 'pyautogui')
+
+# Shared memory images kept per XShmCapture (one per captured size)
+MAX_SHM_IMAGES = 8
+
+# Loaded X11 libraries (False once loading has failed)
+_x11_libraries = None
+
+
+class PyautoguiCapture:
+    """
+    pyautogui.screenshot(), the capture path used before the backends existed.
+    """
+    name = 'pyautogui'
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def grab(self, region=None):
+        """
+        Capture the screen.
+
+        Args:
+            region: Optional (left, top, width, height) to capture instead of the whole screen
+
+        Returns:
+            numpy.ndarray: RGB frame of the captured area
+        """
+        import pyautogui as pg
+
+        return np.asarray(pg.screenshot(region=region))
+
+    def close(self):
+        pass
+
+
+class PILCapture:
+    """
+    PIL ImageGrab directly, skipping pyautogui's wrapper.
+    """
+    name = 'pil'
+
+    @classmethod
+    def available(cls):
+        return PIL_GRAB_AVAILABLE
+
+    def grab(self, region=None):
+        bbox = None
+        if region is not None:
+            left, top, width, height = region
+            bbox = (left, top, left + width, top + height)
+        image = ImageGrab.grab(bbox=bbox)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return np.asarray(image)
+
+    def close(self):
+        pass
+
+
+class MSSCapture:
+    """
+    Capture through mss. mss handles are not thread-safe, so every thread
+    (e.g. the frame capture thread) gets its own.
+    """
+    name = 'mss'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @classmethod
+    def available(cls):
+        return MSS_AVAILABLE
+
+    def _handle(self):
+        if getattr(self._local, 'handle', None) is None:
+            self._local.handle = mss.mss()
+        return self._local.handle
+
+    def grab(self, region=None):
+        handle = self._handle()
+        if region is None:
+            # Primary monitor, like pyautogui
+            monitor = handle.monitors[1]
+        else:
+            left, top, width, height = region
+            monitor = {'left': left, 'top': top, 'width': width, 'height': height}
+        # mss delivers BGRA
+        return np.ascontiguousarray(np.asarray(handle.grab(monitor))[:, :, 2::-1])
+
+    def close(self):
+        handle = getattr(self._local, 'handle', None)
+        if handle is not None:
+            handle.close()
+            self._local.handle = None
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+class _XImage(ctypes.Structure):
+    # Leading fields of Xlib's XImage; only these are read
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+    ]
+
+
+class _XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('resourceid', ctypes.c_ulong),
+        ('serial', ctypes.c_ulong),
+        ('error_code', ctypes.c_ubyte),
+        ('request_code', ctypes.c_ubyte),
+        ('minor_code', ctypes.c_ubyte),
+    ]
+
+
+_X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(_XErrorEvent))
+
+# X errors reported since the last check: Xlib's default handler would exit the
+# whole process, before any Python code could fall back to another backend
+_x_errors = []
+
+
+@_X_ERROR_HANDLER
+def _record_x_error(display, event):
+    _x_errors.append((event.contents.error_code, event.contents.request_code, event.contents.minor_code))
+    return 0
+
+
+def _raise_x_errors():
+    """Raise the first X error reported since the last check, if any"""
+    if not _x_errors:
+        return
+    error_code, request_code, minor_code = _x_errors[0]
+    _x_errors.clear()
+    raise RuntimeError(f"X error {error_code} on request {request_code}.{minor_code}")
+
+
+def _load_x11():
+    """Load libX11, libXext and libc with the prototypes XShmCapture needs, or return None"""
+    global _x11_libraries
+    if _x11_libraries is None:
+        _x11_libraries = _open_x11() or False
+    return _x11_libraries or None
+
+
+def _open_x11():
+    if not sys.platform.startswith('linux'):
+        return None
+    x11_path = ctypes.util.find_library('X11')
+    xext_path = ctypes.util.find_library('Xext')
+    if not x11_path or not xext_path:
+        return None
+    try:
+        x11 = ctypes.CDLL(x11_path)
+        xext = ctypes.CDLL(xext_path)
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    except OSError:
+        return None
+
+    display_p = ctypes.c_void_p
+    image_p = ctypes.POINTER(_XImage)
+    x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    x11.XOpenDisplay.restype = display_p
+    x11.XCloseDisplay.argtypes = [display_p]
+    x11.XDefaultScreen.argtypes = [display_p]
+    x11.XDefaultScreen.restype = ctypes.c_int
+    x11.XRootWindow.argtypes = [display_p, ctypes.c_int]
+    x11.XRootWindow.restype = ctypes.c_ulong
+    x11.XDefaultVisual.argtypes = [display_p, ctypes.c_int]
+    x11.XDefaultVisual.restype = ctypes.c_void_p
+    x11.XDefaultDepth.argtypes = [display_p, ctypes.c_int]
+    x11.XDefaultDepth.restype = ctypes.c_int
+    x11.XDisplayWidth.argtypes = [display_p, ctypes.c_int]
+    x11.XDisplayHeight.argtypes = [display_p, ctypes.c_int]
+    x11.XSync.argtypes = [display_p, ctypes.c_int]
+    x11.XFree.argtypes = [ctypes.c_void_p]
+    x11.XSetErrorHandler.argtypes = [_X_ERROR_HANDLER]
+    x11.XSetErrorHandler.restype = ctypes.c_void_p
+    xext.XShmQueryExtension.argtypes = [display_p]
+    xext.XShmQueryExtension.restype = ctypes.c_int
+    xext.XShmCreateImage.argtypes = [
+        display_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+        ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint
+    ]
+    xext.XShmCreateImage.restype = image_p
+    xext.XShmAttach.argtypes = [display_p, ctypes.POINTER(_XShmSegmentInfo)]
+    xext.XShmDetach.argtypes = [display_p, ctypes.POINTER(_XShmSegmentInfo)]
+    xext.XShmGetImage.argtypes = [display_p, ctypes.c_ulong, image_p, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+    xext.XShmGetImage.restype = ctypes.c_int
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmget.restype = ctypes.c_int
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    x11.XSetErrorHandler(_record_x_error)
+    return x11, xext, libc
+
+
+class _ShmImage:
+    """An XImage of one size backed by a System V shared memory segment"""
+
+    def __init__(self, capture, width, height):
+        x11, xext, libc = capture.libraries
+        self.capture = capture
+        self.width = width
+        self.height = height
+        self.info = _XShmSegmentInfo()
+        self.image = xext.XShmCreateImage(
+            capture.display, capture.visual, capture.depth, 2,  # ZPixmap
+            None, ctypes.byref(self.info), width, height
+        )
+        if not self.image:
+            raise RuntimeError("XShmCreateImage failed")
+        if self.image.contents.bits_per_pixel != 32:
+            x11.XFree(self.image)
+            raise RuntimeError(f"Unsupported X visual with {self.image.contents.bits_per_pixel} bits per pixel")
+        size = self.image.contents.bytes_per_line * height
+        # Owner-only: the segment holds screen contents other local users must not read
+        self.info.shmid = libc.shmget(0, size, 0o1600)  # IPC_PRIVATE, IPC_CREAT | 0600
+        if self.info.shmid < 0:
+            error = ctypes.get_errno()
+            x11.XFree(self.image)
+            raise OSError(error, "shmget failed")
+        address = libc.shmat(self.info.shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            error = ctypes.get_errno()
+            libc.shmctl(self.info.shmid, 0, None)
+            x11.XFree(self.image)
+            raise OSError(error, "shmat failed")
+        self.info.shmaddr = address
+        self.info.readOnly = 0
+        self.image.contents.data = address
+        xext.XShmAttach(capture.display, ctypes.byref(self.info))
+        x11.XSync(capture.display, 0)
+        # Marked for removal now; the kernel frees it once both sides have detached
+        libc.shmctl(self.info.shmid, 0, None)  # IPC_RMID
+        if _x_errors:
+            libc.shmdt(ctypes.c_void_p(address))
+            x11.XFree(self.image)
+            _raise_x_errors()
+        self.pixels = np.ctypeslib.as_array(
+            (ctypes.c_ubyte * size).from_address(address)
+        ).reshape(height, self.image.contents.bytes_per_line // 4, 4)
+
+    def grab(self, left, top):
+        x11, xext, _ = self.capture.libraries
+        if not xext.XShmGetImage(self.capture.display, self.capture.root, self.image, left, top, 0xFFFFFFFF):
+            _raise_x_errors()
+            raise RuntimeError("XShmGetImage failed")
+        # 32-bit ZPixmap on little-endian X servers is BGRX
+        return np.ascontiguousarray(self.pixels[:, :self.width, 2::-1])
+
+    def close(self):
+        x11, xext, libc = self.capture.libraries
+        xext.XShmDetach(self.capture.display, ctypes.byref(self.info))
+        libc.shmdt(ctypes.c_void_p(self.info.shmaddr))
+        # The XImage structure was allocated by Xlib; the pixel data was ours
+        x11.XFree(self.image)
+
+
+class XShmCapture:
+    """
+    X11 MIT-SHM capture: the X server copies the screen straight into shared
+    memory that is exposed to NumPy without another copy.
+    """
+    name = 'xshm'
+
+    def __init__(self, display_name=None):
+        """
+        Args:
+            display_name: X display to capture (defaults to $DISPLAY)
+        """
+        self.libraries = _load_x11()
+        if self.libraries is None:
+            raise RuntimeError("libX11/libXext not available")
+        x11, xext, _ = self.libraries
+        self.display = x11.XOpenDisplay(display_name.encode() if display_name else None)
+        if not self.display:
+            raise RuntimeError(f"Cannot open X display {display_name or '$DISPLAY'}")
+        if not xext.XShmQueryExtension(self.display):
+            x11.XCloseDisplay(self.display)
+            raise RuntimeError("X server has no MIT-SHM extension")
+        screen = x11.XDefaultScreen(self.display)
+        self.root = x11.XRootWindow(self.display, screen)
+        self.visual = x11.XDefaultVisual(self.display, screen)
+        self.depth = x11.XDefaultDepth(self.display, screen)
+        self.screen_size = (x11.XDisplayWidth(self.display, screen), x11.XDisplayHeight(self.display, screen))
+        self._images = {}
+        # Xlib connections are not thread-safe
+        self._lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        return _load_x11() is not None
+
+    def grab(self, region=None):
+        left, top, width, height = region or (0, 0, self.screen_size[0], self.screen_size[1])
+        # XShmGetImage fails with BadMatch outside the root window (e.g. a window
+        # hanging over the screen edge): grab the on-screen part and pad the rest black
+        grab_left, grab_top = max(left, 0), max(top, 0)
+        grab_right = min(left + width, self.screen_size[0])
+        grab_bottom = min(top + height, self.screen_size[1])
+        if grab_right <= grab_left or grab_bottom <= grab_top:
+            return np.zeros((height, width, 3), dtype=np.uint8)
+        grab_size = (grab_right - grab_left, grab_bottom - grab_top)
+        with self._lock:
+            image = self._images.get(grab_size)
+            if image is None:
+                if len(self._images) >= MAX_SHM_IMAGES:
+                    self._close_images()
+                image = self._images[grab_size] = _ShmImage(self, *grab_size)
+            pixels = image.grab(grab_left, grab_top)
+        if grab_size == (width, height):
+            return pixels
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        frame[grab_top - top:grab_bottom - top, grab_left - left:grab_right - left] = pixels
+        return frame
+
+    def _close_images(self):
+        for image in self._images.values():
+            image.close()
+        self._images.clear()
+
+    def close(self):
+        with self._lock:
+            if self.display:
+                self._close_images()
+                self.libraries[0].XCloseDisplay(self.display)
+                self.display = None
+
+
+# Backend name -> class
+CAPTURE_BACKENDS = {
+    backend.name: backend for backend in (PyautoguiCapture, PILCapture, MSSCapture, XShmCapture)
+}
+
+
+def available_backends():
+    """Names of the backends whose libraries are present"""
+    return [name for name, backend in CAPTURE_BACKENDS.items() if backend.available()]
+
+
+def create_capture_backend(name='auto', display=None):
+    """
+    Create a capture backend.
+
+    Args:
+        name: Backend name from CAPTURE_BACKENDS, or "auto" for the first of AUTO_ORDER that starts
+        display: X display the xshm backend captures (defaults to $DISPLAY)
+
+    Returns:
+        The backend instance
+    """
+    candidates = AUTO_ORDER if name == 'auto' else (name,)
+    for candidate in candidates:
+        backend = CAPTURE_BACKENDS.get(candidate)
+        if backend is None:
+            raise ValueError(f"Unknown capture backend {candidate}")
+        if not backend.available():
+            if name != 'auto':
+                logger.warning(f"Capture backend {candidate} is not available, using pyautogui")
+            continue
+        instance = None
+        try:
+            instance = backend(display) if backend is XShmCapture else backend()
+            # Probe grab: some backends only fail once they talk to the display
+            instance.grab((0, 0, 1, 1))
+        except Exception as e:
+            logger.warning(f"Capture backend {candidate} failed to start: {str(e)}")
+            if instance is not None:
+                instance.close()
+            continue
+        logger.info(f"Using {candidate} screen capture")
+        return instance
+    return PyautoguiCapture()
@@ -0,0 +1,142 @@
+"""
+Screen capture benchmark for the SteamOKAutomaticScript.
+Grabs frames with every available capture backend at several region sizes and
+reports frames per second and latency percentiles, to pick
+screen_source.live.capture_backend for a rig.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+
+import pyautogui as pg
+
+from config import get_config, load_config
+from logger import setup_logging
+from capture_backends import CAPTURE_BACKENDS, available_backends, create_capture_backend
+from template_benchmark import latency_summary
+
+# Get logger
+logger = logging.getLogger()
+
+# Region sizes benchmarked besides the full screen
+DEFAULT_REGION_SIZES = ['1920x1080', '1280x720', '640x360', '200x50']
+
+
+def parse_size(text):
+    """Parse a WIDTHxHEIGHT region size"""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def benchmark_backend(backend, regions, frames, warmup=3):
+    """
+    Time repeated grabs of each region with one backend.
+
+    Args:
+        backend: Capture backend instance
+        regions: Region label -> (left, top, width, height) or None for the full screen
+        frames: Grabs timed per region
+        warmup: Untimed grabs per region first (allocations, first-call setup)
+
+    Returns:
+        dict: Region label -> fps, latency summary and captured frame shape
+    """
+    results = {}
+    for label, region in regions.items():
+        for _ in range(warmup):
+            backend.grab(region)
+        samples = []
+        shape = None
+        start = time.perf_counter()
+        for _ in range(frames):
+            grab_start = time.perf_counter()
+            shape = backend.grab(region).shape
+            samples.append(time.perf_counter() - grab_start)
+        total = time.perf_counter() - start
+        results[label] = {
+            'fps': round(frames / total, 1) if total > 0 else None,
+            'latency_ms': latency_summary(samples),
+            'shape': list(shape),
+        }
+    return results
+
+
+def run_benchmark(backends=None, sizes=None, frames=50, display=None):
+    """
+    Benchmark the capture backends.
+
+    Args:
+        backends: Backend names (defaults to every available one)
+        sizes: Region sizes as (width, height), taken from the top-left corner (defaults to DEFAULT_REGION_SIZES)
+        frames: Grabs timed per backend and region
+        display: X display for the xshm backend
+
+    Returns:
+        dict: Backend name -> per-region results, or an error message if it failed
+    """
+    backends = backends or available_backends()
+    sizes = sizes or [parse_size(size) for size in DEFAULT_REGION_SIZES]
+    screen_width, screen_height = pg.size()
+    regions = {'full': None}
+    for width, height in sizes:
+        if width <= screen_width and height <= screen_height:
+            regions[f"{width}x{height}"] = (0, 0, width, height)
+
+    report = {}
+    for name in backends:
+        backend = create_capture_backend(name, display)
+        if backend.name != name:
+            report[name] = {'error': 'not available'}
+            continue
+        logger.info(f"Benchmarking {name} capture")
+        try:
+            report[name] = benchmark_backend(backend, regions, frames)
+        except Exception as e:
+            logger.error(f"Capture backend {name} failed: {str(e)}")
+            report[name] = {'error': str(e)}
+        finally:
+            backend.close()
+    return report
+
+
+def print_report(report):
+    """Print a capture benchmark report as a plain-text table"""
+    print(f"{'backend':<12}{'region':<12}{'fps':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}")
+    for name, results in report.items():
+        if 'error' in results:
+            print(f"{name:<12}{'-':<12}  {results['error']}")
+            continue
+        for label, result in results.items():
+            latency = result['latency_ms']
+            print(f"{name:<12}{label:<12}{result['fps']:>8}{latency.get('p50'):>9}{latency.get('p90'):>9}{latency.get('p99'):>9}")
+
+
+def main():
+    """Command line entry point of the capture benchmark"""
+    parser = argparse.ArgumentParser(description='Benchmark the screen capture backends')
+    parser.add_argument('--config', help='Path to custom configuration file')
+    parser.add_argument('--backends', nargs='+', choices=list(CAPTURE_BACKENDS),
+                        help='Backends to benchmark (default: all available)')
+    parser.add_argument('--regions', nargs='+', help='Region sizes as WIDTHxHEIGHT, besides the full screen')
+    parser.add_argument('--frames', type=int, default=50, help='Grabs timed per backend and region')
+    parser.add_argument('--output', help='Write the full report to this JSON file')
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config else get_config()
+    setup_logging()
+
+    live_config = (config.get('screen_source') or {}).get('live') or {}
+    sizes = [parse_size(size) for size in args.regions] if args.regions else None
+    report = run_benchmark(args.backends, sizes, args.frames, live_config.get('display'))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
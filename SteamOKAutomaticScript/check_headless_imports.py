@@ -0,0 +1,74 @@
+"""
+Headless import check for the SteamOKAutomaticScript.
+Imports the modules that drive an installation and an injection with the
+Windows-only window libraries (pygetwindow, pywin32) blocked, the way they
+behave on a Linux rig, so process_game and run_injection_process_with_retry
+stay usable against a replayed session under Xvfb. Exits non-zero if any of
+the modules needs one of those libraries at import time.
+"""
+import sys
+import argparse
+import importlib
+import traceback
+
+# Modules that have to import on Linux
+DEFAULT_MODULES = ['game_install_controller', 'dll_inject']
+
+# Libraries that cannot be imported off Windows (pygetwindow raises NotImplementedError on Linux)
+WINDOWS_ONLY_MODULES = ('pygetwindow', 'win32gui', 'win32con', 'win32api', 'win32process')
+
+
+class _WindowsOnlyBlocker:
+    """Import hook that fails the Windows-only libraries like Linux does"""
+
+    def find_spec(self, name, path=None, target=None):
+        if name.split('.')[0] in WINDOWS_ONLY_MODULES:
+            raise NotImplementedError(f"{name} is not available on this platform (blocked by the headless import check)")
+        return None
+
+
+def check_imports(modules):
+    """
+    Import each module with the Windows-only libraries blocked.
+
+    Args:
+        modules: Module names to import
+
+    Returns:
+        dict: Module name -> None if it imported, else the formatted error
+    """
+    blocker = _WindowsOnlyBlocker()
+    for name in WINDOWS_ONLY_MODULES:
+        sys.modules.pop(name, None)
+    sys.meta_path.insert(0, blocker)
+    results = {}
+    try:
+        for module in modules:
+            try:
+                importlib.import_module(module)
+                results[module] = None
+            except Exception:
+                results[module] = traceback.format_exc()
+    finally:
+        sys.meta_path.remove(blocker)
+    return results
+
+
+def main():
+    """Command line entry point of the headless import check"""
+    parser = argparse.ArgumentParser(description='Check that the automation modules import without pygetwindow/pywin32')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='Modules to import')
+    args = parser.parse_args()
+
+    failed = 0
+    for module, error in check_imports(args.modules).items():
+        if error is None:
+            print(f"OK      {module}")
+        else:
+            failed += 1
+            print(f"FAILED  {module}\n{error}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
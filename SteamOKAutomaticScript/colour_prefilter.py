@@ -0,0 +1,190 @@
+"""
+Colour-signature prefilter for the SteamOKAutomaticScript.
+Each template gets a signature of its dominant quantised colours. A capture is
+binned once per poll into per-tile colour histograms, after which checking
+whether a search region holds enough of a template's colours is a handful of
+array lookups. Regions that cannot contain the template skip the normalised
+cross-correlation entirely.
+"""
+import logging
+
+import numpy as np
+
+# Get logger
+logger = logging.getLogger()
+
+
+def quantize(rgb, bits):
+    """
+    Map RGB pixels to colour bin indices.
+
+    Args:
+        rgb: (..., 3) uint8 array
+        bits: Bits kept per channel (at most 5, so indices fit in uint16)
+
+    Returns:
+        numpy.ndarray: uint16 bin index per pixel, in [0, 2 ** (3 * bits))
+    """
+    channels = rgb >> (8 - bits)
+    return (channels[..., 0].astype(np.uint16) << (2 * bits)) | (channels[..., 1].astype(np.uint16) << bits) | channels[..., 2]
+
+
+def neighbour_bins(index, bits):
+    """
+    A colour bin and the bins one level above and below it in each channel.
+    A small gamma, compression or theme shift can push a flat colour near a bin
+    edge into the next bin; normalised cross-correlation still matches it.
+
+    Args:
+        index: Colour bin index
+        bits: Bits kept per channel
+
+    Returns:
+        numpy.ndarray: The (up to 27) neighbouring bin indices, the bin itself included
+    """
+    levels = 1 << bits
+    channels = [(index >> shift) & (levels - 1) for shift in (2 * bits, bits, 0)]
+    ranges = [np.arange(max(0, channel - 1), min(levels, channel + 2)) for channel in channels]
+    red, green, blue = np.meshgrid(*ranges, indexing='ij')
+    return ((red << (2 * bits)) | (green << bits) | blue).ravel()
+
+
+class ColourSignature:
+    """
+    Dominant colour bins of a template and how many pixels of each it has.
+    A frame's pixels count towards a signature colour if they fall into its bin
+    or one of the neighbouring bins.
+    """
+
+    def __init__(self, bins, counts, bits):
+        """
+        Args:
+            bins: Colour bin indices
+            counts: Template pixels in each of those bins
+            bits: Bits kept per channel of the quantisation
+        """
+        self.bins = bins
+        self.counts = counts
+        neighbourhoods = [neighbour_bins(int(index), bits) for index in bins]
+        # Every bin any signature colour accepts, and which signature colour accepts which
+        self.lookup_bins = np.unique(np.concatenate(neighbourhoods)) if neighbourhoods else np.zeros(0, dtype=np.int64)
+        self.membership = np.array([np.isin(self.lookup_bins, neighbourhood) for neighbourhood in neighbourhoods], dtype=np.int64)
+
+    @classmethod
+    def from_template(cls, template, bits, min_fraction, max_colours):
+        """Build the signature from a template's RGB pixels"""
+        histogram = np.bincount(quantize(template.rgb, bits).ravel(), minlength=1 << (3 * bits))
+        order = np.argsort(histogram)[::-1][:max_colours]
+        keep = order[histogram[order] >= min_fraction * template.rgb.shape[0] * template.rgb.shape[1]]
+        return cls(keep, histogram[keep], bits)
+
+    def __len__(self):
+        return len(self.bins)
+
+
+class FrameHistogram:
+    """
+    Per-tile colour histograms of a subsampled frame.
+    """
+
+    def __init__(self, frame, bits, stride, tile_size, tile_offsets):
+        """
+        Args:
+            frame: RGB frame as a (height, width, 3) uint8 array
+            bits: Bits kept per colour channel
+            stride: Only every stride-th pixel in each direction is sampled
+            tile_size: Edge of a histogram tile in frame pixels (a multiple of stride)
+            tile_offsets: Callable returning (offsets, rows, cols) for a sampled shape,
+                          where offsets holds each sampled pixel's tile index times the bin count
+        """
+        self.stride = stride
+        self.tile_size = tile_size
+        self.height, self.width = frame.shape[:2]
+        bins = 1 << (3 * bits)
+
+        sampled = quantize(frame[::stride, ::stride], bits)
+        offsets, rows, cols = tile_offsets(sampled.shape)
+        self.tiles = np.bincount((offsets + sampled).ravel(), minlength=rows * cols * bins).reshape(rows, cols, bins)
+
+    def counts(self, region, bins):
+        """
+        Sampled pixel counts of the given colour bins in the tiles covering a region.
+        Whole tiles are counted, so the counts never undercount the region.
+
+        Args:
+            region: (left, top, width, height) in frame coordinates, or None for the whole frame
+            bins: Colour bin indices
+
+        Returns:
+            numpy.ndarray: Count per bin
+        """
+        left, top, width, height = region or (0, 0, self.width, self.height)
+        first_row, last_row = top // self.tile_size, (top + height - 1) // self.tile_size
+        first_col, last_col = left // self.tile_size, (left + width - 1) // self.tile_size
+        return self.tiles[first_row:last_row + 1, first_col:last_col + 1][:, :, bins].sum(axis=(0, 1))
+
+
+class ColourPrefilter:
+    """
+    Rejects searches whose region lacks the template's signature colours.
+    """
+
+    def __init__(self, config):
+        prefilter_config = config['image_detector'].get('colour_prefilter') or {}
+        self.bits = min(prefilter_config.get('bits', 3), 5)
+        self.stride = prefilter_config.get('stride', 2)
+        self.tile_size = prefilter_config.get('tile_size', 32)
+        self.min_fraction = prefilter_config.get('min_fraction', 0.1)
+        self.max_colours = prefilter_config.get('max_colours', 4)
+        self.tolerance = prefilter_config.get('tolerance', 0.5)
+        if self.tile_size % self.stride:
+            self.tile_size -= self.tile_size % self.stride
+        self._tile_offsets = {}
+        # Statistics
+        self.checked = 0
+        self.rejected = 0
+
+    def signature(self, template):
+        """Colour signature of a template (computed once and kept on the template)"""
+        key = (self.bits, self.min_fraction, self.max_colours)
+        if key not in template.signatures:
+            template.signatures[key] = ColourSignature.from_template(template, self.bits, self.min_fraction, self.max_colours)
+        return template.signatures[key]
+
+    def _offsets_for(self, shape):
+        # Tile index of every sampled pixel, scaled by the bin count; cached per capture size
+        if shape not in self._tile_offsets:
+            cells = self.tile_size // self.stride
+            rows = -(-shape[0] // cells)
+            cols = -(-shape[1] // cells)
+            tile_ids = (np.arange(shape[0]) // cells)[:, None] * cols + (np.arange(shape[1]) // cells)[None, :]
+            self._tile_offsets[shape] = ((tile_ids << (3 * self.bits)).astype(np.int32), rows, cols)
+        return self._tile_offsets[shape]
+
+    def histogram(self, frame):
+        """Bin a captured frame for the plausibility checks of one poll"""
+        return FrameHistogram(frame, self.bits, self.stride, self.tile_size, self._offsets_for)
+
+    def plausible(self, histogram, template, region=None):
+        """
+        Check whether a region can contain the template at all.
+
+        Args:
+            histogram: FrameHistogram of the captured frame
+            template: Template from the registry
+            region: (left, top, width, height) in frame coordinates, or None for the whole frame
+
+        Returns:
+            bool: False if some signature colour (or a colour next to it) is clearly missing from the region
+        """
+        signature = self.signature(template)
+        if not len(signature):
+            return True
+        self.checked += 1
+        required = signature.counts * (self.tolerance / (self.stride * self.stride))
+        # Pixels of each signature colour's bin and its neighbours
+        present = signature.membership @ histogram.counts(region, signature.lookup_bins)
+        if np.all(present >= required):
+            return True
+        self.rejected += 1
+        return False
@@ -5,6 +5,8 @@ import datetime
 import requests
 from pathlib import Path
 
+from download_throughput import format_throughput
+
 logger = logging.getLogger()
 
 class GameStatusLogger:
@@ -18,6 +20,7 @@ class GameStatusLogger:
     - Injection log directory (if applicable)
     - Timestamp
     - Error details (if any)
+    - Average download throughput (for download results)
     """
     
     def __init__(self, webhook_url=None):
@@ -41,7 +44,8 @@ class GameStatusLogger:
             "Timestamp", 
             "USMapPath",
             "InjectionLogDir", 
-            "ErrorDetails"
+            "ErrorDetails",
+            "Throughput"
         ]
         
         # Initialize CSV file if it doesn't exist
@@ -107,7 +111,7 @@ class GameStatusLogger:
         }
         return status_emojis.get(status, "🔄")
     
-    def log_game_status(self, game_name, status, usmap_path=None, injection_log_dir=None, error_details=None):
+    def log_game_status(self, game_name, status, usmap_path=None, injection_log_dir=None, error_details=None, throughput=None):
         """
         Log the game status to the CSV file.
         
@@ -118,6 +122,7 @@ class GameStatusLogger:
             usmap_path (str, optional): Path to the USMap file if injection was successful
             injection_log_dir (str, optional): Path to the injection log directory
             error_details (str, optional): Error details if an error occurred
+            throughput (float, optional): Average download rate in bytes per second
         """
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
@@ -129,7 +134,8 @@ class GameStatusLogger:
                 timestamp,
                 usmap_path or "",
                 injection_log_dir or "",
-                error_details or ""
+                error_details or "",
+                format_throughput(throughput) if throughput else ""
             ])
         
         logger.info(f"Logged game status: {game_name} - {status}")
@@ -153,37 +159,45 @@ class GameStatusLogger:
             # Add Error details if present
             if error_details:
                 message += f"\n⚠️ Error details: {error_details}"
+            
+            # Add download throughput if measured
+            if throughput:
+                message += f"\n📶 Download throughput: {format_throughput(throughput)}"
                 
                 
             self.send_webhook_notification(message)
     
-    def log_download_error(self, game_name, error_details=None):
+    def log_download_error(self, game_name, error_details=None, throughput=None):
         """Log a download error for a game."""
         self.log_game_status(
             game_name=game_name,
             status="DOWNLOAD_ERROR",
-            error_details=error_details
+            error_details=error_details,
+            throughput=throughput
         )
     
-    def log_download_success(self, game_name):
+    def log_download_success(self, game_name, throughput=None):
         """Log a successful download for a game."""
         self.log_game_status(
             game_name=game_name,
-            status="DOWNLOAD_SUCCESS"
+            status="DOWNLOAD_SUCCESS",
+            throughput=throughput
         )
     
-    def log_cancelled(self, game_name, reason=None):
+    def log_cancelled(self, game_name, reason=None, throughput=None):
         """
         Log a cancelled game process (e.g., due to EasyAntiCheat detection).
         
         Args:
             game_name (str): Name of the game
             reason (str, optional): Reason for cancellation
+            throughput (float, optional): Average download rate in bytes per second
         """
         self.log_game_status(
             game_name=game_name,
             status="CANCELLED",
-            error_details=reason
+            error_details=reason,
+            throughput=throughput
         )
     
     def log_injection_crash(self, game_name, error_details=None, injection_log_dir=None):
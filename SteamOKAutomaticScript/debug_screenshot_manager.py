@@ -1,9 +1,12 @@
 import os
 import time
 import logging
-import pyautogui as pg
 from datetime import datetime
 import re
+from PIL import Image
+from config import get_config
+from frame_capture import get_capture_service
+from screen_source import get_screen_source
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +18,9 @@ class DebugScreenshotManager:
         self.base_folder = base_folder
         self.game_folders = {}
         self.last_screenshot_time = {}
+        # Reuse frames from the shared capture thread when it is enabled
+        self.screen_source = get_screen_source(get_config())
+        self.capture_service = get_capture_service(get_config())
         # Create base screenshots folder if it doesn't exist
         os.makedirs(base_folder, exist_ok=True)
         logger.info(f"Debug screenshot manager initialized with base folder: {base_folder}")
@@ -65,7 +71,10 @@ class DebugScreenshotManager:
         
         try:
             # Take and save the screenshot
-            screenshot = pg.screenshot()
+            if self.capture_service is not None:
+                screenshot = Image.fromarray(self.capture_service.get_frame().image)
+            else:
+                screenshot = Image.fromarray(self.screen_source.grab())
             screenshot.save(screenshot_path)
             logger.info(f"Debug screenshot saved: {screenshot_path}")
             return screenshot_path
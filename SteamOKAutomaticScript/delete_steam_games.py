@@ -5,9 +5,11 @@ Steam Games Cleanup Script
 
 This script deletes files and directories in the Steam installation to free up space.
 It removes:
-- Game directories in steamapps/common/ (except Steam-related ones like Steamworks Shared)
-- In-progress downloads in steamapps/downloading/ (except Steam-related ones)
-- Game manifest files (appmanifest_*.acf) (except Steam-related ones)
+- Installed games, as listed by their appmanifest_*.acf: the game directory in
+  steamapps/common/, its download in steamapps/downloading/ and the manifest itself
+  (except Steam's own tools and runtimes like Steamworks Shared)
+- Leftover directories in steamapps/common/ and steamapps/downloading/ that no
+  manifest accounts for (except Steam-related ones)
 
 The script preserves:
 - Shader cache files in shadercache/
@@ -32,6 +34,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import config loader from the config package
 from config import get_config, load_config
+from steam_manifest import STEAM_TOOL_APPIDS, get_steam_library_index
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -115,6 +118,38 @@ class SteamGamesCleaner:
             # If we can't check the timestamp, assume it's safe to delete
             return True
 
+    def should_delete_app(self, manifest):
+        """
+        Check if an installed app should be deleted, using its appmanifest.
+        
+        Args:
+            manifest: AppManifest of the app
+            
+        Returns:
+            bool: True if the app should be deleted, False otherwise
+        """
+        if str(manifest.appid) in STEAM_TOOL_APPIDS:
+            logger.info(f"Preserving Steam tool: {manifest.name} ({manifest.appid})")
+            return False
+        for reserved_dir in STEAM_RESERVED_DIRS:
+            if reserved_dir.lower() in (manifest.installdir or '').lower():
+                logger.info(f"Preserving Steam-related app: {manifest.name} ({manifest.appid})")
+                return False
+        
+        if not self.preserve_after:
+            return True
+        
+        # Steam rewrites the manifest throughout an install, while LastUpdated is only set when it completes
+        try:
+            updated = max(manifest.last_updated, os.path.getmtime(manifest.path))
+        except OSError:
+            updated = manifest.last_updated
+        if updated > self.preserve_after:
+            timestamp = datetime.datetime.fromtimestamp(updated).strftime('%Y-%m-%d %H:%M:%S')
+            logger.info(f"Preserving {manifest.name} ({manifest.appid}, updated on {timestamp})")
+            return False
+        return True
+
     def delete_directory(self, directory_path):
         """
         Delete a directory and all its contents.
@@ -192,29 +227,50 @@ class SteamGamesCleaner:
             'manifest_files_deleted': 0
         }
         
-        # 1. Delete game directories in steamapps/common/ (except Steam-related ones)
-        common_dir = os.path.join(self.steam_apps_dir, 'common')
-        if os.path.exists(common_dir):
-            game_dirs = [os.path.join(common_dir, d) for d in os.listdir(common_dir) 
-                         if os.path.isdir(os.path.join(common_dir, d))]
+        # 1. Delete the apps Steam knows about from their manifests: game directory, download and manifest together
+        index = get_steam_library_index(self.steam_apps_dir).refresh()
+        library = os.path.normcase(os.path.normpath(self.steam_apps_dir))
+        known_dirs = set()
+        for manifest in index.apps():
+            if os.path.normcase(manifest.steamapps_dir) != library:
+                continue
+            if manifest.installdir:
+                known_dirs.add(os.path.normcase(manifest.install_path))
+            known_dirs.add(os.path.normcase(manifest.download_path))
+            if not self.should_delete_app(manifest):
+                continue
             
-            for game_dir in game_dirs:
+            deleted = True
+            for game_dir, stat_key in ((manifest.install_path, 'common_dirs_deleted'),
+                                       (manifest.download_path, 'downloading_dirs_deleted')):
+                if not game_dir or not os.path.isdir(game_dir):
+                    continue
                 if self.delete_directory(game_dir):
-                    stats['common_dirs_deleted'] += 1
-        
-        # 2. Delete downloading directory contents (except Steam-related ones)
-        downloading_dir = os.path.join(self.steam_apps_dir, 'downloading')
-        if os.path.exists(downloading_dir):
-            download_dirs = [os.path.join(downloading_dir, d) for d in os.listdir(downloading_dir) 
-                             if os.path.isdir(os.path.join(downloading_dir, d))]
+                    stats[stat_key] += 1
+                else:
+                    deleted = False
             
-            for download_dir in download_dirs:
-                if self.delete_directory(download_dir):
-                    stats['downloading_dirs_deleted'] += 1
+            # Keep the manifest while any of its files remain, so the next run still finds them
+            if deleted:
+                try:
+                    os.remove(manifest.path)
+                    logger.info(f"Deleted file: {manifest.path}")
+                    stats['manifest_files_deleted'] += 1
+                except OSError as e:
+                    logger.error(f"Error deleting file {manifest.path}: {str(e)}")
         
-        # 3. Delete game manifest files (appmanifest_*.acf) (except Steam-related ones)
-        manifest_pattern = os.path.join(self.steam_apps_dir, 'appmanifest_*.acf')
-        stats['manifest_files_deleted'] = self.delete_files(manifest_pattern)
+        # 2. Delete leftover directories no manifest accounts for (except Steam-related ones)
+        for folder, stat_key in (('common', 'common_dirs_deleted'), ('downloading', 'downloading_dirs_deleted')):
+            folder_path = os.path.join(self.steam_apps_dir, folder)
+            if not os.path.exists(folder_path):
+                continue
+            leftover_dirs = [os.path.join(folder_path, d) for d in os.listdir(folder_path)
+                             if os.path.isdir(os.path.join(folder_path, d))
+                             and os.path.normcase(os.path.normpath(os.path.join(folder_path, d))) not in known_dirs]
+            
+            for leftover_dir in leftover_dirs:
+                if self.delete_directory(leftover_dir):
+                    stats[stat_key] += 1
         
         return stats
 
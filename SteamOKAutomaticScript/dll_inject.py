@@ -4,13 +4,14 @@ import logging
 import subprocess
 import pyautogui as pg
 import psutil
-import pygetwindow as gw
 from datetime import datetime
 from logger import setup_logging
 import glob
 from config import get_config, load_config
 from tqdm import tqdm
 from image_utils import ImageDetector
+from fs_watcher import get_fs_watcher, CREATED, DELETED, OVERFLOW
+from process_tracker import get_process_tracker, is_unreal_process, rank_game_processes
 from window_utils import activate_window_by_title, activate_window_by_typing, activate_window
 
 # Disable PyAutoGUI fail-safe (not recommended for safety reasons)
@@ -33,6 +34,12 @@ class DLLInjector:
         self.dll_injector_path = dll_config['paths']['dll_injector_path']
         
         # Image paths and confidence levels from config
+        # The injector's own thresholds: the same templates are matched looser by the install controller
+        image_confidences = dll_config.get('image_confidences') or {}
+        self.image_confidences = {}
+        for key, image in dll_config['images'].items():
+            image_path = os.path.join(os.path.dirname(__file__), image)
+            self.image_confidences[image_path] = image_confidences.get(key)
         
         # Set up image paths with confidence levels for playable button
         playable_button_image = os.path.join(os.path.dirname(__file__), dll_config['images']['playable_button_image'])
@@ -63,9 +70,24 @@ class DLLInjector:
         # Track the latest log directory
         self.latest_log_dir = None
         
+        # Dumper-7 writes its log directories and Mappings/*.usmap under the parent of the log directory;
+        # both are followed through filesystem events while an injection runs
+        self.fs_watcher = get_fs_watcher(self.config)
+        self.dumper_directory = os.path.dirname(os.path.normpath(self.base_log_directory))
+        self._dumper_events = None
+        self._usmap_files = []
+        
+        # Processes started by Steam (or from the game folder) are reported by the background process tracker,
+        # which also keeps their CPU and memory figures up to date
+        self.process_tracker = get_process_tracker(self.config)
+        
         logger.info(f"DLLInjector initialized with game_folder: {self.game_folder}")
         logger.info(f"DLL injector path: {self.dll_injector_path}")
         
+    def _with_confidences(self, image_paths):
+        """Map image paths to the injector's thresholds, for ImageDetector.wait_for_any"""
+        return {image_path: self.image_confidences.get(image_path) for image_path in image_paths}
+
     def activate_steam_window(self):
         """Activate Steam window and bring it to the front"""
         return activate_window("Steam", self.config['timing'])
@@ -77,28 +99,20 @@ class DLLInjector:
         """
         logger.info("Searching for playable button...")
         
-        # Try each playable image in sequence
+        # Wait for whichever playable image shows up first
+        timeout = self.image_detector.max_retries * self.image_detector.retry_interval
+        matches = self.image_detector.wait_for_any(self._with_confidences(self.playable_image_paths), timeout)
         for image_path in self.playable_image_paths:
-            if self.image_detector.check_and_click_image(image_path=image_path):
+            if matches[image_path]:
+                logger.info(f"Found {os.path.basename(image_path)}")
+                self.image_detector.click_match(matches[image_path])
                 return True
                 
         logger.error("Failed to find playable button after trying all images")
         return False
     
-    def get_running_processes(self):
-        """Get a set of (name, exe_path, pid) for all currently running processes"""
-        processes = set()
-        for proc in psutil.process_iter(['name', 'exe', 'pid']):
-            try:
-                if proc.info['exe']:  # Only record processes with exe paths
-                    processes.add((proc.info['name'], proc.info['exe'], proc.info['pid']))
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-        logger.debug(f"Found {len(processes)} running processes")
-        return processes
-    
     def get_process_details(self, pid):
-        """Get detailed information about a process by PID"""
+        """Get detailed information about a process by PID (CPU usage as last sampled by the process tracker)"""
         try:
             if not psutil.pid_exists(pid):
                 logger.error(f"Process with PID {pid} does not exist")
@@ -109,6 +123,14 @@ class DLLInjector:
             name = proc.name()
             exe_path = proc.exe()
             memory_mb = proc.memory_info().rss / (1024 * 1024)  # Convert to MB
+            tracked = self.process_tracker.get(pid)
+            if tracked is not None and tracked.samples > 1:
+                cpu_percent = round(tracked.cpu_percent, 1)
+                memory_delta_mb = round(tracked.memory_delta_mb, 2)
+            else:
+                # Not sampled yet: psutil only has a figure from its second call, never block for one
+                cpu_percent = proc.cpu_percent(interval=None)
+                memory_delta_mb = 0
             create_time = datetime.fromtimestamp(proc.create_time()).strftime('%H:%M:%S')
             
             try:
@@ -120,7 +142,8 @@ class DLLInjector:
                 'name': name,
                 'exe': exe_path,
                 'memory_mb': round(memory_mb, 2),
-                'cpu_percent': proc.cpu_percent(interval=0.1),
+                'memory_delta_mb': memory_delta_mb,
+                'cpu_percent': cpu_percent,
                 'create_time': create_time,
                 'num_threads': proc.num_threads(),
                 'parent_process': parent
@@ -139,6 +162,7 @@ class DLLInjector:
                     'name': name,
                     'exe': "Access denied",
                     'memory_mb': 0,
+                    'memory_delta_mb': 0,
                     'cpu_percent': 0,
                     'create_time': "Unknown",
                     'num_threads': 0,
@@ -167,71 +191,51 @@ class DLLInjector:
             
         return False
     
-    def find_new_game_process(self, before, after):
+    def find_new_game_process(self, new_processes):
         """
-        Compare before and after process sets, return the most likely game process
+        Pick the most likely game process among the processes the tracker saw start (Steam's descendants,
+        or anything started from the game folder): the Unreal Engine game executable if there is one,
+        else the largest working set, then the busiest CPU, all as last sampled in the background
         """
-        before_pids = {pid for _, _, pid in before}
-        new_processes = []
-        
-        for name, exe, pid in after:
-            if pid not in before_pids:
-                new_processes.append((name, exe, pid))
-        
         game_processes = []
-        for name, exe, pid in new_processes:
-            if not any(keyword in name.lower() for keyword in self.system_process_keywords) and name.lower().endswith('.exe'):
-                if self.game_folder is None or self.is_from_game_folder(exe):
-                    game_processes.append((name, exe, pid))
-                    logger.info(f"Found potential game process: {name} (PID: {pid}) at {exe}")
-                else:
-                    logger.debug(f"Skipping process not from game folder: {name} ({exe})")
+        for process in new_processes:
+            if not process.alive:
+                logger.debug(f"Skipping exited process: {process.name} (PID: {process.pid})")
+            elif any(keyword in process.name.lower() for keyword in self.system_process_keywords) or not process.name.lower().endswith('.exe'):
+                logger.debug(f"Skipping system process: {process.name} ({process.exe})")
+            elif self.game_folder and not self.is_from_game_folder(process.exe):
+                logger.debug(f"Skipping process not from game folder: {process.name} ({process.exe})")
+            else:
+                game_processes.append(process)
+                logger.info(f"Found potential game process: {process.name} (PID: {process.pid}) at {process.exe}")
         
         if not game_processes:
             logger.error("No new game processes detected from the specified folder")
             return None
         
-        process_details = []
-        for name, exe, pid in game_processes:
-            try:
-                if psutil.pid_exists(pid):
-                    details = self.get_process_details(pid)
-                    if details:
-                        process_details.append((name, exe, pid, details))
-                    else:
-                        logger.error(f"Could not get details for process {name} (PID: {pid})")
-                else:
-                    logger.error(f"Process {name} (PID: {pid}) no longer exists")
-            except Exception as e:
-                logger.error(f"Error processing {name} (PID: {pid}): {str(e)}")
-        
-        if not process_details:
-            if game_processes:
-                name, exe, pid = game_processes[0]
-                logger.warning(f"Using fallback: returning game process without details: {name} (PID: {pid})")
-                return {"pid": pid, "name": name, "exe": exe}
-            
-            logger.error("Could not get details for any new game processes")
-            return None
-        
-        process_details.sort(key=lambda x: x[3]['memory_mb'], reverse=True)
+        game_processes = rank_game_processes(game_processes)
         
-        logger.info(f"Detected {len(process_details)} potential game processes:")
-        for i, (name, exe, pid, details) in enumerate(process_details):
-            logger.info(f"{i+1}. {name} (PID: {pid}) - Memory: {details['memory_mb']} MB, CPU: {details['cpu_percent']}%, Threads: {details['num_threads']}")
+        logger.info(f"Detected {len(game_processes)} potential game processes:")
+        for i, process in enumerate(game_processes):
+            logger.info(f"{i+1}. {process.name} (PID: {process.pid}){' [Unreal Engine]' if is_unreal_process(process) else ''} - "
+                        f"Memory: {process.memory_mb:.2f} MB ({process.memory_delta_mb:+.2f} MB), "
+                        f"CPU: {process.cpu_percent:.1f}%, Threads: {process.num_threads}")
         
-        selected_process = process_details[0]
-        name, exe, pid, details = selected_process
+        selected = game_processes[0]
+        details = self.get_process_details(selected.pid)
+        if not details:
+            logger.warning(f"Using fallback: returning game process without details: {selected.name} (PID: {selected.pid})")
+            return {"pid": selected.pid, "name": selected.name, "exe": selected.exe}
         
-        logger.info(f"Selected game process: {name} (PID: {pid})")
-        logger.info(f"  Path: {exe}")
+        logger.info(f"Selected game process: {selected.name} (PID: {selected.pid})")
+        logger.info(f"  Path: {selected.exe}")
         logger.info(f"  Memory Usage: {details['memory_mb']} MB")
         logger.info(f"  CPU Usage: {details['cpu_percent']}%")
         logger.info(f"  Created at: {details['create_time']}")
         logger.info(f"  Thread Count: {details['num_threads']}")
         logger.info(f"  Parent Process: {details['parent_process']}")
         
-        return {"pid": pid, "name": name, "exe": exe}
+        return {"pid": selected.pid, "name": selected.name, "exe": selected.exe}
     
     def click_relative(self, window, x_ratio, y_ratio):
         """Click at a position relative to window size"""
@@ -302,11 +306,31 @@ class DLLInjector:
         base_log_path = self.base_log_directory
         max_wait_time = self.sleep_config['injection_max_wait']
         
+        owns_watch = self._dumper_events is None
+        if owns_watch:
+            self._watch_dumper_output()
+        try:
+            return self._wait_for_injection(pid, check_interval, start_time, base_log_path, max_wait_time, injection_start_time)
+        finally:
+            if owns_watch:
+                self._stop_watching_dumper_output()
+
+    def _wait_for_injection(self, pid, check_interval, start_time, base_log_path, max_wait_time, injection_start_time):
+        """
+        check_injection_status loop: the signal files are only checked again when Dumper-7
+        changed something; in between it sleeps on filesystem events, waking every
+        check_interval to make sure the game process is still alive
+        """
+        # The log directory may already exist: read the log folder once, events cover the rest
+        log_dir = self.get_latest_log_directory(base_log_path, injection_start_time)
+        signals_changed = True
+        last_missing_log = start_time
+        log_dir_found = time.time()
+        
         while time.time() - start_time < max_wait_time:
             try:
                 if not psutil.pid_exists(pid):
                     logger.error("Game process crashed or ended unexpectedly")
-                    log_dir = self.get_latest_log_directory(base_log_path, injection_start_time)
                     if log_dir:
                         crash_signal_path = os.path.join(log_dir, "crash.signal")
                         try:
@@ -320,13 +344,16 @@ class DLLInjector:
                 logger.error(f"Error checking process status: {str(e)}")
                 return False
 
-            log_dir = self.get_latest_log_directory(base_log_path, injection_start_time)
-            if not log_dir:
-                time.sleep(check_interval)
-                elapsed_time = int(time.time() - start_time) % 60
-                if elapsed_time == 0:
+            if not log_dir or not signals_changed:
+                if not log_dir and time.time() - last_missing_log >= 60:
                     logger.error("No valid timestamp directories found")
+                    last_missing_log = time.time()
+                previous_log_dir = log_dir
+                log_dir, signals_changed = self._process_dumper_events(self._dumper_events.wait(check_interval), log_dir, injection_start_time)
+                if log_dir != previous_log_dir:
+                    log_dir_found = time.time()
                 continue
+            signals_changed = False
 
             try:
                 end_signal = os.path.exists(os.path.join(log_dir, "end.signal"))
@@ -343,7 +370,13 @@ class DLLInjector:
                 running_signal = os.path.exists(os.path.join(log_dir, "running.signal"))
                 if running_signal:
                     logger.info("Injection still running...")
-                    time.sleep(check_interval)
+                    continue
+                
+                remaining = check_interval - (time.time() - log_dir_found)
+                if remaining > 0:
+                    # Seen right after Dumper-7 created the directory: give it time to write running.signal
+                    log_dir, _ = self._process_dumper_events(self._dumper_events.wait(remaining), log_dir, injection_start_time)
+                    signals_changed = True
                     continue
                 
                 logger.error("Injection failed: neither running.signal nor end.signal found")
@@ -353,11 +386,56 @@ class DLLInjector:
                 logger.error(f"Error checking injection status: {str(e)}")
                 return False
 
-            time.sleep(check_interval)
-
         logger.error(f"Injection timed out after {max_wait_time} seconds")
         return "timeout"
 
+    def _watch_dumper_output(self):
+        """Start following the log directories and .usmap files Dumper-7 creates"""
+        self._stop_watching_dumper_output()
+        self._usmap_files = []
+        self._dumper_events = self.fs_watcher.subscribe(self.dumper_directory, recursive=True)
+
+    def _stop_watching_dumper_output(self):
+        if self._dumper_events is not None:
+            self._dumper_events.close()
+            self._dumper_events = None
+
+    def _process_dumper_events(self, events, log_dir, injection_start_time):
+        """
+        Apply Dumper-7 filesystem events: a newer timestamp log directory replaces log_dir,
+        and .usmap files written to a Mappings folder are remembered for get_usmap_path.
+        
+        Returns:
+            tuple: (log directory, whether anything in it changed)
+        """
+        base_log_path = os.path.normcase(os.path.normpath(self.base_log_directory))
+        changed = False
+        for event in events:
+            if event.kind == OVERFLOW:
+                # Events were lost: read the log folder once more
+                latest = self.get_latest_log_directory(self.base_log_directory, injection_start_time)
+                log_dir, changed = latest or log_dir, True
+                continue
+            parent = os.path.dirname(event.path)
+            if event.kind == CREATED and event.is_dir and os.path.normcase(parent) == base_log_path:
+                try:
+                    dir_time = datetime.strptime(os.path.basename(event.path), "%Y%m%d_%H%M%S")
+                except ValueError:
+                    continue
+                current_time = datetime.strptime(os.path.basename(log_dir), "%Y%m%d_%H%M%S") if log_dir else None
+                if (injection_start_time is None or dir_time > injection_start_time) and (current_time is None or dir_time > current_time):
+                    log_dir = event.path
+                    self.latest_log_dir = log_dir
+                    logger.info(f"Found latest log directory: {log_dir}")
+                    changed = True
+            elif log_dir and os.path.normcase(parent) == os.path.normcase(log_dir):
+                changed = True
+            if (event.kind != DELETED and event.path.lower().endswith('.usmap')
+                    and os.path.basename(parent) == "Mappings" and event.path not in self._usmap_files):
+                logger.info(f"Dumper-7 wrote {event.path}")
+                self._usmap_files.append(event.path)
+        return log_dir, changed
+
     def terminate_process(self, pid):
         """
         Terminate a process by its PID
@@ -388,6 +466,15 @@ class DLLInjector:
         Returns the usmap path if found, None otherwise
         """
 
+        # .usmap files Dumper-7 wrote while the injection was watched
+        if self._dumper_events is not None:
+            self._process_dumper_events(self._dumper_events.drain(), log_dir, None)
+        usmap_files = [path for path in self._usmap_files if os.path.isfile(path)]
+        if usmap_files:
+            usmap_path = max(usmap_files, key=os.path.getmtime)
+            logger.info(f"Found USMap file in Mappings directory: {usmap_path}")
+            return usmap_path
+
         # Try to find the USMap in the parent directory structure (sibling to log dir)
         try:
             # Get the parent directory of the log directory
@@ -449,8 +536,11 @@ class DLLInjector:
         """
         injection_start_time = datetime.now()
         log_dir = None
+        # Follow Dumper-7's output from before the injection starts
+        self._watch_dumper_output()
         
         try:
+            import pygetwindow as gw
             windows = gw.getWindowsWithTitle("DLL Injector")
             if not windows:
                 logger.info("DLL Injector not found, launching...")
@@ -554,6 +644,8 @@ class DLLInjector:
             except Exception as close_error:
                 logger.error(f"Error closing DLL Injector window after error: {str(close_error)}")
             return {"success": False, "error_type": "exception", "data": str(e)}
+        finally:
+            self._stop_watching_dumper_output()
 
         
     def run_injection_process(self, launch_from_steam=True, pid=None):
@@ -570,10 +662,31 @@ class DLLInjector:
         else:
             logger.info("No game folder specified, will detect any new process")
 
+        new_processes = None
+        folder_processes = None
         if not pid:
-            logger.info("Recording processes before game launch...")
-            before_processes = self.get_running_processes()
+            # Steam starts the game: follow the processes it starts from now on, through any launcher
+            steam = self.process_tracker.find('steam.exe', 'steam')
+            if steam is not None:
+                logger.info(f"Watching for game processes started by {steam.name} (PID: {steam.pid})...")
+                new_processes = self.process_tracker.follow(steam.pid, include_existing=False)
+                if self.game_folder:
+                    # A launcher that starts the game and exits between two tracker updates is never
+                    # seen, which cuts the game off from Steam's tree; the game folder still covers it
+                    folder_processes = self.process_tracker.subscribe(self.game_folder)
+            else:
+                logger.info("Steam process not found, watching for processes started from the game folder...")
+                new_processes = self.process_tracker.subscribe(self.game_folder)
 
+        try:
+            return self._launch_and_inject(launch_from_steam, pid, new_processes, folder_processes)
+        finally:
+            for subscription in (new_processes, folder_processes):
+                if subscription is not None:
+                    subscription.close()
+
+    def _launch_and_inject(self, launch_from_steam, pid, new_processes, folder_processes=None):
+        """Launch the game if requested, pick its process from the tracker's new processes and inject"""
         if launch_from_steam:
             if not self.activate_steam_window():
                 logger.error("Failed to activate Steam window")
@@ -591,10 +704,19 @@ class DLLInjector:
             {"name": "firewall permission dialog", "image_path": self.network_allow_path}
         ]
         
-        # Check for and handle various dialogs
-        for dialog in dialogs_to_check:
-            logger.info(f"Checking for {dialog['name']}...")
-            self.image_detector.check_and_click_image(image_path=dialog['image_path'])
+        # Handle the dialogs as they appear; stop once none shows up within the retry window
+        dialog_timeout = self.image_detector.max_retries * self.image_detector.retry_interval
+        pending_dialogs = list(dialogs_to_check)
+        while pending_dialogs:
+            logger.info(f"Checking for {', '.join(dialog['name'] for dialog in pending_dialogs)}...")
+            matches = self.image_detector.wait_for_any(self._with_confidences(dialog['image_path'] for dialog in pending_dialogs), dialog_timeout)
+            found_dialog = next((dialog for dialog in pending_dialogs if matches[dialog['image_path']]), None)
+            if found_dialog is None:
+                logger.info("No more dialogs found")
+                break
+            logger.info(f"Found {found_dialog['name']}, clicking...")
+            self.image_detector.click_match(matches[found_dialog['image_path']])
+            pending_dialogs.remove(found_dialog)
         
         logger.info(f"Waiting for game to launch...")
         game_launch_time = self.sleep_config['game_launch']
@@ -602,10 +724,13 @@ class DLLInjector:
             time.sleep(1)
 
         if not pid:
-            logger.info("Recording processes after game launch...")
-            after_processes = self.get_running_processes()
-        
-            game_process = self.find_new_game_process(before_processes, after_processes)
+            logger.info("Checking processes started since launch...")
+            game_process = self.find_new_game_process(new_processes.alive())
+            new_processes.close()
+            if not game_process and folder_processes is not None:
+                logger.info("No game process in Steam's process tree, checking processes started from the game folder...")
+                game_process = self.find_new_game_process(folder_processes.alive())
+                folder_processes.close()
         
             if not game_process:
                 logger.error("Failed to detect game process")
@@ -0,0 +1,257 @@
+"""
+Steam download progress reader for the SteamOKAutomaticScript.
+Finds the download progress bar inside the Steam window by its fill and track
+colours and measures how much of it is filled from whole pixel columns, so the
+installation monitor can log real progress, estimate the remaining time and
+notice downloads that stopped moving.
+"""
+import time
+import logging
+
+import numpy as np
+
+# Get logger
+logger = logging.getLogger()
+
+
+def colour_mask(frame, colours, tolerance):
+    """
+    Mark the pixels close to any of the given colours.
+
+    Args:
+        frame: (height, width, 3) uint8 RGB array
+        colours: List of [r, g, b] colours
+        tolerance: Largest per-channel difference still counted as the colour
+
+    Returns:
+        numpy.ndarray: (height, width) bool mask
+    """
+    pixels = frame.astype(np.int16)
+    mask = np.zeros(frame.shape[:2], dtype=bool)
+    for colour in colours:
+        mask |= np.abs(pixels - np.asarray(colour, dtype=np.int16)).max(axis=2) <= tolerance
+    return mask
+
+
+def _runs(mask):
+    """(start, end) pairs of the runs of True values in a 1-D mask"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges[::2], edges[1::2]
+
+
+class ProgressBar:
+    """
+    A progress bar found in a capture.
+    """
+
+    def __init__(self, fraction, box):
+        """
+        Args:
+            fraction: Filled share of the bar, 0 to 1
+            box: (left, top, width, height) of the bar on screen
+        """
+        self.fraction = fraction
+        self.box = box
+
+    @property
+    def percent(self):
+        return self.fraction * 100
+
+    def __repr__(self):
+        return f"ProgressBar({self.percent:.1f}% at {self.box})"
+
+
+class DownloadProgressReader:
+    """
+    Reads the fill ratio of Steam's download progress bar from the screen.
+    The bar is a thin horizontal band of fill-coloured columns followed by
+    track-coloured ones; the widest such band in the window is taken.
+    """
+
+    def __init__(self, config, image_detector):
+        """
+        Args:
+            config: The loaded configuration dictionary
+            image_detector: ImageDetector whose capture path and screen source are reused
+        """
+        progress_config = config.get('download_progress') or {}
+        self.image_detector = image_detector
+        self.window = progress_config.get('window', 'Steam')
+        self.region = progress_config.get('region')
+        self.fill_colours = progress_config.get('fill_colours') or [[26, 159, 255], [71, 191, 255]]
+        self.track_colours = progress_config.get('track_colours') or [[61, 68, 80], [71, 79, 92]]
+        self.tolerance = progress_config.get('tolerance', 12)
+        self.column_stride = max(1, progress_config.get('column_stride', 4))
+        self.min_width = progress_config.get('min_width', 150)
+        self.min_thickness = progress_config.get('min_thickness', 2)
+        self.max_thickness = progress_config.get('max_thickness', 12)
+
+    def capture_region(self):
+        """Screen rectangle the bar is searched in, or None for the whole screen"""
+        window_region = self.image_detector.screen_source.window_region(self.window) if self.window else None
+        if window_region is None or not self.region:
+            return window_region
+        left, top, width, height = window_region
+        x_ratio, y_ratio, width_ratio, height_ratio = self.region
+        return (
+            left + int(width * x_ratio),
+            top + int(height * y_ratio),
+            max(1, int(width * width_ratio)),
+            max(1, int(height * height_ratio))
+        )
+
+    def find(self, frame):
+        """
+        Find the progress bar in a frame.
+
+        Args:
+            frame: (height, width, 3) uint8 RGB array
+
+        Returns:
+            (fraction, (left, top, width, height)) in frame coordinates, or None if no bar is visible
+        """
+        # Rows with enough bar pixels, found on every column_stride-th column first,
+        # then grouped into bands of consecutive rows
+        sampled = frame[:, ::self.column_stride]
+        sampled_bar = colour_mask(sampled, self.fill_colours + self.track_colours, self.tolerance)
+        row_starts, row_ends = _runs(sampled_bar.sum(axis=1) * self.column_stride >= self.min_width)
+        best = None
+        for top, bottom in zip(row_starts, row_ends):
+            thickness = bottom - top
+            if thickness < self.min_thickness or thickness > self.max_thickness:
+                continue
+            # Full-resolution masks of the band only; a column belongs to the bar
+            # (or its fill) if most rows of the band agree
+            band = frame[top:bottom]
+            filled = colour_mask(band, self.fill_colours, self.tolerance)
+            bar_columns = (filled | colour_mask(band, self.track_colours, self.tolerance)).mean(axis=0) >= 0.5
+            filled_columns = filled.mean(axis=0) >= 0.5
+            column_starts, column_ends = _runs(bar_columns)
+            if not len(column_starts):
+                continue
+            widest = np.argmax(column_ends - column_starts)
+            left, right = column_starts[widest], column_ends[widest]
+            if right - left < self.min_width or (best is not None and right - left <= best[1][2]):
+                continue
+            fraction = float(filled_columns[left:right].mean())
+            best = (fraction, (int(left), int(top), int(right - left), int(thickness)))
+        return best
+
+    def read(self):
+        """
+        Capture the Steam window and read its download progress bar.
+
+        Returns:
+            ProgressBar with screen coordinates, or None if no bar is visible
+        """
+        region = self.capture_region()
+        found = self.find(self.image_detector.capture(region))
+        if found is None:
+            return None
+        fraction, (left, top, width, height) = found
+        if region is not None:
+            left, top = left + region[0], top + region[1]
+        return ProgressBar(fraction, (left, top, width, height))
+
+
+class DownloadProgressTracker:
+    """
+    Turns successive progress readings into a download rate, an ETA and a stall signal.
+    """
+
+    def __init__(self, config):
+        """
+        Args:
+            config: The loaded configuration dictionary
+        """
+        progress_config = config.get('download_progress') or {}
+        self.rate_window = progress_config.get('rate_window', 300)
+        self.stall_timeout = progress_config.get('stall_timeout', 900)
+        self.min_advance = progress_config.get('min_advance', 0.002)
+        self.screenshot_step = progress_config.get('screenshot_step', 20)
+        self.samples = []
+        self._advance_fraction = None
+        self._advance_time = None
+        self._last_milestone = None
+
+    def update(self, fraction, now=None):
+        """
+        Record a progress reading.
+
+        Args:
+            fraction: Filled share of the bar, 0 to 1
+            now: Time of the reading (defaults to the current time)
+
+        Returns:
+            bool: True if the reading counts as the download advancing
+        """
+        now = time.time() if now is None else now
+        if self.samples and fraction < self.samples[-1][1] - 0.05:
+            # The bar went back (Steam moved on to the next download stage): start over
+            logger.debug(f"Download progress dropped from {self.samples[-1][1]:.3f} to {fraction:.3f}, resetting")
+            self.samples = []
+            self._advance_fraction = None
+            self._last_milestone = None
+        self.samples.append((now, fraction))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.rate_window:
+            self.samples.pop(0)
+        if self._advance_fraction is None or fraction >= self._advance_fraction + self.min_advance:
+            self._advance_fraction = fraction
+            self._advance_time = now
+            return True
+        return False
+
+    @property
+    def fraction(self):
+        """Latest reading, or None before the first one"""
+        return self.samples[-1][1] if self.samples else None
+
+    def rate(self):
+        """Fraction completed per second over the rate window, or None without enough readings"""
+        if len(self.samples) < 2 or self.samples[-1][0] - self.samples[0][0] <= 0:
+            return None
+        times, fractions = np.asarray(self.samples).T
+        return float(np.polyfit(times - times[0], fractions, 1)[0])
+
+    def eta(self):
+        """Seconds until the bar is full at the current rate, or None if it is not moving"""
+        rate = self.rate()
+        if not rate or rate <= 0:
+            return None
+        return max(0.0, (1 - self.fraction) / rate)
+
+    def stalled(self, now=None):
+        """True once the bar has not advanced for stall_timeout seconds (never if disabled)"""
+        if not self.stall_timeout or self._advance_time is None:
+            return False
+        now = time.time() if now is None else now
+        return now - self._advance_time >= self.stall_timeout
+
+    def stalled_for(self, now=None):
+        """Seconds since the bar last advanced"""
+        if self._advance_time is None:
+            return 0
+        return (time.time() if now is None else now) - self._advance_time
+
+    def restart_stall_timer(self, now=None):
+        """Count the stall time from now on (after an attempt to restart the download)"""
+        self._advance_time = time.time() if now is None else now
+
+    def milestone(self):
+        """
+        Report the progress step (e.g. 20, 40, ...) newly reached by the latest reading.
+
+        Returns:
+            int: The step in percent, or None if no new step was reached
+        """
+        if not self.screenshot_step or self.fraction is None:
+            return None
+        reached = int(self.fraction * 100 // self.screenshot_step * self.screenshot_step)
+        if self._last_milestone is None:
+            # The step the bar already sat at when tracking started is not a milestone
+            self._last_milestone = reached
+            return None
+        if reached <= self._last_milestone:
+            return None
+        self._last_milestone = reached
+        return reached
@@ -0,0 +1,261 @@
+"""
+Download throughput monitor for the SteamOKAutomaticScript.
+A background thread periodically reads the bytes the installation has written -
+the byte counters of its appmanifest once it is known, otherwise the sizes
+under the steamapps/downloading folders of the install, walked on a longer
+interval - keeps a moving-average transfer rate and an overall average for
+the game, estimates the remaining time and declares a stall once nothing has
+been written for a configurable window - long before the installation timeout
+runs out.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+# Get logger
+logger = logging.getLogger()
+
+MB = 1024 * 1024
+
+
+def directory_size(path):
+    """
+    Total size of the files under a directory.
+
+    Args:
+        path: Directory to walk
+
+    Returns:
+        int: Bytes, 0 if the directory does not exist
+    """
+    total = 0
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        # Steam removed or moved the file between listing and stat
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+class DownloadThroughputMonitor:
+    """
+    Samples the bytes written by an installation on a timer.
+    Only growth counts as transfer: Steam moving finished chunks from downloading/
+    into common/ or deleting them leaves the total unchanged or shrinking, which
+    must neither add throughput nor look like progress being undone.
+    """
+
+    def __init__(self, config):
+        """
+        Args:
+            config: The loaded configuration dictionary
+        """
+        throughput_config = config.get('download_throughput') or {}
+        self.enabled = throughput_config.get('enabled', True)
+        self.sample_interval = throughput_config.get('sample_interval', 5)
+        self.average_window = throughput_config.get('average_window', 60)
+        self.stall_window = throughput_config.get('stall_window', 600)
+        self.min_growth = throughput_config.get('min_growth', 1) * MB
+        # Walking the folders stats every file: only every walk_interval seconds
+        self.walk_interval = throughput_config.get('walk_interval', 30)
+        self._paths = ()
+        self._byte_source = None
+        # 'source' or 'walk': the two measure different totals, so switching restarts the baseline
+        self._measured_by = None
+        self._last_walk = None
+        self._samples = deque()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.reset()
+
+    def reset(self):
+        """Forget all samples (a new installation)"""
+        with self._lock:
+            self._samples.clear()
+            self._last_bytes = None
+            self._growth_bytes = None
+            self._measured_by = None
+            self._last_walk = None
+            self._transferred = 0
+            self._first_growth = None
+            self._last_growth = None
+            self._watch_start = None
+            self._stall_reset = None
+
+    def set_paths(self, paths):
+        """
+        Set the folders whose contents are counted. Paths that do not exist yet are fine.
+
+        Args:
+            paths: Iterable of directories
+        """
+        paths = tuple(sorted(set(path for path in paths if path)))
+        with self._lock:
+            if paths == self._paths:
+                return
+            self._paths = paths
+            # A different set of folders has a different total: restart the byte baseline
+            self._last_bytes = None
+            self._growth_bytes = None
+        logger.info(f"Download throughput monitor watching: {', '.join(paths) if paths else 'nothing'}")
+
+    def set_byte_source(self, source):
+        """
+        Read the written bytes from a counter instead of walking the folders.
+
+        Args:
+            source: Callable returning the bytes written so far, or None when it has
+                    no figure (the folders are walked then); None to always walk
+        """
+        with self._lock:
+            if source == self._byte_source:
+                return
+            self._byte_source = source
+
+    def start(self):
+        """Start the sampling thread (no-op if disabled or already running)"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="DownloadThroughput", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the sampling thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _sample_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.debug(f"Download throughput sample failed: {str(e)}")
+            self._stop_event.wait(self.sample_interval)
+
+    def sample(self, now=None, total=None):
+        """
+        Take one sample of the bytes written.
+
+        Args:
+            now: Time of the sample (defaults to the current time)
+            total: Measured bytes (defaults to the byte source, else walking the
+                   watched folders at most every walk_interval seconds)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            paths, source = self._paths, self._byte_source
+        measured_by = 'source'
+        if total is None and source is not None:
+            total = source()
+        if total is None:
+            if not paths:
+                return
+            if self._last_walk is not None and now - self._last_walk < self.walk_interval:
+                return
+            self._last_walk = now
+            measured_by = 'walk'
+            total = sum(directory_size(path) for path in paths)
+        with self._lock:
+            if measured_by != self._measured_by:
+                # A different kind of total: restart the byte baseline
+                self._measured_by = measured_by
+                self._last_bytes = None
+                self._growth_bytes = None
+            if self._watch_start is None:
+                self._watch_start = now
+            growth = 0 if self._last_bytes is None else max(0, total - self._last_bytes)
+            self._last_bytes = total
+            self._transferred += growth
+            # Growth is measured from the total at the last accepted growth, not the previous
+            # sample, so a download slower than min_growth per sample still counts as writing
+            if self._growth_bytes is None or total < self._growth_bytes:
+                self._growth_bytes = total
+            elif total - self._growth_bytes >= self.min_growth:
+                self._growth_bytes = total
+                if self._first_growth is None:
+                    # Rate of the whole download is measured from the sample before the first growth
+                    self._first_growth = self._samples[-1][0] if self._samples else now
+                self._last_growth = now
+            self._samples.append((now, self._transferred))
+            while len(self._samples) > 2 and now - self._samples[0][0] > self.average_window:
+                self._samples.popleft()
+
+    def throughput(self):
+        """Moving-average rate in bytes per second, or None before two samples"""
+        with self._lock:
+            if len(self._samples) < 2:
+                return None
+            (start, first), (end, last) = self._samples[0], self._samples[-1]
+        if end <= start:
+            return None
+        return (last - first) / (end - start)
+
+    def average_throughput(self):
+        """Rate in bytes per second over the whole download so far, or None before any growth"""
+        with self._lock:
+            if self._first_growth is None or self._last_growth <= self._first_growth:
+                return None
+            return self._transferred / (self._last_growth - self._first_growth)
+
+    @property
+    def transferred(self):
+        """Bytes written since monitoring started"""
+        return self._transferred
+
+    def eta(self, remaining_bytes):
+        """
+        Seconds until the remaining bytes are written at the moving-average rate.
+
+        Args:
+            remaining_bytes: Bytes still to be written
+
+        Returns:
+            float: Seconds, or None if nothing is being written
+        """
+        rate = self.throughput()
+        if not rate or rate <= 0 or remaining_bytes is None:
+            return None
+        return max(0.0, remaining_bytes / rate)
+
+    def restart_stall_timer(self, now=None):
+        """Count the stall time from now on (after an attempt to restart the download)"""
+        with self._lock:
+            self._stall_reset = time.time() if now is None else now
+
+    def stalled_for(self, now=None):
+        """Seconds since the watched folders last grew (or since watching started or the stall timer was restarted)"""
+        with self._lock:
+            since = max(filter(None, (self._last_growth, self._watch_start, self._stall_reset)), default=None)
+        if since is None:
+            return 0
+        return (time.time() if now is None else now) - since
+
+    def stalled(self, now=None):
+        """True once nothing has been written for stall_window seconds (never if disabled)"""
+        if not self.enabled or not self.stall_window:
+            return False
+        return self.stalled_for(now) >= self.stall_window
+
+
+def format_throughput(bytes_per_second):
+    """Human readable MB/s, '--' if unknown"""
+    if bytes_per_second is None:
+        return "--"
+    return f"{bytes_per_second / MB:.2f} MB/s"
@@ -0,0 +1,219 @@
+"""
+Central frame-capture service for the SteamOKAutomaticScript.
+A single background thread grabs full-screen frames into a bounded ring buffer.
+Detectors and the screenshot manager share those frames instead of each taking
+their own screenshots, and the thread only captures when somebody asks for a frame.
+"""
+import time
+import logging
+import threading
+from collections import deque
+
+from screen_source import LiveScreenSource, get_screen_source
+
+# Get logger
+logger = logging.getLogger()
+
+# Global service storage
+_service = None
+_service_lock = threading.Lock()
+
+
+class Frame:
+    """
+    A timestamped full-screen RGB frame.
+    """
+
+    def __init__(self, image, timestamp, index):
+        """
+        Args:
+            image: RGB frame as a (height, width, 3) uint8 array
+            timestamp: time.time() when the frame was captured
+            index: Sequence number of the frame
+        """
+        self.image = image
+        self.timestamp = timestamp
+        self.index = index
+
+    @property
+    def age(self):
+        """Seconds since the frame was captured"""
+        return time.time() - self.timestamp
+
+    def crop(self, region=None):
+        """
+        Get part of the frame without copying it.
+
+        Args:
+            region: Optional (left, top, width, height); None returns the whole frame
+
+        Returns:
+            numpy.ndarray: View of the requested area
+        """
+        if region is None:
+            return self.image
+        left, top, width, height = region
+        return self.image[top:top + height, left:left + width]
+
+
+class FrameCaptureService:
+    """
+    Demand-driven capture thread with a shared ring buffer of recent frames.
+    Concurrent requests are served by the same capture, and frames younger than
+    the requested max age are handed out again instead of grabbing a new one.
+    """
+
+    def __init__(self, source=None, buffer_size=3, min_interval=0.2, max_age=0.5, timeout=10):
+        """
+        Args:
+            source: Screen source frames are grabbed from (defaults to the live screen)
+            buffer_size: Number of recent frames kept in the ring buffer
+            min_interval: Minimum seconds between two captures (caps the capture rate)
+            max_age: Default age (seconds) under which a buffered frame is reused
+            timeout: Seconds a consumer waits for a new frame before giving up
+        """
+        self.source = source or LiveScreenSource()
+        self.min_interval = min_interval
+        self.max_age = max_age
+        self.timeout = timeout
+        self._frames = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        # Highest frame index a consumer is waiting for
+        self._wanted_index = -1
+        self._next_index = 0
+        self._last_capture = 0
+        self._last_error = None
+        self._running = False
+        self._thread = None
+        # Statistics
+        self.requests = 0
+        self.captures = 0
+        self.reused = 0
+
+    def start(self):
+        """Start the capture thread (no-op if already running)"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._capture_loop, name="FrameCapture", daemon=True)
+            self._thread.start()
+        logger.info("Frame capture service started")
+
+    def stop(self):
+        """Stop the capture thread"""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=1)
+        logger.info("Frame capture service stopped")
+
+    def latest(self):
+        """Return the most recent frame, or None if nothing was captured yet"""
+        with self._condition:
+            return self._frames[-1] if self._frames else None
+
+    def get_frame(self, max_age=None):
+        """
+        Get a frame no older than max_age, capturing a new one only if needed.
+
+        Args:
+            max_age: Maximum acceptable frame age in seconds (defaults to the configured one)
+
+        Returns:
+            Frame: The shared frame (treat its image as read-only)
+
+        Raises:
+            RuntimeError: If no frame could be captured within the timeout
+        """
+        max_age = self.max_age if max_age is None else max_age
+        self.start()
+        with self._condition:
+            self.requests += 1
+            if self._frames and self._frames[-1].age <= max_age:
+                self.reused += 1
+                return self._frames[-1]
+
+            # Ask the capture thread for a frame newer than anything buffered
+            wanted_index = self._next_index
+            self._wanted_index = max(self._wanted_index, wanted_index)
+            self._condition.notify_all()
+            deadline = time.time() + self.timeout
+            while self._running and (not self._frames or self._frames[-1].index < wanted_index):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError(f"No frame captured within {self.timeout}s: {self._last_error}")
+                self._condition.wait(remaining)
+            if not self._frames or self._frames[-1].index < wanted_index:
+                raise RuntimeError("Frame capture service stopped")
+            return self._frames[-1]
+
+    def frames_since(self, timestamp):
+        """Return buffered frames captured after the given time, oldest first"""
+        with self._condition:
+            return [frame for frame in self._frames if frame.timestamp > timestamp]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Request, capture and reuse counts
+        """
+        return {'requests': self.requests, 'captures': self.captures, 'reused': self.reused}
+
+    def _capture_loop(self):
+        """Background thread: capture whenever a consumer is waiting"""
+        while True:
+            with self._condition:
+                while self._running and self._next_index > self._wanted_index:
+                    self._condition.wait()
+                if not self._running:
+                    return
+
+            # Cap the capture rate however many consumers are asking
+            wait_time = self.min_interval - (time.time() - self._last_capture)
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+            try:
+                image = self.source.grab()
+            except Exception as e:
+                self._last_error = e
+                logger.debug(f"Frame capture failed: {str(e)}")
+                self._last_capture = time.time()
+                continue
+
+            self._last_capture = time.time()
+            with self._condition:
+                self._frames.append(Frame(image, self._last_capture, self._next_index))
+                self._next_index += 1
+                self.captures += 1
+                self._condition.notify_all()
+
+
+def get_capture_service(config):
+    """
+    Get the process-wide capture service, creating it from the configuration if needed.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        FrameCaptureService: The shared service, or None if disabled in the configuration
+    """
+    global _service
+    capture_config = config.get('frame_capture') or {}
+    if not capture_config.get('enabled', False):
+        return None
+    with _service_lock:
+        if _service is None:
+            _service = FrameCaptureService(
+                get_screen_source(config),
+                buffer_size=capture_config.get('buffer_size', 3),
+                min_interval=capture_config.get('min_interval', 0.2),
+                max_age=capture_config.get('max_age', 0.5),
+                timeout=capture_config.get('timeout', 10)
+            )
+    return _service
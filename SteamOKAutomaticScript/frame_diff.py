@@ -0,0 +1,105 @@
+"""
+Tile-hash change tracking for the SteamOKAutomaticScript.
+Hashes captured frames in fixed-size tiles so the detector can tell which parts
+of the screen changed since the previous poll, and re-match only those.
+"""
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+# Get logger
+logger = logging.getLogger()
+
+
+class TileChangeTracker:
+    """
+    Keeps the tile hashes of the last frame captured for each capture area.
+    """
+
+    def __init__(self, tile_size=64, max_areas=16):
+        """
+        Args:
+            tile_size: Edge length of a square tile in pixels
+            max_areas: Capture areas remembered at once (oldest are forgotten)
+        """
+        self.tile_size = tile_size
+        self.max_areas = max_areas
+        self._hashes = OrderedDict()
+        self._weights = None
+
+    def _tile_weights(self, channels):
+        # Fixed pseudo-random weights make the per-tile weighted sum position-sensitive
+        if self._weights is None or self._weights.shape[2] != channels:
+            rng = np.random.default_rng(0x5EED)
+            self._weights = rng.integers(1, 2 ** 31, size=(self.tile_size, self.tile_size, channels), dtype=np.uint32)
+        return self._weights
+
+    def hash_tiles(self, frame):
+        """
+        Hash a frame tile by tile.
+
+        Args:
+            frame: RGB frame as a (height, width, 3) uint8 array
+
+        Returns:
+            numpy.ndarray: (tile rows, tile columns) grid of uint32 hashes
+        """
+        if frame.ndim == 2:
+            frame = frame[:, :, np.newaxis]
+        height, width, channels = frame.shape
+        size = self.tile_size
+        rows = -(-height // size)
+        cols = -(-width // size)
+        if rows * size != height or cols * size != width:
+            frame = np.pad(frame, ((0, rows * size - height), (0, cols * size - width), (0, 0)))
+        tiles = frame.reshape(rows, size, cols, size, channels)
+        # uint32 arithmetic wraps around, which is fine for a hash
+        return np.einsum('yixjc,ijc->yx', tiles, self._tile_weights(channels), dtype=np.uint32, casting='unsafe')
+
+    def update(self, key, frame):
+        """
+        Hash a new frame for a capture area and compare it with the previous one.
+
+        Args:
+            key: Identifies the capture area (e.g. its screen rectangle)
+            frame: The newly captured frame
+
+        Returns:
+            numpy.ndarray: Boolean grid of changed tiles, or None if there is no
+                           comparable previous frame (everything counts as changed)
+        """
+        hashes = self.hash_tiles(frame)
+        previous = self._hashes.pop(key, None)
+        self._hashes[key] = hashes
+        while len(self._hashes) > self.max_areas:
+            self._hashes.popitem(last=False)
+        if previous is None or previous.shape != hashes.shape:
+            return None
+        return hashes != previous
+
+    def dirty_region(self, dirty, area):
+        """
+        Bounding box of the changed tiles inside an area of the frame.
+
+        Args:
+            dirty: Boolean tile grid returned by update()
+            area: (left, top, width, height) in frame coordinates
+
+        Returns:
+            (left, top, width, height) of the changed pixels, or None if nothing changed
+        """
+        size = self.tile_size
+        left, top, width, height = area
+        first_row, last_row = top // size, (top + height - 1) // size
+        first_col, last_col = left // size, (left + width - 1) // size
+        window = dirty[first_row:last_row + 1, first_col:last_col + 1]
+        if not window.any():
+            return None
+        rows = np.flatnonzero(window.any(axis=1))
+        cols = np.flatnonzero(window.any(axis=0))
+        dirty_left = max(left, int(first_col + cols[0]) * size)
+        dirty_top = max(top, int(first_row + rows[0]) * size)
+        dirty_right = min(left + width, int(first_col + cols[-1] + 1) * size)
+        dirty_bottom = min(top + height, int(first_row + rows[-1] + 1) * size)
+        return (dirty_left, dirty_top, dirty_right - dirty_left, dirty_bottom - dirty_top)
@@ -0,0 +1,638 @@
+"""
+Filesystem event watcher for the SteamOKAutomaticScript.
+Consumers subscribe to a directory and receive created, modified and deleted
+events for its entries (or its whole tree) instead of re-listing it on a
+timer. Backends:
+  - inotify: Linux inotify via ctypes
+  - windows: ReadDirectoryChangesW via pywin32
+  - polling: scandir snapshots compared on an interval, used where neither is
+             available and for directories that do not exist yet
+A backend that lost events (kernel queue or buffer overflow) reports an
+"overflow" event, after which the consumer should read the directory once.
+An entry may be reported more than once (e.g. found while a new directory's
+watch is being added), so consumers should treat events idempotently.
+"""
+import os
+import sys
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+# pywin32 is only available on Windows
+try:
+    import pywintypes
+    import win32con
+    import win32event
+    import win32file
+    PYWIN32_AVAILABLE = True
+except ImportError:
+    PYWIN32_AVAILABLE = False
+
+# Get logger
+logger = logging.getLogger()
+
+# Event kinds
+CREATED = 'created'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+OVERFLOW = 'overflow'
+
+# Order in which "auto" tries the backends
+AUTO_ORDER = ('inotify', 'windows', 'polling')
+
+# Global watcher storage
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+class FileEvent:
+    """
+    A change to one filesystem entry.
+    """
+
+    def __init__(self, kind, path, is_dir=False):
+        """
+        Args:
+            kind: CREATED, MODIFIED, DELETED or OVERFLOW
+            path: Path of the entry (the watched directory for OVERFLOW)
+            is_dir: Whether the entry is a directory (not known for deleted entries)
+        """
+        self.kind = kind
+        self.path = path
+        self.is_dir = is_dir
+
+    def __repr__(self):
+        return f"FileEvent({self.kind}, {self.path}{', dir' if self.is_dir else ''})"
+
+
+def _is_under(path, directory):
+    return path.startswith(os.path.join(directory, ''))
+
+
+class Subscription:
+    """
+    Events for one directory, passed to a callback or queued for get() and drain().
+    """
+
+    def __init__(self, watcher, path, recursive, callback=None):
+        """
+        Args:
+            watcher: FileSystemWatcher the subscription belongs to
+            path: Watched directory
+            recursive: Whether events from the whole tree are wanted, not just direct entries
+            callback: Optional callable receiving each FileEvent on the watcher thread
+        """
+        self.watcher = watcher
+        self.path = path
+        self.recursive = recursive
+        self.callback = callback
+        self._queue = queue.Queue()
+
+    def covers(self, event):
+        """True if the event belongs to this subscription"""
+        if event.kind == OVERFLOW:
+            return self.path == event.path or _is_under(self.path, event.path)
+        if not _is_under(event.path, self.path):
+            return False
+        return self.recursive or os.path.dirname(event.path) == self.path
+
+    def _deliver(self, event):
+        if self.callback is None:
+            self._queue.put(event)
+            return
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.error(f"Filesystem event callback for {self.path} failed: {str(e)}")
+
+    def get(self, timeout=None):
+        """
+        Take the next event, waiting up to timeout seconds.
+
+        Returns:
+            FileEvent, or None if nothing happened in time
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Take every queued event without waiting"""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def wait(self, timeout):
+        """
+        Sleep until at least one event arrives or the timeout passes.
+
+        Returns:
+            list: The queued events (empty on timeout)
+        """
+        event = self.get(timeout)
+        return [] if event is None else [event] + self.drain()
+
+    def close(self):
+        """Stop receiving events"""
+        self.watcher.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+INOTIFY_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+                | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+# Loaded C library (False once loading has failed)
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+class InotifyBackend:
+    """
+    Linux inotify. Recursive watches add a watch per directory, including directories created later.
+    """
+    name = 'inotify'
+
+    @classmethod
+    def available(cls):
+        return sys.platform.startswith('linux') and _load_libc() is not None
+
+    def __init__(self, dispatch):
+        """
+        Args:
+            dispatch: Callable receiving every FileEvent
+        """
+        self._libc = _load_libc()
+        self._dispatch = dispatch
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self._lock = threading.RLock()
+        # Watch descriptor -> directory, and watched root -> (recursive, descriptors it added)
+        self._paths = {}
+        self._roots = {}
+        self._running = True
+        self._thread = threading.Thread(target=self._read_loop, name="InotifyWatcher", daemon=True)
+        self._thread.start()
+
+    def _add(self, root, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), INOTIFY_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        self._paths[wd] = path
+        self._roots[root][1].add(wd)
+
+    def _add_tree(self, root, path, report):
+        """Watch every directory below path; report the entries found as created (they predate the watch)"""
+        events = []
+        for current, dirs, files in os.walk(path):
+            for name in dirs:
+                try:
+                    self._add(root, os.path.join(current, name))
+                except OSError:
+                    continue
+            if report:
+                events.extend(FileEvent(CREATED, os.path.join(current, name), True) for name in dirs)
+                events.extend(FileEvent(CREATED, os.path.join(current, name)) for name in files)
+        return events
+
+    def watch(self, path, recursive):
+        """Start watching a directory"""
+        with self._lock:
+            self._roots[path] = (recursive, set())
+            try:
+                self._add(path, path)
+                if recursive:
+                    self._add_tree(path, path, report=False)
+            except OSError:
+                self.unwatch(path)
+                raise
+
+    def unwatch(self, path):
+        """Stop watching a directory"""
+        with self._lock:
+            _, wds = self._roots.pop(path, (False, set()))
+            for wd in wds:
+                # Directories shared with another watched tree keep their watch
+                if any(wd in other for _, other in self._roots.values()):
+                    continue
+                self._libc.inotify_rm_watch(self._fd, wd)
+                self._paths.pop(wd, None)
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    continue
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except (OSError, ValueError):
+                break
+            for event in self._parse(data):
+                self._dispatch(event)
+
+    def _parse(self, data):
+        events = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            with self._lock:
+                if mask & IN_Q_OVERFLOW:
+                    events.extend(FileEvent(OVERFLOW, root, True) for root in self._roots)
+                    continue
+                if mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                directory = self._paths.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                is_dir = bool(mask & IN_ISDIR)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    events.append(FileEvent(CREATED, path, is_dir))
+                    if is_dir:
+                        for root, (recursive, _) in list(self._roots.items()):
+                            if recursive and _is_under(path, root):
+                                try:
+                                    self._add(root, path)
+                                except OSError:
+                                    continue
+                                events.extend(self._add_tree(root, path, report=True))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    events.append(FileEvent(DELETED, path, is_dir))
+                elif mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                    events.append(FileEvent(MODIFIED, path, is_dir))
+                elif mask & IN_DELETE_SELF and directory in self._roots:
+                    events.append(FileEvent(DELETED, directory, True))
+        return events
+
+    def close(self):
+        """Stop the reader thread and release the inotify descriptor"""
+        self._running = False
+        self._thread.join(timeout=1)
+        os.close(self._fd)
+
+
+class WindowsBackend:
+    """
+    ReadDirectoryChangesW with overlapped I/O, one reader thread per watched directory.
+    """
+    name = 'windows'
+
+    # FILE_ACTION_* codes -> event kinds (renames are a delete of the old name and a create of the new one)
+    ACTIONS = {1: CREATED, 2: DELETED, 3: MODIFIED, 4: DELETED, 5: CREATED}
+
+    @classmethod
+    def available(cls):
+        return sys.platform == 'win32' and PYWIN32_AVAILABLE
+
+    def __init__(self, dispatch):
+        """
+        Args:
+            dispatch: Callable receiving every FileEvent
+        """
+        self._dispatch = dispatch
+        self._lock = threading.Lock()
+        # Watched directory -> (thread, stop event)
+        self._watches = {}
+
+    def watch(self, path, recursive):
+        """Start watching a directory"""
+        handle = win32file.CreateFile(
+            path,
+            0x0001,  # FILE_LIST_DIRECTORY
+            win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE | win32con.FILE_SHARE_DELETE,
+            None,
+            win32con.OPEN_EXISTING,
+            win32con.FILE_FLAG_BACKUP_SEMANTICS | win32con.FILE_FLAG_OVERLAPPED,
+            None
+        )
+        stop = win32event.CreateEvent(None, True, False, None)
+        thread = threading.Thread(target=self._read_loop, args=(path, handle, recursive, stop),
+                                  name="DirectoryWatcher", daemon=True)
+        with self._lock:
+            self._watches[path] = (thread, stop)
+        thread.start()
+
+    def unwatch(self, path):
+        """Stop watching a directory"""
+        with self._lock:
+            thread, stop = self._watches.pop(path, (None, None))
+        if thread is not None:
+            win32event.SetEvent(stop)
+            thread.join(timeout=1)
+
+    def _read_loop(self, path, handle, recursive, stop):
+        notify_filter = (win32con.FILE_NOTIFY_CHANGE_FILE_NAME | win32con.FILE_NOTIFY_CHANGE_DIR_NAME
+                         | win32con.FILE_NOTIFY_CHANGE_SIZE | win32con.FILE_NOTIFY_CHANGE_LAST_WRITE)
+        buffer = win32file.AllocateReadBuffer(64 * 1024)
+        overlapped = pywintypes.OVERLAPPED()
+        overlapped.hEvent = win32event.CreateEvent(None, True, False, None)
+        try:
+            while True:
+                win32file.ReadDirectoryChangesW(handle, buffer, recursive, notify_filter, overlapped)
+                result = win32event.WaitForMultipleObjects([overlapped.hEvent, stop], False, win32event.INFINITE)
+                if result != win32event.WAIT_OBJECT_0:
+                    # CancelIo only cancels requests issued by the calling thread, i.e. this one
+                    win32file.CancelIo(handle)
+                    break
+                size = win32file.GetOverlappedResult(handle, overlapped, True)
+                if not size:
+                    # The change buffer overflowed and the changes were dropped
+                    self._dispatch(FileEvent(OVERFLOW, path, True))
+                    continue
+                for action, name in win32file.FILE_NOTIFY_INFORMATION(buffer, size):
+                    kind = self.ACTIONS.get(action)
+                    if kind is None:
+                        continue
+                    entry = os.path.join(path, name)
+                    self._dispatch(FileEvent(kind, entry, kind != DELETED and os.path.isdir(entry)))
+        except pywintypes.error as e:
+            logger.error(f"Watching {path} failed: {str(e)}")
+            self._dispatch(FileEvent(OVERFLOW, path, True))
+        finally:
+            win32file.CloseHandle(handle)
+
+    def close(self):
+        """Stop every reader thread"""
+        for path in list(self._watches):
+            self.unwatch(path)
+
+
+class PollingBackend:
+    """
+    Fallback: snapshots each watched directory with os.scandir on an interval and reports the differences.
+    Directories that do not exist yet are treated as empty.
+    """
+    name = 'polling'
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def __init__(self, dispatch, interval=1.0):
+        """
+        Args:
+            dispatch: Callable receiving every FileEvent
+            interval: Seconds between two snapshots
+        """
+        self._dispatch = dispatch
+        self.interval = interval
+        self._lock = threading.Lock()
+        # Watched directory -> (recursive, snapshot)
+        self._roots = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._poll_loop, name="PollingWatcher", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _snapshot(path, recursive):
+        """Entry path -> (is_dir, mtime_ns, size)"""
+        snapshot = {}
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        snapshot[entry.path] = (is_dir, stat.st_mtime_ns, 0 if is_dir else stat.st_size)
+                        if is_dir and recursive:
+                            pending.append(entry.path)
+            except OSError:
+                continue
+        return snapshot
+
+    def watch(self, path, recursive):
+        """Start watching a directory (the current contents are the baseline)"""
+        snapshot = self._snapshot(path, recursive)
+        with self._lock:
+            self._roots[path] = (recursive, snapshot)
+
+    def unwatch(self, path):
+        """Stop watching a directory"""
+        with self._lock:
+            self._roots.pop(path, None)
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                roots = list(self._roots.items())
+            for path, (recursive, before) in roots:
+                after = self._snapshot(path, recursive)
+                with self._lock:
+                    if path not in self._roots:
+                        continue
+                    self._roots[path] = (recursive, after)
+                # Sorted so a new directory is reported before its contents
+                for entry in sorted(after.keys() - before.keys()):
+                    self._dispatch(FileEvent(CREATED, entry, after[entry][0]))
+                for entry in sorted(before.keys() - after.keys(), reverse=True):
+                    self._dispatch(FileEvent(DELETED, entry, before[entry][0]))
+                for entry in sorted(after.keys() & before.keys()):
+                    if not after[entry][0] and after[entry] != before[entry]:
+                        self._dispatch(FileEvent(MODIFIED, entry))
+
+    def close(self):
+        """Stop the polling thread"""
+        self._stop_event.set()
+        self._thread.join(timeout=1)
+
+
+WATCHER_BACKENDS = {
+    'inotify': InotifyBackend,
+    'windows': WindowsBackend,
+    'polling': PollingBackend,
+}
+
+
+class FileSystemWatcher:
+    """
+    Owns the backend watches and routes their events to the subscriptions.
+    """
+
+    def __init__(self, backend='auto', poll_interval=1.0):
+        """
+        Args:
+            backend: Backend name from WATCHER_BACKENDS, or "auto" for the first of AUTO_ORDER that starts
+            poll_interval: Seconds between snapshots of polled directories
+        """
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        # Watched directory -> [backend, recursive, subscription count]
+        self._watched = {}
+        self._polling = None
+        self.backend = self._create_backend(backend)
+        logger.info(f"Using {self.backend.name} filesystem events")
+
+    def _create_backend(self, name):
+        candidates = AUTO_ORDER if name == 'auto' else (name,)
+        for candidate in candidates:
+            backend = WATCHER_BACKENDS.get(candidate)
+            if backend is None:
+                raise ValueError(f"Unknown filesystem watcher backend {candidate}")
+            if not backend.available():
+                if name != 'auto':
+                    logger.warning(f"Filesystem watcher backend {candidate} is not available, polling instead")
+                continue
+            if backend is PollingBackend:
+                return self._polling_backend()
+            try:
+                return backend(self._dispatch)
+            except Exception as e:
+                logger.warning(f"Filesystem watcher backend {candidate} failed to start: {str(e)}")
+        return self._polling_backend()
+
+    def _polling_backend(self):
+        if self._polling is None:
+            self._polling = PollingBackend(self._dispatch, self.poll_interval)
+        return self._polling
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def subscribe(self, path, recursive=False, callback=None):
+        """
+        Receive events for a directory's entries.
+
+        Args:
+            path: Directory to watch (may not exist yet; it is polled until then)
+            recursive: Also receive events from every subdirectory
+            callback: Optional callable receiving each FileEvent on the watcher thread;
+                      without one, events are queued on the subscription
+
+        Returns:
+            Subscription: Use get(), wait() or drain() to read events, close() to stop
+        """
+        path = os.path.abspath(path)
+        subscription = Subscription(self, path, recursive, callback)
+        with self._lock:
+            watched = self._watched.get(path)
+            if watched is not None and (watched[1] or not recursive):
+                watched[2] += 1
+            else:
+                count = 1
+                if watched is not None:
+                    # A recursive subscription to a directory watched flat: re-watch the whole tree
+                    watched[0].unwatch(path)
+                    count += watched[2]
+                self._watched[path] = [self._watch(path, recursive), recursive, count]
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def _watch(self, path, recursive):
+        backend = self.backend
+        if backend is not self._polling and not os.path.isdir(path):
+            logger.info(f"{path} does not exist yet, polling it for changes")
+            backend = self._polling_backend()
+        try:
+            backend.watch(path, recursive)
+        except Exception as e:
+            if backend is self._polling:
+                raise
+            logger.warning(f"{backend.name} cannot watch {path} ({str(e)}), polling it instead")
+            backend = self._polling_backend()
+            backend.watch(path, recursive)
+        return backend
+
+    def unsubscribe(self, subscription):
+        """Stop delivering events to a subscription"""
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+            watched = self._watched.get(subscription.path)
+            if watched is None:
+                return
+            watched[2] -= 1
+            if watched[2] <= 0:
+                watched[0].unwatch(subscription.path)
+                del self._watched[subscription.path]
+
+    def _dispatch(self, event):
+        with self._lock:
+            targets = [subscription for subscription in self._subscriptions if subscription.covers(event)]
+        for subscription in targets:
+            subscription._deliver(event)
+
+    def close(self):
+        """Stop every backend"""
+        with self._lock:
+            self._subscriptions = []
+            self._watched = {}
+        self.backend.close()
+        if self._polling is not None and self._polling is not self.backend:
+            self._polling.close()
+
+
+def get_fs_watcher(config):
+    """
+    Get the process-wide filesystem watcher.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        FileSystemWatcher: The watcher
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            watcher_config = config.get('fs_watcher') or {}
+            _watcher = FileSystemWatcher(watcher_config.get('backend', 'auto'),
+                                         watcher_config.get('poll_interval', 1.0))
+    return _watcher
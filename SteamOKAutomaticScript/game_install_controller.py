@@ -3,13 +3,18 @@ import os
 import time
 
 import pyautogui as pg
-import pygetwindow as gw
 import pyperclip
 import re
-import win32gui
+from PIL import Image
 from license_agreement_handler import LicenseAgreementHandler
 from tqdm import tqdm
 from image_utils import ImageDetector
+from download_progress import DownloadProgressReader, DownloadProgressTracker
+from download_throughput import DownloadThroughputMonitor, format_throughput
+from steam_manifest import SteamAppsMonitor, get_steam_library_index
+from tree_scanner import IncrementalTreeScanner
+from anticheat_signatures import get_anticheat_index
+from fs_watcher import get_fs_watcher, CREATED, DELETED, OVERFLOW
 from window_utils import activate_window_by_typing, activate_window_by_title, activate_window
 from config import get_config, load_config
 import threading
@@ -33,6 +38,8 @@ class SteamOKController:
         self.results = {}  # 存储游戏检查结果
         self.current_game_index = 0  # 当前处理的游戏索引
         self.error_messages = {}  # 存储游戏安装失败的错误信息
+        self.anticheat_vendors = {}  # 存储检测到的反作弊厂商
+        self.download_throughput = {}  # 存储游戏下载的平均速度（字节/秒）
         self.license_handler = LicenseAgreementHandler()  # 创建许可协议处理器实例
         self.screenshot_mgr = screenshot_mgr  # Store screenshot manager as instance variable
         
@@ -50,6 +57,17 @@ class SteamOKController:
         self.steam_apps_downloading = os.path.join(self.steam_apps_base, 'downloading')
         # For tracking folders in downloading directory that existed before installation
         self.downloading_folders_before_install = set()
+        # Folders that appeared in downloading since the installation started, kept up to date by filesystem events
+        self.fs_watcher = get_fs_watcher(self.config)
+        self._downloading_events = None
+        self.new_download_dirs = set()
+        # Installed apps of all Steam libraries (libraryfolders.vdf + appmanifests), refreshed on mtime changes
+        self.library_index = get_steam_library_index(self.steam_apps_base)
+        # appmanifest_<appid>.acf of the installation: exact progress and completion
+        self.manifest_monitor = SteamAppsMonitor(self.steam_apps_base, self.library_index)
+        # Incremental anti-cheat scan: only directories that changed since the last check are listed,
+        # and every entry is looked up in the compiled signatures of all vendors
+        self.anticheat_scanner = IncrementalTreeScanner(get_anticheat_index(self.config).match)
         
         # Initialize paths for image detection
         self.steamok_not_save_image = os.path.join(os.path.dirname(__file__), self.game_controller_config['steamok_not_save_image'])
@@ -68,9 +86,22 @@ class SteamOKController:
         self.steam_accept_button_image = os.path.join(os.path.dirname(__file__), self.game_controller_config['steam_accept_button_image'])
         self.steam_downloading_image = os.path.join(os.path.dirname(__file__), self.game_controller_config['steam_downloading_image'])
         self.steam_downloading_image2 = os.path.join(os.path.dirname(__file__), self.game_controller_config['steam_downloading_image2'])
+        # Call-site thresholds that differ from the templates' own (None falls back to image_detector.templates)
+        self.image_confidences = self.game_controller_config.get('image_confidences') or {}
         
         
         self.image_detector = ImageDetector(self.config)
+        # Steam下载进度条读取器（配置关闭时为None）
+        progress_config = self.config.get('download_progress') or {}
+        self.progress_reader = DownloadProgressReader(self.config, self.image_detector) if progress_config.get('enabled', True) else None
+        # 进度条颜色未经录制截图校准前，进度条停滞只记录日志和截图，不中止安装
+        self.progress_bar_stall_abort = progress_config.get('stall_abort', False)
+        # 后台统计下载目录写入的字节数：MB/s、预计剩余时间和停滞检测
+        self.throughput_monitor = DownloadThroughputMonitor(self.config)
+        throughput_config = self.config.get('download_throughput') or {}
+        self.stall_action = throughput_config.get('stall_action', 'retry')
+        self.stall_retries = throughput_config.get('stall_retries', 1)
+        self._stall_retries_left = 0
         
         # Installation timeout from config
         self.installation_timeout = self.config.get('timing').get('installation_timeout')
@@ -109,10 +140,7 @@ class SteamOKController:
             logger.debug(f"Search box image path: {search_box_image}")
 
             # 尝试提高匹配精度
-            search_box_location = pg.locateOnScreen(
-                search_box_image,
-                confidence=0.7  # 只保留confidence
-            )
+            search_box_location = self.image_detector.locate(search_box_image)
             if search_box_location:
                 search_box_center = (
                     search_box_location[0] + search_box_location[2] / 2,
@@ -144,22 +172,13 @@ class SteamOKController:
                     self.screenshot_mgr.take_screenshot(game_name, "search_results", min_interval_seconds=0)
                 else:
                     # Original screenshot code - kept for backward compatibility
-                    windows = gw.getWindowsWithTitle("SteamOK")
-                    if not windows:
+                    # The window rectangle comes from the screen source, so this also works on a replayed session
+                    region = self.image_detector.screen_source.window_region("SteamOK")
+                    if region is None:
                         logger.error("SteamOK window not found")
                         return False
 
-                    window = None
-                    for w in windows:
-                        if w.title == "SteamOK":  # 精确匹配标题
-                            window = w
-                            break
-
-                    if not window:
-                        logger.error("No window with exact 'SteamOK' title found")
-                        return False
-
-                    screenshot = pg.screenshot(region=(window.left, window.top, window.width, window.height))
+                    screenshot = Image.fromarray(self.image_detector.capture(region))
                     formatted_name = self._format_game_name(game_name)
                     game_dir = f"screenshots/{formatted_name}"
                     os.makedirs(game_dir, exist_ok=True)
@@ -174,7 +193,7 @@ class SteamOKController:
                 if self.screenshot_mgr:
                     self.screenshot_mgr.take_screenshot(game_name, "search_box_not_found", min_interval_seconds=0)
                 else:
-                    screenshot = pg.screenshot()
+                    screenshot = Image.fromarray(self.image_detector.capture())
                     screenshot.save("debug_search_box_not_found.png")
                 return False
 
@@ -188,10 +207,7 @@ class SteamOKController:
             # 读取游戏列表表头截图
             game_list_header_image = self.steamok_game_list_image
             # 尝试提高匹配精度
-            game_list_header_location = pg.locateOnScreen(
-                game_list_header_image,
-                confidence=0.65  # 只保留confidence
-            )
+            game_list_header_location = self.image_detector.locate(game_list_header_image)
             if game_list_header_location:
                 game_list_header_center = (
                     game_list_header_location[0] + game_list_header_location[2] / 2,
@@ -237,7 +253,7 @@ class SteamOKController:
         try:
             # 尝试通过OCR识别 '马上玩' 按钮
             play_button_image = self.steamok_play_button_image
-            play_button_location = pg.locateOnScreen(play_button_image, confidence=0.9)  # 提高精度
+            play_button_location = self.image_detector.locate(play_button_image)
 
             if play_button_location:
                 # 找到按钮，点击按钮中心
@@ -265,7 +281,7 @@ class SteamOKController:
         try:
             # 尝试通过OCR识别确认按钮
             confirm_button_image = self.steamok_confirm_play_button_image
-            confirm_button_location = pg.locateOnScreen(confirm_button_image, confidence=0.84)  # 提高精度
+            confirm_button_location = self.image_detector.locate(confirm_button_image)
 
             if confirm_button_location:
                 # 找到确认按钮，点击按钮中心
@@ -288,25 +304,14 @@ class SteamOKController:
             logger.error(f"Error confirming start game")
             return False
 
-    def find_start_game_step(self):
-        max_attempts = 5
-        attempts = 0
-        while attempts < max_attempts:
-            """检查并点击确认按钮"""
-            try:
-                # 尝试通过OCR识别确认按钮
-                start_game_step_image = self.steamok_start_game_step_image
-                start_game_step_location = pg.locateOnScreen(start_game_step_image, confidence=0.9)  # 提高精度
-
-                if start_game_step_location:
-                    logger.info("找到[启动游戏步骤]")
-                    return True
-
-            except Exception as e:
-                logger.warning(f"[启动游戏步骤] not found after {attempts} attempts")
-            attempts += 1
-            time.sleep(1)
-        logger.error("[启动游戏步骤] not found after 3 attempts")
+    def find_start_game_step(self, timeout=5):
+        """等待[启动游戏步骤]出现，出现后立即返回"""
+        start_game_step_image = self.steamok_start_game_step_image
+        matches = self.image_detector.wait_for_any([start_game_step_image], timeout)
+        if matches[start_game_step_image]:
+            logger.info("找到[启动游戏步骤]")
+            return True
+        logger.error(f"[启动游戏步骤] not found after {timeout} seconds")
         return False
 
     def click_install_button(self):
@@ -315,6 +320,10 @@ class SteamOKController:
             logger.info("Starting installation button click process")
             time.sleep(1)
             
+            # Watch the downloading directory first, so no folder created while listing it is missed
+            self._stop_watching_downloading()
+            self._downloading_events = self.fs_watcher.subscribe(self.steam_apps_downloading)
+            self.new_download_dirs = set()
             # Record existing folders in downloading directory before installation
             if os.path.exists(self.steam_apps_downloading) and os.path.isdir(self.steam_apps_downloading):
                 self.downloading_folders_before_install = set(d for d in os.listdir(self.steam_apps_downloading) 
@@ -323,6 +332,9 @@ class SteamOKController:
             else:
                 logger.warning(f"Downloading directory {self.steam_apps_downloading} not found or not accessible")
                 self.downloading_folders_before_install = set()
+            # Record existing app manifests, so the one of this installation can be told apart
+            self.manifest_monitor.snapshot()
+            self.anticheat_scanner.reset()
             
             install_button_image = self.steam_install_button_image
             install_button_image2 = self.steam_install_button_image2
@@ -330,27 +342,19 @@ class SteamOKController:
             reinstall_button_image2 = self.steam_reinstall_button_image2
 
             logger.debug("Searching for install/reinstall buttons...")
-            install_button_location = None
+            # 一次截图同时匹配所有安装/重新安装按钮
+            button_matches = self.image_detector.locate_many([
+                install_button_image, install_button_image2,
+                reinstall_button_image, reinstall_button_image2
+            ])
+            install_button_location = button_matches[install_button_image].box or button_matches[install_button_image2].box
             reinstall_button_location = None
 
-            try:
-                install_button_location = pg.locateOnScreen(install_button_image, confidence=0.9)
-            except Exception as e:
-                logger.warning("Install button not found, will retry later")
-                try:
-                    install_button_location = pg.locateOnScreen(install_button_image2, confidence=0.9)
-                except Exception as e:
-                    logger.warning("Install button2 not found")
-
             if install_button_location is None:
-                try:
-                    reinstall_button_location = pg.locateOnScreen(reinstall_button_image, confidence=0.9)
-                except Exception as e:
+                logger.warning("Install button not found, will retry later")
+                reinstall_button_location = button_matches[reinstall_button_image].box or button_matches[reinstall_button_image2].box
+                if reinstall_button_location is None:
                     logger.warning("Reinstall button not found")
-                    try:
-                        reinstall_button_location = pg.locateOnScreen(reinstall_button_image2, confidence=0.9)
-                    except Exception as e:
-                        logger.warning("Reinstall button2 not found")
                 
                 time.sleep(2)
                 
@@ -361,12 +365,14 @@ class SteamOKController:
                         reinstall_button_location[1] + reinstall_button_location[3] / 2
                     )
                     pg.click(reinstall_button_center)
-                    time.sleep(10)
                     logger.info("Clicked reinstall button successfully")
                     
-                    try:
-                        install_button_location = pg.locateOnScreen(install_button_image, confidence=0.8)
-                    except Exception as e:
+                    # 最多等待10秒，安装按钮一出现就继续
+                    # 重新安装后的安装按钮使用单独配置的阈值（config.yaml: game_controller.image_confidences）
+                    install_button_location = self.image_detector.wait_for_any(
+                        {install_button_image: self.image_confidences.get('steam_install_button_after_reinstall')}, timeout=10
+                    )[install_button_image].box
+                    if install_button_location is None:
                         logger.warning("Install button not found after reinstall")
                     
                     if install_button_location:
@@ -384,17 +390,17 @@ class SteamOKController:
                 logger.debug(f"Button center coordinates: {install_button_center}")
                 pg.click(install_button_center)
                 logger.info("Clicked install button successfully")
-                time.sleep(5)
 
                 logger.debug("Checking for license agreement accept button...")
                 accept_button_image = self.steam_accept_button_image
-                try:
-                    accept_button_location = pg.locateOnScreen(accept_button_image, confidence=0.8)
-                except Exception as e:
-                    accept_button_location = None
+                # 最多等待5秒：许可协议弹出或者已经开始下载，任一出现就继续
+                matches = self.image_detector.wait_for_any(
+                    [accept_button_image, self.steam_downloading_image, self.steam_downloading_image2], timeout=5
+                )
+                accept_button_location = matches[accept_button_image].box
 
                 if accept_button_location:
-                    time.sleep(5)
+                    time.sleep(self.config['timing']['click_delay'])
                     accept_button_center = (
                         accept_button_location[0] + accept_button_location[2] / 2,
                         accept_button_location[1] + accept_button_location[3] / 2
@@ -417,6 +423,7 @@ class SteamOKController:
     def move_steamok_to_background(self):
         """将SteamOK窗口移到后台"""
         try:
+            import pygetwindow as gw
             windows = gw.getWindowsWithTitle("SteamOK")
             if not windows:
                 logger.error("SteamOK window not found")
@@ -434,6 +441,7 @@ class SteamOKController:
     def move_game_to_background(self):
         """将游戏窗口移到后台"""
         try:
+            import pygetwindow as gw
             # 获取所有窗口标题
             windows = gw.getAllWindows()
             if not windows:
@@ -453,96 +461,134 @@ class SteamOKController:
             logger.error(f"Error minimizing game window: {e}")
             return False
 
-    def check_for_easyanticheat(self, game_name):
+    def check_for_anticheat(self, game_name):
         """
-        Check if an EasyAntiCheat folder exists in new game directories in the downloading folder.
-        Only checks folders that appeared after installation started.
-        Returns True if found, False otherwise.
+        Check the installing game's directories for anti-cheat folders, DLLs and drivers
+        (EasyAntiCheat, BattlEye, nProtect GameGuard, Denuvo Anti-Cheat, ...).
+        Once the Steam library index knows the game's appmanifest, its downloading/<appid> and
+        common/<installdir> folders are checked; before that, only folders that appeared in the
+        downloading folder after installation started.
+        Returns (vendor, location) if found, (None, None) otherwise.
         """
         try:
-            eac_folders_found = []
+            anticheat_found = []
             
-            # Only check the downloading folder for newly created directories
-            if os.path.exists(self.steam_apps_downloading) and os.path.isdir(self.steam_apps_downloading):
+            manifest = self.manifest_monitor.current(game_name)
+            if manifest is not None:
+                # The game's own folders, wherever its library is
+                steamapps_dir = manifest.steamapps_dir
+                check_dirs = [path for path in (manifest.download_path, manifest.install_path)
+                              if path and os.path.isdir(path)]
+            elif self._downloading_events is not None:
                 logger.debug(f"Checking downloading folder for new directories: {self.steam_apps_downloading}")
                 
-                # Get current download directories
-                current_download_dirs = set(d for d in os.listdir(self.steam_apps_downloading) 
-                                          if os.path.isdir(os.path.join(self.steam_apps_downloading, d)))
-                
                 # Find new directories that weren't there before installation started
-                new_download_dirs = current_download_dirs - self.downloading_folders_before_install
-                
+                steamapps_dir = self.steam_apps_base
+                new_download_dirs = self._new_download_dirs()
                 if new_download_dirs:
                     logger.info(f"Found {len(new_download_dirs)} new download directories: {', '.join(new_download_dirs)}")
-                else:
-                    logger.debug("No new download directories found")
-                    return False, None
+                check_dirs = [os.path.join(self.steam_apps_downloading, d) for d in new_download_dirs]
+            else:
+                check_dirs = []
+            
+            if not check_dirs:
+                logger.debug("No game directories to check yet")
+                return None, None
+            
+            # Process each game directory
+            for check_dir in check_dirs:
+                folder = os.path.relpath(check_dir, steamapps_dir).replace(os.sep, '/')
+                logger.debug(f"Checking game directory: {check_dir}")
                 
-                # Process each new download directory
-                for download_dir in new_download_dirs:
-                    download_path = os.path.join(self.steam_apps_downloading, download_dir)
-                    logger.debug(f"Checking new download directory: {download_path}")
-                    
-                    # Check for EasyAntiCheat folder directly in the download directory
-                    eac_folder = os.path.join(download_path, 'EasyAntiCheat')
-                    if os.path.exists(eac_folder) and os.path.isdir(eac_folder):
-                        logger.warning(f"⚠️ EasyAntiCheat folder detected in new downloading directory: {download_dir}!")
-                        
-                        # Take screenshot if available
-                        if self.screenshot_mgr:
-                            self.screenshot_mgr.take_screenshot(game_name, "easyanticheat_detected_downloading", min_interval_seconds=0)
-                        
-                        eac_folders_found.append(("downloading", download_dir))
-                    
-                    # Check subdirectories recursively for EasyAntiCheat folders
-                    for root, dirs, _ in os.walk(download_path):
-                        if 'EasyAntiCheat' in dirs:
-                            eac_path = os.path.join(root, 'EasyAntiCheat')
-                            relative_path = os.path.relpath(root, download_path)
-                            logger.warning(f"⚠️ EasyAntiCheat folder detected in subdirectory of downloading/{download_dir}/{relative_path}!")
-                            
-                            # Take screenshot if available
-                            if self.screenshot_mgr:
-                                self.screenshot_mgr.take_screenshot(game_name, "easyanticheat_detected_subdir_downloading", min_interval_seconds=0)
-                            
-                            eac_folders_found.append(("downloading", f"{download_dir}/{relative_path}"))
+                # Scan for anti-cheat signatures, listing only directories changed since the last check
+                scan = self.anticheat_scanner.scan(check_dir)
+                logger.info(f"Anti-cheat scan of {folder}: {scan.examined} entries examined, "
+                            f"{scan.listed} directories listed in {scan.elapsed * 1000:.0f}ms")
+                
+                for match_path in sorted(scan.found):
+                    vendor = scan.found[match_path]
+                    relative_path = os.path.relpath(match_path, check_dir).replace(os.sep, '/')
+                    logger.warning(f"⚠️ {vendor} detected in {folder}/{relative_path}!")
+                    if self.screenshot_mgr:
+                        self.screenshot_mgr.take_screenshot(game_name, "anticheat_detected_downloading", min_interval_seconds=0)
+                    anticheat_found.append((vendor, f"{folder}/{relative_path}"))
             
-            # Return True if any EasyAntiCheat folders were found
-            if eac_folders_found:
-                # Return the first folder where EasyAntiCheat was detected
-                folder_type, folder_path = eac_folders_found[0]
-                logger.warning(f"🛑 EasyAntiCheat detected in {folder_type}/{folder_path}")
-                return True, f"{folder_type}/{folder_path}"
+            if anticheat_found:
+                # Return the first anti-cheat that was detected
+                vendor, location = anticheat_found[0]
+                logger.warning(f"🛑 {vendor} detected in {location}")
+                return vendor, location
             
-            return False, None
+            return None, None
             
         except Exception as e:
-            logger.error(f"Error checking for EasyAntiCheat: {str(e)}")
+            logger.error(f"Error checking for anti-cheat: {str(e)}")
             logger.exception("Stack trace:")
-            return False, None
+            return None, None
+
+    def _is_downloading(self, matches=None):
+        """
+        检测Steam是否显示正在下载图标
+        
+        Args:
+            matches: Optional locate_many() results that already include both downloading templates
+            
+        Returns:
+            True if either downloading icon is visible
+        """
+        if matches is None:
+            matches = self.image_detector.locate_many([self.steam_downloading_image, self.steam_downloading_image2])
+        # 画面自上次检测以来没有变化时，结果直接复用，也不必重复输出日志
+        log = logger.info if matches.changed else logger.debug
+        if matches[self.steam_downloading_image]:
+            log("检测到正在下载图标1")
+            return True
+        if matches[self.steam_downloading_image2]:
+            log("检测到正在下载图标2")
+            return True
+        return False
 
     def check_installation_complete(self, game_name=None):
         """
         持续检测安装完成状态，失败后继续检测，有超时限制
+        优先读取appmanifest_<appid>.acf判断进度和完成状态，找不到清单时再用屏幕图标检测
+        检测期间后台统计下载速度，结束后记录到self.download_throughput
         Returns:
             - True: Installation completed successfully
             - False: Installation timed out
-            - "easyanticheat": EasyAntiCheat was detected
+            - "anticheat": An anti-cheat was detected (vendor in self.anticheat_vendors)
+            - "stalled": The download progress stopped advancing
         """
+        self.throughput_monitor.reset()
+        self.throughput_monitor.set_paths(())
+        self.throughput_monitor.set_byte_source(None)
+        self.throughput_monitor.start()
+        self._stall_retries_left = self.stall_retries if self.stall_action == 'retry' else 0
+        try:
+            return self._monitor_installation(game_name)
+        finally:
+            self.throughput_monitor.stop()
+            self._stop_watching_downloading()
+            average = self.throughput_monitor.average_throughput()
+            if game_name:
+                self.download_throughput[game_name] = average
+            logger.info(f"下载平均速度: {format_throughput(average)}，共写入 {self.throughput_monitor.transferred / 1024 ** 3:.2f}GB")
+
+    def _monitor_installation(self, game_name):
+        """check_installation_complete的检测循环"""
         playable_image = self.playable_button_image
         playable2_image = self.start_game_image
 
         # Record start time for timeout tracking
         start_time = time.time()
         check_count = 0
-        last_progress_update = ""
+        progress_tracker = DownloadProgressTracker(self.config)
         
         # Get timeout in minutes for display purposes
         timeout_minutes = self.installation_timeout / 60
         
-        # Track when we last checked for EasyAntiCheat
-        last_eac_check = 0
+        # Track when we last checked for anti-cheat files
+        last_anticheat_check = 0
         
         logger.info(f"⏳ 开始监控安装进度 ({timeout_minutes:.1f}分钟超时限制)")
         
@@ -558,23 +604,39 @@ class SteamOKController:
                 check_count += 1
                 should_log = (check_count % 6 == 0)
                 
-                # Check for EasyAntiCheat every 30 seconds
-                if check_count - last_eac_check >= 3:
-                    has_eac, game_dir = self.check_for_easyanticheat(game_name)
-                    if has_eac:
-                        logger.warning(f"🛑 EasyAntiCheat detected in game directory. Aborting installation.")
+                # Check for anti-cheat files every 30 seconds
+                if check_count - last_anticheat_check >= 3:
+                    vendor, game_dir = self.check_for_anticheat(game_name)
+                    if vendor:
+                        logger.warning(f"🛑 {vendor} detected in game directory. Aborting installation.")
+                        self.anticheat_vendors[game_name] = vendor
                         
-                        # Update the Excel file with EasyAntiCheat status
-                        error_msg = f"EasyAntiCheat detected in game folder: {game_dir}"
+                        # Update the Excel file with the anti-cheat status
+                        error_msg = f"{vendor} detected in game folder: {game_dir}"
                         self._handle_game_error(game_name, error_msg)
                         
                         # Take final screenshot 
                         if self.screenshot_mgr:
-                            self.screenshot_mgr.take_screenshot(game_name, "easyanticheat_abort", min_interval_seconds=0)
+                            self.screenshot_mgr.take_screenshot(game_name, "anticheat_abort", min_interval_seconds=0)
                             
-                        # Return a special value to indicate EasyAntiCheat detection
-                        return "easyanticheat"
-                    last_eac_check = check_count
+                        # Return a special value to indicate anti-cheat detection
+                        return "anticheat"
+                    last_anticheat_check = check_count
+                
+                # 主要信号：appmanifest中的StateFlags和下载字节数
+                manifest = self.manifest_monitor.current(game_name)
+                self.throughput_monitor.set_paths(self._download_paths(manifest))
+                # 有清单时直接用其中的字节数统计速度，不再遍历游戏目录
+                self.throughput_monitor.set_byte_source(self.library_index.watcher(manifest.path).bytes_written if manifest is not None else None)
+                if manifest is not None:
+                    if manifest.fully_installed:
+                        logger.info(f"✅ appmanifest显示安装完成 ({manifest.name})，用时 {elapsed_time / 60:.1f} 分钟")
+                        return True
+                    if self._report_download_progress(progress_tracker, game_name, elapsed_time, should_log, manifest):
+                        return "stalled"
+                    # 等待最多10秒，清单一显示安装完成就立即进入下一轮判断
+                    self.manifest_monitor.wait_until_installed(timeout=10)
+                    continue
                 
                 if not self.activate_steam_window():
                     if should_log:
@@ -583,52 +645,38 @@ class SteamOKController:
                     continue
 
                 try:
-                    try:
-                        downloading_location = pg.locateOnScreen(self.steam_downloading_image, confidence=0.9)
-                        logger.info("检测到正在下载图标1")
-                    except Exception as e:
-                        try:
-                            downloading_location = pg.locateOnScreen(self.steam_downloading_image2, confidence=0.9)
-                            logger.info("检测到正在下载图标2")
-                        except Exception as e:
-                            downloading_location = None
-                    if downloading_location:
+                    if self._is_downloading():
+                        if self._report_download_progress(progress_tracker, game_name, elapsed_time, should_log):
+                            return "stalled"
                         time.sleep(10)
                         continue
-                    # 检测两遍下载图片以防万一
-                    time.sleep(20)
-                    
-                    try:
-                        downloading_location = pg.locateOnScreen(self.steam_downloading_image, confidence=0.9)
-                        logger.info("检测到正在下载图标1")
-                    except Exception as e:
-                        try:
-                            downloading_location = pg.locateOnScreen(self.steam_downloading_image2, confidence=0.9)
-                            logger.info("检测到正在下载图标2")
-                        except Exception as e:
-                            downloading_location = None
-                    if downloading_location:
+                    # 检测两遍下载图片以防万一：最多等待20秒，下载图标或开始游戏图标任一出现就立即判断
+                    matches = self.image_detector.wait_for_any([
+                        self.steam_downloading_image,
+                        self.steam_downloading_image2,
+                        playable2_image,
+                        playable_image
+                    ], timeout=20)
+                    if self._is_downloading(matches):
                         logger.info("检测到正在下载图标")
+                        if self._report_download_progress(progress_tracker, game_name, elapsed_time, should_log):
+                            return "stalled"
                         time.sleep(10)
                         continue
                     # 同时检测两个图标
-                    playable2_location = None
-                    playable_location = None
+                    playable2_location = matches[playable2_image].box
+                    playable_location = matches[playable_image].box
                     
-                    try:
-                        playable2_location = pg.locateOnScreen(playable2_image, confidence=0.72)
+                    if playable2_location:
                         if should_log:
                             logger.debug(f"playable2图标检测成功")
-                    except Exception as e:
-                        if should_log and check_count > 12:  # Only log after 2 minutes
-                            logger.debug(f"playable2图标检测失败")                    
-                    try:
-                        playable_location = pg.locateOnScreen(playable_image, confidence=0.88)
+                    elif should_log and check_count > 12:  # Only log after 2 minutes
+                        logger.debug(f"playable2图标检测失败")
+                    if playable_location:
                         if should_log:
                             logger.debug(f"playable图标检测成功")
-                    except Exception as e:
-                        if should_log and check_count > 12:  # Only log after 2 minutes
-                            logger.debug(f"playable图标检测失败")
+                    elif should_log and check_count > 12:  # Only log after 2 minutes
+                        logger.debug(f"playable图标检测失败")
 
 
                     # 任意一个图标检测到就返回True
@@ -646,26 +694,6 @@ class SteamOKController:
                     if should_log and check_count > 12:  # Only log after 2 minutes
                         logger.debug(f"图像识别失败: {str(e)}")
 
-                # Only log periodically to reduce console output
-                if should_log:
-                    elapsed_min = elapsed_time / 60
-                    progress_percent = min(int((elapsed_min / timeout_minutes) * 100), 99)
-                    
-                    # Create a progress bar-like indicator 
-                    progress_indicator = f"[{'=' * int(progress_percent/5)}{'>' if progress_percent < 99 else '='}{'.' * (20-int(progress_percent/5))}]"
-                    
-                    # Create a clean progress message
-                    current_progress = f"⏳ 安装进度: {progress_indicator} {progress_percent}% ({elapsed_min:.1f}/{timeout_minutes:.1f}分钟)"
-                    
-                    # Only print if the message has changed
-                    if current_progress != last_progress_update:
-                        logger.info(current_progress)
-                        last_progress_update = current_progress
-                        
-                        # Take an occasional progress screenshot
-                        if self.screenshot_mgr and game_name and (progress_percent % 20 == 0):
-                            self.screenshot_mgr.take_screenshot(game_name, f"progress_{progress_percent}pct", min_interval_seconds=1200)
-                
                 time.sleep(10)
 
             except Exception as e:
@@ -673,6 +701,150 @@ class SteamOKController:
                     logger.error(f"检测出错: {str(e)}，10秒后重试")
                 time.sleep(10)
 
+    def _report_download_progress(self, tracker, game_name, elapsed_time, should_log, manifest=None):
+        """
+        读取下载进度（appmanifest字节数，否则Steam下载进度条），输出真实进度和预计剩余时间，按进度截图
+        
+        Args:
+            tracker: DownloadProgressTracker of the current installation
+            game_name: Game being installed (for screenshots)
+            elapsed_time: Seconds since the installation monitor started
+            should_log: Whether this check is one of the periodic log points
+            manifest: Optional AppManifest of the installation
+            
+        Returns:
+            True if the download has stalled and should be aborted
+        """
+        elapsed_min = elapsed_time / 60
+        timeout_minutes = self.installation_timeout / 60
+        fraction = manifest.progress if manifest is not None else None
+        from_bar = False
+        if fraction is None and self.progress_reader:
+            try:
+                bar = self.progress_reader.read()
+                fraction = bar.fraction if bar is not None else None
+                from_bar = fraction is not None
+            except Exception as e:
+                logger.debug(f"读取下载进度条失败: {str(e)}")
+        rate_text = format_throughput(self.throughput_monitor.throughput())
+        if fraction is None:
+            if should_log:
+                logger.info(f"⏳ 正在下载，未识别到进度 {rate_text} ({elapsed_min:.1f}/{timeout_minutes:.1f}分钟)")
+            if self.throughput_monitor.stalled():
+                return self._handle_download_stall(tracker, game_name, f"Nothing written to the download folders for {self.throughput_monitor.stalled_for() / 60:.1f} minutes")
+            return False
+
+        previous = tracker.fraction
+        if tracker.update(fraction):
+            # 进度在前进：下载目录字节数的停滞计时从现在重新开始
+            self.throughput_monitor.restart_stall_timer()
+        percent = int(fraction * 100)
+        eta = tracker.eta()
+        if eta is None and manifest is not None and manifest.bytes_to_download:
+            eta = self.throughput_monitor.eta(manifest.bytes_to_download - manifest.bytes_downloaded)
+        eta_text = f"预计剩余 {eta / 60:.1f}分钟" if eta is not None else "预计剩余 --"
+        progress_indicator = f"[{'=' * (percent // 5)}{'>' if percent < 100 else '='}{'.' * (20 - percent // 5)}]"
+        size_text = ""
+        if manifest is not None and manifest.bytes_to_download:
+            size_text = f" {manifest.bytes_downloaded / 1024 ** 3:.2f}/{manifest.bytes_to_download / 1024 ** 3:.2f}GB"
+        # 进度变化了整数百分比或到了定期日志点才输出
+        if should_log or previous is None or int(previous * 100) != percent:
+            logger.info(f"⏳ 下载进度: {progress_indicator} {fraction * 100:.1f}%{size_text} {rate_text} {eta_text} (已用 {elapsed_min:.1f}/{timeout_minutes:.1f}分钟)")
+
+        milestone = tracker.milestone()
+        if milestone is not None and self.screenshot_mgr and game_name:
+            self.screenshot_mgr.take_screenshot(game_name, f"progress_{milestone}pct", min_interval_seconds=0)
+
+        # 有进度时只按进度判断停滞，下载目录字节数只在没有进度时使用
+        if tracker.stalled():
+            error_msg = f"Download stalled at {fraction * 100:.1f}% for {tracker.stalled_for() / 60:.1f} minutes"
+            if not from_bar or self.progress_bar_stall_abort:
+                return self._handle_download_stall(tracker, game_name, error_msg)
+            # 进度条颜色不匹配时也会表现为没有进度：只提示，是否中止由下载目录字节数决定
+            if should_log:
+                logger.warning(f"⚠️ {error_msg} (progress bar reading, not aborting)")
+                if self.screenshot_mgr and game_name:
+                    self.screenshot_mgr.take_screenshot(game_name, "progress_bar_stalled", min_interval_seconds=600)
+        if from_bar and self.throughput_monitor.stalled():
+            return self._handle_download_stall(tracker, game_name, f"Nothing written to the download folders for {self.throughput_monitor.stalled_for() / 60:.1f} minutes")
+        return False
+
+    def _handle_download_stall(self, tracker, game_name, error_msg):
+        """
+        下载停滞：还有重试次数时重新点击Steam的安装按钮并重新计时，否则放弃
+        
+        Returns:
+            True if the installation should be aborted
+        """
+        logger.error(f"🛑 {error_msg}")
+        if self.screenshot_mgr and game_name:
+            self.screenshot_mgr.take_screenshot(game_name, "download_stalled", min_interval_seconds=0)
+        if self._stall_retries_left <= 0:
+            return True
+        self._stall_retries_left -= 1
+        logger.warning(f"下载停滞，尝试重新开始下载 (剩余重试次数 {self._stall_retries_left})")
+        self._restart_stalled_download()
+        # 重新计算停滞时间，已下载的字节数保留
+        tracker.restart_stall_timer()
+        self.throughput_monitor.restart_stall_timer()
+        return False
+
+    def _restart_stalled_download(self):
+        """激活Steam窗口，如果Steam显示了安装按钮（下载被暂停或中断）就再点击一次"""
+        try:
+            if not self.activate_steam_window():
+                logger.warning("激活Steam窗口失败，无法重新开始下载")
+                return False
+            matches = self.image_detector.wait_for_any([self.steam_install_button_image, self.steam_install_button_image2], timeout=5)
+            box = matches[self.steam_install_button_image].box or matches[self.steam_install_button_image2].box
+            if box is None:
+                logger.info("未找到安装按钮，继续等待下载恢复")
+                return False
+            pg.click((box[0] + box[2] / 2, box[1] + box[3] / 2))
+            logger.info("已重新点击安装按钮")
+            return True
+        except Exception as e:
+            logger.error(f"重新开始下载失败: {str(e)}")
+            return False
+
+    def _download_paths(self, manifest=None):
+        """
+        本次安装写入的目录：有清单时为downloading/<appid>和common/<installdir>，
+        否则为安装开始后downloading下新出现的目录
+        """
+        if manifest is not None:
+            # 游戏可能安装在其他Steam库中
+            return [path for path in (manifest.download_path, manifest.install_path) if path]
+        return [os.path.join(self.steam_apps_downloading, d) for d in self._new_download_dirs()]
+
+    def _new_download_dirs(self):
+        """
+        安装开始后downloading下新出现的目录，由文件系统事件维护；
+        只有事件丢失时才重新列出downloading目录
+        """
+        if self._downloading_events is None:
+            return set()
+        for event in self._downloading_events.drain():
+            name = os.path.basename(event.path)
+            if event.kind == OVERFLOW:
+                try:
+                    current = set(d for d in os.listdir(self.steam_apps_downloading)
+                                  if os.path.isdir(os.path.join(self.steam_apps_downloading, d)))
+                except OSError:
+                    current = set()
+                self.new_download_dirs = current - self.downloading_folders_before_install
+            elif event.kind == CREATED and event.is_dir and name not in self.downloading_folders_before_install:
+                self.new_download_dirs.add(name)
+            elif event.kind == DELETED:
+                self.new_download_dirs.discard(name)
+        return set(self.new_download_dirs)
+
+    def _stop_watching_downloading(self):
+        """停止监听downloading目录"""
+        if self._downloading_events is not None:
+            self._downloading_events.close()
+            self._downloading_events = None
+
     def check_and_click_not_save_button(self):
         """Check for and click the 'Not Save' button if it appears"""
         logger.info("Checking for 'Not Save' button...")
@@ -865,12 +1037,16 @@ class SteamOKController:
                         logger.info("Game installation completed successfully")
                         success = True
                         break
-                    elif installation_result == "easyanticheat":
-                        # EasyAntiCheat detection requires special handling
-                        error_msg = "EasyAntiCheat detected in game files"
+                    elif installation_result == "anticheat":
+                        # Anti-cheat detection requires special handling
+                        error_msg = f"{self.anticheat_vendors.get(game_name, 'Anti-cheat')} detected in game files"
                         logger.warning(f"🛑 {error_msg}")
                         # Error already handled by check_installation_complete
-                        return {"success": False, "error_type": "easyanticheat_detected", "data": error_msg}
+                        return {"success": False, "error_type": "anticheat_detected", "data": error_msg}
+                    elif installation_result == "stalled":
+                        error_msg = "Download stalled: Steam download progress stopped advancing"
+                        self._handle_game_error(game_name, error_msg)
+                        return {"success": False, "error_type": "download_stalled", "data": error_msg}
                     else:
                         timeout_minutes = self.installation_timeout / 60
                         error_msg = f"Installation timeout after {timeout_minutes:.1f} minutes"
@@ -5,6 +5,7 @@ import logging
 import pandas as pd
 from game_install_controller import SteamOKController
 from config import get_config
+from steam_manifest import get_steam_library_index
 
 logger = logging.getLogger()
 
@@ -16,12 +17,17 @@ class GamePacker:
         # Get Steam apps base path from config
         self.steam_apps_base = self.config.get('paths').get('steam_apps_base')
         self.steam_common_path = os.path.join(self.steam_apps_base, 'common')
+        self.library_index = get_steam_library_index(self.steam_apps_base)
         self.controller = SteamOKController()
 
     def get_latest_game_folder(self):
-        """获取最新修改的游戏文件夹"""
+        """获取最近安装完成的游戏文件夹（按appmanifest的LastUpdated），没有清单时按修改时间"""
         try:
-            # 获取所有文件夹并按修改时间排序
+            latest = self.library_index.refresh().latest_installed()
+            if latest is not None:
+                return latest.installdir
+
+            # 没有可用的appmanifest：获取所有文件夹并按修改时间排序
             folders = [
                 f for f in os.listdir(self.steam_common_path)
                 if os.path.isdir(os.path.join(self.steam_common_path, f))
@@ -59,8 +65,11 @@ class GamePacker:
             formatted_name = self.controller._format_game_name(game_folder)
             # 构建打包文件名：实际steamid_格式化游戏名
             archive_name = f"{steamid}_{formatted_name}"
-            source_path = os.path.join(self.steam_common_path, game_folder)
-            output_path = os.path.join(self.steam_common_path, f"{archive_name}.zip")
+            # 游戏可能安装在其他Steam库中
+            manifest = self.library_index.refresh().find(game_folder)
+            common_path = os.path.dirname(manifest.install_path) if manifest else self.steam_common_path
+            source_path = os.path.join(common_path, game_folder)
+            output_path = os.path.join(common_path, f"{archive_name}.zip")
 
             # 构建7z命令，使用完整路径
             seven_zip_path = "C:\\Program Files\\7-Zip\\7z.exe"
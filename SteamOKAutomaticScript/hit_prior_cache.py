@@ -0,0 +1,186 @@
+"""
+Spatial hit-prior cache for the SteamOKAutomaticScript.
+Remembers where each template was found, across runs, so the detector can try a
+small window around the most likely spots before falling back to a full search.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+# Get logger
+logger = logging.getLogger()
+
+# Base directory that a relative cache file path is resolved against
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Global cache storage
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class HitPriorCache:
+    """
+    Per-template history of hit locations plus fast-path statistics, persisted as JSON.
+    """
+
+    def __init__(self, cache_file, margin=8, max_locations=5, save_interval=30):
+        """
+        Args:
+            cache_file: Path of the JSON file the history is persisted to
+            margin: Pixels around a remembered box that the fast path searches
+            max_locations: Locations remembered per template
+            save_interval: Minimum seconds between two writes of the cache file
+        """
+        if not os.path.isabs(cache_file):
+            cache_file = os.path.join(BASE_DIR, cache_file)
+        self.cache_file = cache_file
+        self.margin = margin
+        self.max_locations = max_locations
+        self.save_interval = save_interval
+        self.locations = {}
+        self.stats = {}
+        self._dirty = False
+        self._last_save = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the persisted history (starts empty if the file is missing or corrupt)"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.locations = data.get('locations', {})
+            self.stats = data.get('stats', {})
+            logger.info(f"Loaded hit priors for {len(self.locations)} templates from {self.cache_file}")
+        except Exception as e:
+            logger.warning(f"Failed to load hit prior cache {self.cache_file}: {str(e)}")
+
+    def save(self, force=False):
+        """Write the history to disk if it changed (throttled unless force is True)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            if not force and time.time() - self._last_save < self.save_interval:
+                return
+            # Serialised under the lock: record() may change the dicts while the file is written
+            text = json.dumps({'locations': self.locations, 'stats': self.stats}, indent=2)
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            temp_file = f"{self.cache_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_file, self.cache_file)
+        except Exception as e:
+            logger.warning(f"Failed to save hit prior cache {self.cache_file}: {str(e)}")
+
+    def candidates(self, name):
+        """
+        Get the windows to try first for a template, most frequent hit first.
+
+        Args:
+            name: Template name
+
+        Returns:
+            list: (left, top, width, height) screen windows around remembered hits
+        """
+        with self._lock:
+            entries = sorted(self.locations.get(name, []), key=lambda entry: entry['hits'], reverse=True)
+        return [
+            (entry['left'] - self.margin, entry['top'] - self.margin,
+             entry['width'] + 2 * self.margin, entry['height'] + 2 * self.margin)
+            for entry in entries
+        ]
+
+    def record(self, name, box, fast_path):
+        """
+        Record the outcome of one search.
+
+        Args:
+            name: Template name
+            box: Screen box of the hit, or None on a miss
+            fast_path: True if the hit came from a remembered location
+        """
+        with self._lock:
+            stats = self.stats.setdefault(name, {'fast_hits': 0, 'full_hits': 0, 'misses': 0})
+            if box is None:
+                stats['misses'] += 1
+            elif fast_path:
+                stats['fast_hits'] += 1
+            else:
+                stats['full_hits'] += 1
+
+            if box is not None:
+                self._remember(name, box)
+            self._dirty = True
+        self.save()
+
+    def _remember(self, name, box):
+        entries = self.locations.setdefault(name, [])
+        for entry in entries:
+            if abs(entry['left'] - box[0]) <= self.margin and abs(entry['top'] - box[1]) <= self.margin:
+                entry.update(left=int(box[0]), top=int(box[1]), width=int(box[2]), height=int(box[3]))
+                entry['hits'] += 1
+                entry['last_hit'] = time.time()
+                return
+        entries.append({
+            'left': int(box[0]), 'top': int(box[1]), 'width': int(box[2]), 'height': int(box[3]),
+            'hits': 1, 'last_hit': time.time()
+        })
+        if len(entries) > self.max_locations:
+            # Forget the least useful location
+            entries.sort(key=lambda entry: (entry['hits'], entry['last_hit']), reverse=True)
+            del entries[self.max_locations:]
+
+    def hit_rate_stats(self):
+        """
+        Get how often the fast path wins, per template and in total.
+
+        Returns:
+            dict: template name -> {fast_hits, full_hits, misses, fast_hit_rate},
+                  plus a 'total' entry
+        """
+        with self._lock:
+            report = {name: dict(stats) for name, stats in self.stats.items()}
+        total = {'fast_hits': 0, 'full_hits': 0, 'misses': 0}
+        for stats in report.values():
+            for key in total:
+                total[key] += stats[key]
+        report['total'] = total
+        for stats in report.values():
+            hits = stats['fast_hits'] + stats['full_hits']
+            stats['fast_hit_rate'] = round(stats['fast_hits'] / hits, 3) if hits else 0.0
+        return report
+
+
+def get_hit_prior_cache(config):
+    """
+    Get the process-wide hit prior cache, creating it from the configuration if needed.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        HitPriorCache: The shared cache, or None if disabled in the configuration
+    """
+    global _cache
+    prior_config = config['image_detector'].get('hit_prior') or {}
+    if not prior_config.get('enabled', False):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HitPriorCache(
+                prior_config.get('cache_file', 'cache/hit_priors.json'),
+                margin=prior_config.get('margin', 8),
+                max_locations=prior_config.get('max_locations', 5),
+                save_interval=prior_config.get('save_interval', 30)
+            )
+            # Flush the last updates when the script exits
+            atexit.register(_cache.save, True)
+    return _cache
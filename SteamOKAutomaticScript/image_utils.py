@@ -5,12 +5,21 @@ Handles all screen image recognition and interaction operations.
 import os
 import time
 import logging
-import pyautogui as pg
 from logger import setup_logging
+from template_registry import get_template_registry, template_name
+from template_matcher import Box, MatchResult, MatchResults, create_matcher, match_batch
+from colour_prefilter import ColourPrefilter
+from frame_diff import TileChangeTracker
+from hit_prior_cache import get_hit_prior_cache
+from frame_capture import get_capture_service
+from screen_source import get_screen_source
 
 # Get logger
 logger = logging.getLogger()
 
+# Upper bound on remembered per-template results before the cache is reset
+MAX_PREVIOUS_RESULTS = 256
+
 class ImageDetector:
     """
     Class for detecting images on screen and interacting with them.
@@ -29,40 +38,387 @@ class ImageDetector:
         self.max_retries = self.config['image_detector']['max_retries']
         self.confidence = self.config['image_detector']['default_confidence']
         self.wait_after_click = self.config['image_detector']['wait_after_click']
+        # Per-template settings (window tag, sub-region), keyed by template name
+        self.template_config = self.config['image_detector'].get('templates') or {}
+        # Decoded templates shared by every detector in the process
+        self.registry = get_template_registry()
+        self.matcher = create_matcher(self.config)
+        # Colour-signature check that skips matching where a template cannot be
+        prefilter_config = self.config['image_detector'].get('colour_prefilter') or {}
+        self.prefilter = ColourPrefilter(self.config) if prefilter_config.get('enabled', False) else None
+        # Remembered hit locations shared by every detector in the process
+        self.hit_priors = get_hit_prior_cache(self.config)
+        # Tile hashes and last results, so unchanged screen areas are not re-matched
+        dirty_tile_config = self.config['image_detector'].get('dirty_tiles') or {}
+        self.tile_tracker = None
+        if dirty_tile_config.get('enabled', False):
+            self.tile_tracker = TileChangeTracker(dirty_tile_config.get('tile_size', 64))
+        self._previous_results = {}
+        # Adaptive poll intervals of wait_for_any
+        wait_config = self.config['image_detector'].get('wait') or {}
+        self.wait_min_interval = wait_config.get('min_interval', 0.25)
+        self.wait_max_interval = wait_config.get('max_interval', 2)
+        self.wait_backoff = wait_config.get('backoff', 1.5)
+        # Where frames come from: the live screen or a recorded session
+        self.screen_source = get_screen_source(self.config)
+        # Shared capture thread; None means every poll grabs its own frame
+        self.capture_service = get_capture_service(self.config)
+
+    def capture(self, region=None):
+        """
+        Capture the screen once.
+        With the frame capture service enabled, the area is cut out of the latest
+        shared frame (or a fresh one if it is too old) instead of a new screenshot.
+
+        Args:
+            region: Optional (left, top, width, height) to capture instead of the whole screen
+
+        Returns:
+            numpy.ndarray: RGB frame of the captured area
+        """
+        if self.capture_service is not None:
+            return self.capture_service.get_frame().crop(region)
+        return self.screen_source.grab(region)
+
+    def template_settings(self, name):
+        """Return the configured settings of a template (empty dict if none)"""
+        return self.template_config.get(name) or {}
+
+    def confidence_for(self, name):
+        """Match threshold of a template (its calibrated confidence, else the default)"""
+        return self.template_settings(name).get('confidence') or self.confidence
+
+    def search_region(self, name, window_regions=None):
+        """
+        Work out the screen rectangle a template has to be searched in.
+        Templates tagged with a window are searched inside that window's bounds,
+        optionally narrowed to a sub-region given as fractions of the window.
+
+        Args:
+            name: Template name
+            window_regions: Optional cache of window title -> region for this poll
+
+        Returns:
+            (left, top, width, height) tuple, or None to search the whole screen
+        """
+        if window_regions is None:
+            window_regions = {}
+        settings = self.template_settings(name)
+        window = settings.get('window')
+        if not window:
+            return None
+
+        if window not in window_regions:
+            window_regions[window] = self.screen_source.window_region(window)
+        window_region = window_regions[window]
+        if window_region is None:
+            logger.debug(f"{window} window not found, searching {name} on the whole screen")
+            return None
+
+        sub_region = settings.get('region')
+        if not sub_region:
+            return window_region
+        left, top, width, height = window_region
+        x_ratio, y_ratio, width_ratio, height_ratio = sub_region
+        sub_left = left + int(width * x_ratio)
+        sub_top = top + int(height * y_ratio)
+        sub_right = min(sub_left + int(width * width_ratio), left + width)
+        sub_bottom = min(sub_top + int(height * height_ratio), top + height)
+        return (sub_left, sub_top, sub_right - sub_left, sub_bottom - sub_top)
+
+    def locate_many(self, templates, confidence=None, frame=None):
+        """
+        Capture the screen once and match every requested template against that frame.
+        Only the area covering the templates' search regions is captured, and each
+        template is only searched inside its own region. When dirty-tile tracking is
+        enabled, only the tiles that changed since the previous poll are re-matched.
+
+        Args:
+            templates: Iterable of template names/paths, or a dict mapping each
+                       template name/path to its own confidence
+            confidence: Match threshold overriding the templates' configured ones
+            frame: Optional already captured full-screen RGB frame to match against
+
+        Returns:
+            MatchResults: Maps each requested template to its MatchResult (box and score).
+                          Its changed attribute is False when nothing in the searched
+                          areas changed since the previous poll, so callers can skip work.
+        """
+        if not isinstance(templates, dict):
+            templates = {key: None for key in templates}
+
+        window_regions = {}
+        searches = []
+        for key, template_confidence in templates.items():
+            template = self.registry.get(key)
+            region = self.search_region(template.name, window_regions)
+            template_confidence = template_confidence or confidence or self.confidence_for(template.name)
+            searches.append((key, template, template_confidence, region))
+
+        # Capture only the bounding box of all search regions
+        origin = (0, 0)
+        if frame is None:
+            capture_region = _bounding_region([region for _, _, _, region in searches])
+            frame = self.capture(capture_region)
+            if capture_region is not None:
+                origin = capture_region[:2]
+        haystack = self.matcher.prepare(frame)
+
+        # Hash the capture in tiles to find out what changed since the last poll
+        capture_key = (origin, frame.shape)
+        dirty = self.tile_tracker.update(capture_key, frame) if self.tile_tracker is not None else None
+
+        frame_region = (0, 0, frame.shape[1], frame.shape[0])
+        results = MatchResults()
+        results.changed = False
+        # Plan the searches of every template whose answer may have changed
+        plans = []
+        histogram = None
+        for key, template, template_confidence, region in searches:
+            if region is not None:
+                region = _intersect_region((region[0] - origin[0], region[1] - origin[1], region[2], region[3]), frame_region)
+            search_area = region or frame_region
+
+            previous_key = (capture_key, template.name, search_area, template_confidence)
+            previous = self._previous_results.get(previous_key) if dirty is not None else None
+            changed_area = self.tile_tracker.dirty_region(dirty, search_area) if previous is not None else None
+
+            if previous is not None and (changed_area is None or (previous.found and _intersect_region(previous.box, changed_area) is None)):
+                # Nothing that could change this template's answer moved: reuse it
+                results[key] = self._to_screen(previous, origin)
+                continue
+            elif previous is not None:
+                # Only placements overlapping a changed tile can score differently
+                rematch_area = _intersect_region((
+                    changed_area[0] - template.width + 1, changed_area[1] - template.height + 1,
+                    changed_area[2] + 2 * (template.width - 1), changed_area[3] + 2 * (template.height - 1)
+                ), search_area)
+                attempts = [(rematch_area, False)]
+                if previous.found:
+                    # The previous hit was disturbed and may have moved into an unchanged area
+                    attempts.extend(self._search_attempts(template, region, search_area, origin))
+            else:
+                attempts = self._search_attempts(template, region, search_area, origin)
+
+            if self.prefilter is not None:
+                # Binned once per poll, and only if some template has to be matched
+                if histogram is None:
+                    histogram = self.prefilter.histogram(frame)
+                if not self.prefilter.plausible(histogram, template, search_area):
+                    # The template's colours are missing from its region: no match possible
+                    attempts = []
+            plans.append((key, template, template_confidence, previous_key, attempts))
+
+        for (key, template, _, previous_key, _), (result, fast_path) in zip(plans, self._run_attempts(haystack, plans)):
+            if len(self._previous_results) > MAX_PREVIOUS_RESULTS:
+                self._previous_results.clear()
+            self._previous_results[previous_key] = result
+            results.changed = True
+
+            result = self._to_screen(result, origin)
+            if self.hit_priors is not None:
+                self.hit_priors.record(template.name, result.box, fast_path)
+            results[key] = result
+            logger.debug(f"Matched {template.name}: found={result.found}, score={result.score}, fast_path={fast_path}")
+        return results
+
+    def _search_attempts(self, template, region, search_area, origin):
+        """
+        Regions to search a template in, in order: remembered hit locations first, then its whole region.
+
+        Returns:
+            list: (region in frame coordinates, True if it is a remembered location)
+        """
+        attempts = []
+        if self.hit_priors is not None:
+            for window in self.hit_priors.candidates(template.name):
+                window = _intersect_region((window[0] - origin[0], window[1] - origin[1], window[2], window[3]), search_area)
+                if window is not None:
+                    attempts.append((window, True))
+        attempts.append((region, False))
+        return attempts
+
+    def _run_attempts(self, haystack, plans):
+        """
+        Work through the planned attempts of all templates round by round.
+        Each round matches the next attempt of every unresolved template as one batch,
+        so engines that match in parallel get the whole poll at once.
+
+        Returns:
+            list: (MatchResult in frame coordinates, True if a remembered location hit) per plan
+        """
+        outcomes = [None] * len(plans)
+        pending = {}
+        for index, (_, template, _, _, attempts) in enumerate(plans):
+            if attempts:
+                pending[index] = 0
+            else:
+                # Rejected by the colour prefilter
+                outcomes[index] = (MatchResult(template.name, None, None), False)
+        while pending:
+            indices = list(pending)
+            jobs = [(plans[index][1], plans[index][2], plans[index][4][pending[index]][0]) for index in indices]
+            for index, result in zip(indices, match_batch(self.matcher, haystack, jobs)):
+                attempts = plans[index][4]
+                attempt = pending[index]
+                if result.found or attempt == len(attempts) - 1:
+                    # A hit, or the last attempt's miss (its score is the one reported)
+                    outcomes[index] = (result, result.found and attempts[attempt][1])
+                    del pending[index]
+                else:
+                    pending[index] += 1
+        return outcomes
+
+    @staticmethod
+    def _to_screen(result, origin):
+        """Shift a frame-coordinate MatchResult to screen coordinates"""
+        if result.box is None:
+            return result
+        box = result.box
+        return result._replace(box=Box(box.left + origin[0], box.top + origin[1], box.width, box.height))
+
+    def prefilter_stats(self):
+        """
+        Get how many searches the colour prefilter skipped.
+
+        Returns:
+            dict: checked and rejected counts, or None if the prefilter is disabled
+        """
+        if self.prefilter is None:
+            return None
+        return {'checked': self.prefilter.checked, 'rejected': self.prefilter.rejected}
+
+    def hit_prior_stats(self):
+        """
+        Get how often the remembered-location fast path wins.
+
+        Returns:
+            dict: Per-template and total hit statistics, or None if hit priors are disabled
+        """
+        if self.hit_priors is None:
+            return None
+        return self.hit_priors.hit_rate_stats()
+
+    def locate(self, image_path, confidence=None):
+        """
+        Locate a template on screen using its pre-decoded pixels.
+
+        Args:
+            image_path: Template name or path to the image file
+            confidence: Match threshold, defaults to the template's configured confidence
+
+        Returns:
+            The (left, top, width, height) box of the match, or None if not found
+        """
+        return self.locate_many([image_path], confidence=confidence)[image_path].box
+
+    def wait_for_any(self, templates, timeout, poll_budget=None, confidence=None):
+        """
+        Poll until any of the templates appears on screen, or the timeout expires.
+        The poll interval starts at wait.min_interval and backs off towards
+        wait.max_interval while the searched areas stay unchanged; as soon as
+        anything in them changes it drops back to the minimum.
+
+        Args:
+            templates: Same as locate_many()
+            timeout: Seconds to wait at most
+            poll_budget: Optional maximum number of polls; intervals are stretched
+                         so the budget lasts until the timeout
+            confidence: Same as locate_many()
+
+        Returns:
+            MatchResults: Results of the last poll (no template found on timeout).
+                          Holds a not-found result for every template even if no poll succeeded.
+        """
+        if not isinstance(templates, dict):
+            templates = list(templates)
+        deadline = time.time() + timeout
+        interval = self.wait_min_interval
+        polls = 0
+        # Callers index the results by template, so a failed poll must not leave keys missing
+        results = MatchResults((key, MatchResult(template_name(key), None, None)) for key in templates)
+        while True:
+            try:
+                results = self.locate_many(templates, confidence=confidence)
+                if any(result.found for result in results.values()):
+                    return results
+                changed = results.changed
+            except Exception as e:
+                logger.debug(f"Poll failed while waiting for templates: {str(e)}")
+                changed = False
+            polls += 1
+
+            remaining = deadline - time.time()
+            if remaining <= 0 or (poll_budget and polls >= poll_budget):
+                return results
+            # Poll fast while the screen is changing, back off while it is static
+            interval = self.wait_min_interval if changed else min(interval * self.wait_backoff, self.wait_max_interval)
+            if poll_budget:
+                interval = max(interval, remaining / (poll_budget - polls))
+            time.sleep(min(interval, remaining))
+
+    def click_match(self, result):
+        """
+        Click the centre of a found MatchResult and wait for the UI to react.
+
+        Args:
+            result: A found MatchResult
+        """
+        # Imported here so detection works without a display (replayed sessions)
+        import pyautogui as pg
+        pg.click(pg.center(result.box))
+        time.sleep(self.wait_after_click)
 
     def check_and_click_image(self, image_path, max_retries=None, confidence=None):
         """
-        Generic method to check for and click an image on screen
+        Generic method to check for and click an image on screen.
+        Waits up to max_retries * retry_interval seconds for the image to appear.
         
         Args:
             image_path: Path to the image file to look for
-            wait_after_click: Time to wait after clicking the image
+            max_retries: Number of retry intervals to wait at most
+            confidence: Match threshold, defaults to the template's configured confidence
         
         Returns:
             True if image was found and clicked, False otherwise
         """
         max_retries = max_retries or self.max_retries
-        confidence = confidence or self.confidence
 
         # Extract image basename for logging and config lookup
         image_basename = os.path.splitext(os.path.basename(image_path))[0]
         
         logger.info(f"Checking for {image_basename}...")
-        for i in range(max_retries):
-            try:
-                location = pg.locateOnScreen(image_path, confidence=confidence)
-                if location:
-                    logger.info(f"Found {image_basename}")
-                    center = pg.center(location)
-                    pg.click(center)
-                    logger.info(f"Clicked {image_basename}")
-                    time.sleep(self.wait_after_click)
-                    return True
-                logger.info(f"{image_basename} not found, retry {i+1}/{max_retries}")
-                time.sleep(self.retry_interval)
-            except Exception as e:
-                logger.warning(f"{image_basename} not found: {str(e)}")
-                time.sleep(self.retry_interval)
+        try:
+            result = self.wait_for_any([image_path], max_retries * self.retry_interval, confidence=confidence)[image_path]
+            if result.found:
+                logger.info(f"Found {image_basename}")
+                self.click_match(result)
+                logger.info(f"Clicked {image_basename}")
+                return True
+        except Exception as e:
+            logger.warning(f"{image_basename} not found: {str(e)}")
         
         logger.info(f"No {image_basename} found after maximum retries")
-        return False 
\ No newline at end of file
+        return False
+
+
+def _bounding_region(regions):
+    """Bounding box of several (left, top, width, height) regions; None if any is the whole screen"""
+    if not regions or any(region is None for region in regions):
+        return None
+    left = min(region[0] for region in regions)
+    top = min(region[1] for region in regions)
+    right = max(region[0] + region[2] for region in regions)
+    bottom = max(region[1] + region[3] for region in regions)
+    return (left, top, right - left, bottom - top)
+
+
+def _intersect_region(region, bounds):
+    """Intersection of two (left, top, width, height) regions, or None if they don't overlap"""
+    left = max(region[0], bounds[0])
+    top = max(region[1], bounds[1])
+    right = min(region[0] + region[2], bounds[0] + bounds[2])
+    bottom = min(region[1] + region[3], bounds[1] + bounds[3])
+    if right <= left or bottom <= top:
+        return None
+    return (left, top, right - left, bottom - top)
@@ -3,6 +3,8 @@ import time
 import logging
 import pyautogui as pg
 import os
+from config import get_config
+from image_utils import ImageDetector
 
 logger = logging.getLogger()
 
@@ -10,31 +12,33 @@ class LicenseAgreementHandler:
     def __init__(self):
         self.running = False
         self.thread = None
+        self.config = get_config()
+        license_config = self.config.get('license_agreement', {})
         # 定义所有可能的接受按钮图片
         self.accept_button_images = [
-            os.path.join(os.path.dirname(__file__), "png/steam_accept_button.png"),
-            os.path.join(os.path.dirname(__file__), "png/accept2.png")
+            os.path.join(os.path.dirname(__file__), image_path)
+            for image_path in license_config.get('accept_button_images', ["png/steam_accept_button.png", "png/accept2.png"])
         ]
-        self.check_interval = 2  # 检查间隔（秒）
+        self.check_interval = license_config.get('check_interval', 2)  # 检查间隔（秒）
+        # 使用共享的模板缓存，避免每次轮询都重新解码图片
+        self.image_detector = ImageDetector(self.config)
 
     def _check_and_accept_license(self):
         """检查并点击许可协议接受按钮"""
         try:
+            # 一次截图同时匹配所有接受按钮
+            matches = self.image_detector.locate_many(self.accept_button_images)
             for accept_image in self.accept_button_images:
-                try:
-                    accept_button_location = pg.locateOnScreen(accept_image, confidence=0.8)
-                    if accept_button_location:
-                        accept_button_center = (
-                            accept_button_location[0] + accept_button_location[2] / 2,
-                            accept_button_location[1] + accept_button_location[3] / 2
-                        )
-                        pg.click(accept_button_center)
-                        logger.info(f"检测到并点击了许可协议接受按钮: {os.path.basename(accept_image)}")
-                        time.sleep(1)  # 点击后等待1秒
-                        return True  # 如果找到一个并点击成功，就返回
-                except Exception as e:
-                    # logger.debug(f"检查许可协议按钮 {os.path.basename(accept_image)} 时出错: {str(e)}")
-                    continue  # 继续检查下一个按钮
+                accept_button_location = matches[accept_image].box
+                if accept_button_location:
+                    accept_button_center = (
+                        accept_button_location[0] + accept_button_location[2] / 2,
+                        accept_button_location[1] + accept_button_location[3] / 2
+                    )
+                    pg.click(accept_button_center)
+                    logger.info(f"检测到并点击了许可协议接受按钮: {os.path.basename(accept_image)}")
+                    time.sleep(1)  # 点击后等待1秒
+                    return True  # 如果找到一个并点击成功，就返回
             return False
         except Exception as e:
             logger.debug(f"检查许可协议时出错: {str(e)}")
@@ -12,6 +12,7 @@ from csv_logger import GameStatusLogger
 from debug_screenshot_manager import DebugScreenshotManager
 from task_status_logger import TaskStatusLogger
 from upload_usmap import upload_usmap
+from template_registry import load_template_registry
 import re
 import threading
 from tqdm import tqdm
@@ -60,24 +61,37 @@ def process_tasks(controller, injector, csv_logger, task_logger, screenshot_mgr,
             
             # Process the game (download and check if playable)
             process_result = controller.process_game(game_name)
+            # Average download rate of the game, None if nothing was downloaded
+            throughput = controller.download_throughput.get(game_name)
             
             # Take screenshot after processing result
             screenshot_mgr.take_screenshot(game_name, "after_processing", min_interval_seconds=0)
             
+            # Report how often the remembered button locations were hit first time
+            hit_stats = controller.image_detector.hit_prior_stats()
+            if hit_stats:
+                total = hit_stats['total']
+                logger.info(f"Hit prior fast path: {total['fast_hits']} fast / {total['full_hits']} full hits "
+                            f"({total['fast_hit_rate']:.0%}), {total['misses']} misses")
+            prefilter_stats = controller.image_detector.prefilter_stats()
+            if prefilter_stats:
+                logger.info(f"Colour prefilter skipped {prefilter_stats['rejected']}/{prefilter_stats['checked']} searches")
+            
             if not process_result["success"]:
                 error_type = process_result["error_type"]
                 error_data = process_result["data"] if process_result["data"] else "Unknown error"
                 
-                if error_type == "easyanticheat_detected":
-                    # Handle EasyAntiCheat detection as a special case
-                    logger.warning(f"Game {game_name} has EasyAntiCheat: {error_data}")
-                    csv_logger.log_cancelled(game_name, f"EasyAntiCheat detected: {error_data}")
-                    task_logger.mark_task_error(task_id, f"EasyAntiCheat detected: {error_data}")
-                    print(f"{game_name}: ⚠️ 含有反作弊系统 (EasyAntiCheat)")
+                if error_type == "anticheat_detected":
+                    # Handle anti-cheat detection as a special case
+                    vendor = controller.anticheat_vendors.get(game_name, "Anti-cheat")
+                    logger.warning(f"Game {game_name} has {vendor}: {error_data}")
+                    csv_logger.log_cancelled(game_name, f"Anti-cheat detected: {error_data}", throughput)
+                    task_logger.mark_task_error(task_id, f"Anti-cheat detected: {error_data}")
+                    print(f"{game_name}: ⚠️ 含有反作弊系统 ({vendor})")
                 else:
                     # Handle other download failures
                     logger.error(f"Game {game_name} failed: {error_type} - {error_data}")
-                    csv_logger.log_download_error(game_name, f"{error_type}: {error_data}")
+                    csv_logger.log_download_error(game_name, f"{error_type}: {error_data}", throughput)
                     task_logger.mark_task_error(task_id, f"{error_type}: {error_data}")
                     print(f"{game_name}: ❌ 不可玩, 原因: {error_type}")
                     
@@ -86,7 +100,7 @@ def process_tasks(controller, injector, csv_logger, task_logger, screenshot_mgr,
                 continue
             
             # Log successful download
-            csv_logger.log_download_success(game_name)
+            csv_logger.log_download_success(game_name, throughput)
             logger.info(f"Game {game_name} is playable, download successful")
             
             # Take screenshot before injection
@@ -175,6 +189,9 @@ def main():
         config = load_config(args.config)
         logger.info(f"Using custom configuration file: {args.config}")
     
+    # Decode every configured template once, before any detector polls the screen
+    load_template_registry(config)
+    
     # Initialize the CSV logger
     webhook_url = args.webhook_url
     csv_logger = GameStatusLogger(webhook_url=webhook_url)
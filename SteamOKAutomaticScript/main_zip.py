@@ -25,6 +25,9 @@ from csv_logger import GameStatusLogger
 from debug_screenshot_manager import DebugScreenshotManager
 from task_status_logger import TaskStatusLogger
 from upload_usmap import upload_usmap
+from template_registry import load_template_registry
+from anticheat_signatures import get_anticheat_index
+from process_tracker import get_process_tracker, is_unreal_process, rank_game_processes
 
 # Load configuration first
 config = load_config()
@@ -184,7 +187,13 @@ def find_exe(extract_folder):
         return []
 
 def run_exe(exe_path):
-    """Run the executable and return the process ID"""
+    """Run the executable and return the process ID of the game
+    
+    Follows every process the executable starts, so a launcher that hands off
+    to the real game executable and exits still yields the game: the Unreal
+    Engine game executable of the tree, else the process with the largest
+    working set.
+    """
     try:
         if not exe_path or not os.path.exists(exe_path):
             logger.error(f"Invalid executable path: {exe_path}")
@@ -192,21 +201,29 @@ def run_exe(exe_path):
         
         logger.info(f"Launching executable: {exe_path}")
         
-        # Start the process
+        # Start the process and follow everything it starts
         process = subprocess.Popen([exe_path])
         pid = process.pid
+        game_tree = get_process_tracker(config).follow(pid)
         
         logger.info(f"Process started with PID: {pid}")
         
-        # Give the process some time to initialize
-        time.sleep(10)
+        try:
+            # Give the process some time to initialize
+            time.sleep(10)
+            candidates = rank_game_processes(game_tree.processes)
+        finally:
+            game_tree.close()
         
-        # Check if process is still running
-        if process.poll() is not None:
-            logger.error(f"Process {pid} exited prematurely with code {process.returncode}")
+        if not candidates:
+            logger.error(f"Process {pid} exited prematurely with code {process.poll()}")
             return None
         
-        return pid
+        game = candidates[0]
+        if game.pid != pid:
+            logger.info(f"Game process: {game.name} (PID: {game.pid}, {game.memory_mb:.0f} MB"
+                        f"{', Unreal Engine' if is_unreal_process(game) else ''}), started through {os.path.basename(exe_path)}")
+        return game.pid
     except Exception as e:
         logger.error(f"Failed to run executable: {str(e)}")
         return None
@@ -215,28 +232,32 @@ def run_exe(exe_path):
 def check_anticheat(extract_folder):
     """Check for anti-cheat systems in the extracted folder
     
+    Scans the whole folder tree in one pass for the folder, DLL and driver
+    signatures of every known anti-cheat vendor.
+    
     Args:
         extract_folder: Path to the folder containing extracted files
         
     Returns:
-        bool
+        str: Name of the anti-cheat vendor found, None if there is none
     """
     try:
         logger.info(f"Scanning for anti-cheat systems in: {extract_folder}")
         
-        # Check for EasyAntiCheat folder
-        eac_folder = os.path.join(extract_folder, 'EasyAntiCheat')
-        if os.path.exists(eac_folder) and os.path.isdir(eac_folder):
-            logger.warning(f"⚠️ EasyAntiCheat folder detected in: {extract_folder}")
-            return True
+        scan = get_anticheat_index(config).scan(extract_folder)
+        logger.info(f"Anti-cheat scan examined {scan.examined} entries in {scan.elapsed * 1000:.0f}ms")
+        if scan:
+            for vendor, path in scan.found.items():
+                logger.warning(f"⚠️ {vendor} detected: {path}")
+            return scan.vendor
         
         # No anti-cheat detected
         logger.info("No anti-cheat systems detected")
-        return False
+        return None
     except Exception as e:
         logger.error(f"Error checking for anti-cheat: {str(e)}")
         # If there's an error, we'll continue anyway but log it
-        return False
+        return None
 def batch_process_tasks(injector, csv_logger, task_logger, task_limit, retry_delay, output_path, base_url):
     unprocessed_tasks = task_logger.get_unprocessed_tasks(limit=task_limit)
     processed_count = 0
@@ -287,8 +308,9 @@ def process_task(task_id, zip_path, output_folder, base_url, injector, csv_logge
         # Step 2.5: Check for anti-cheat systems
         logger.info("Step 2.5: Checking for anti-cheat systems")
         extract_folder = f'{output_folder}/{zip_name.replace('.zip', '')}'
-        if check_anticheat(extract_folder):
-            logger.error(f"Aborting task {task_id}: {zip_name} due to anti-cheat detection")
+        anticheat_vendor = check_anticheat(extract_folder)
+        if anticheat_vendor:
+            logger.error(f"Aborting task {task_id}: {zip_name} due to anti-cheat detection ({anticheat_vendor})")
             return False
         
         # Step 3: Find executables
@@ -417,6 +439,9 @@ def main():
     task_limit = args.task_limit
     base_url = args.base_url
     
+    # Decode every configured template once, before any detector polls the screen
+    load_template_registry(config)
+
     # Initialize the CSV logger
     csv_logger = GameStatusLogger(webhook_url=webhook_url)
     logger.info(f"CSV logging enabled to: {csv_logger.get_csv_path()}")
@@ -0,0 +1,237 @@
+"""
+Process-pool template matching for the SteamOKAutomaticScript.
+The prepared frame is written once into a multiprocessing.shared_memory block;
+worker processes map that block without copying and match batches of templates
+against it in parallel, outside the GIL of the polling thread.
+"""
+import os
+import copy
+import atexit
+import logging
+import itertools
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import cv2
+
+from template_registry import load_template_registry
+from template_matcher import Box, MatchResult, FFTFrame, FFTMatcher, PyramidFrame, PyramidMatcher, create_matcher
+
+# Get logger
+logger = logging.getLogger()
+
+# Global pool storage, keyed by (worker count, worker engine)
+_pools = {}
+_pool_lock = threading.Lock()
+
+# Per-worker state, set up by _init_worker
+_worker = {}
+
+# Shared memory blocks a worker keeps mapped at once (one per detector using the pool)
+_MAX_WORKER_BLOCKS = 8
+
+
+def _inner_config(config):
+    """Configuration the workers (and the in-process fallback) create their matcher from"""
+    inner = copy.deepcopy(config)
+    pool_config = inner['image_detector'].get('process_pool') or {}
+    inner['image_detector']['engine'] = pool_config.get('engine', 'opencv')
+    return inner
+
+
+def _wrap_prepared(matcher, bgr):
+    """Turn an already converted BGR frame into the haystack a matcher expects"""
+    if isinstance(matcher, PyramidMatcher):
+        return PyramidFrame(bgr)
+    if isinstance(matcher, FFTMatcher):
+        return FFTFrame(bgr, matcher.colour)
+    return bgr
+
+
+def _attach(name):
+    """Attach to the parent's shared memory block without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: spawned workers share the parent's resource tracker,
+        # so the block is still only unlinked by the parent
+        return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(config):
+    """Load the templates and the matcher once per worker process"""
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker['registry'] = load_template_registry(config)
+    _worker['matcher'] = create_matcher(config)
+    _worker['blocks'] = OrderedDict()
+    _worker['frame'] = (None, None)
+
+
+def _worker_match(block_name, shape, frame_id, jobs):
+    """
+    Match a batch of templates against the frame in a shared memory block.
+
+    Args:
+        block_name: Name of the shared memory block
+        shape: Shape of the BGR frame stored in it
+        frame_id: Identifies the frame, so derived data is rebuilt when it changes
+        jobs: List of (template path, confidence, region)
+
+    Returns:
+        list: (box tuple or None, score) per job
+    """
+    blocks = _worker['blocks']
+    if block_name in blocks:
+        blocks.move_to_end(block_name)
+    else:
+        # Several detectors share the pool with their own blocks: keep the most
+        # recently used mappings and close the rest
+        while len(blocks) >= _MAX_WORKER_BLOCKS:
+            old_name, old_block = blocks.popitem(last=False)
+            cached_id, _ = _worker['frame']
+            if cached_id is not None and cached_id[0] == old_name:
+                # The cached frame is a view of the block: release it first,
+                # close() raises BufferError while exported pointers exist
+                _worker['frame'] = (None, None)
+            old_block.close()
+        blocks[block_name] = _attach(block_name)
+    cached_id, haystack = _worker['frame']
+    if cached_id != (block_name, frame_id):
+        bgr = np.ndarray(shape, dtype=np.uint8, buffer=blocks[block_name].buf)
+        haystack = _wrap_prepared(_worker['matcher'], bgr)
+        _worker['frame'] = ((block_name, frame_id), haystack)
+
+    results = []
+    for template_path, confidence, region in jobs:
+        template = _worker['registry'].get(template_path)
+        result = _worker['matcher'].match(haystack, template, confidence, region)
+        results.append((tuple(result.box) if result.box is not None else None, result.score))
+    return results
+
+
+def _pool_workers(config):
+    pool_config = config['image_detector'].get('process_pool') or {}
+    return pool_config.get('workers', 0) or max(1, (os.cpu_count() or 2) - 1)
+
+
+def get_match_pool(config):
+    """
+    Get the process-wide worker pool for the configured engine, starting it if needed.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        ProcessPoolExecutor: The shared pool
+    """
+    inner_config = _inner_config(config)
+    workers = _pool_workers(config)
+    key = (workers, inner_config['image_detector']['engine'])
+    with _pool_lock:
+        if key not in _pools:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(inner_config,)
+            )
+            atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+            _pools[key] = pool
+            logger.info(f"Started template matching pool with {workers} {key[1]} worker processes")
+    return _pools[key]
+
+
+class SharedFrame:
+    """
+    A prepared BGR frame living in a shared memory block.
+    """
+
+    def __init__(self, block, shape, frame_id, haystack):
+        self.block = block
+        self.shape = shape
+        self.frame_id = frame_id
+        # In-process view for jobs too small to be worth shipping to a worker
+        self.haystack = haystack
+
+
+class ProcessPoolMatcher:
+    """
+    Matches template batches in worker processes against a shared-memory frame.
+    Reports the same boxes and scores as the engine the workers run.
+    """
+    name = 'process_pool'
+
+    def __init__(self, config):
+        pool_config = config['image_detector'].get('process_pool') or {}
+        self.inline_max_pixels = pool_config.get('inline_max_pixels', 40000)
+        self.pool = get_match_pool(config)
+        self.workers = _pool_workers(config)
+        # Same engine as the workers, for small jobs run in-process
+        self.local_matcher = create_matcher(_inner_config(config))
+        self._block = None
+        self._frame_ids = itertools.count()
+        atexit.register(self.close)
+
+    def close(self):
+        """Release the shared memory block"""
+        if self._block is not None:
+            self._block.close()
+            self._block.unlink()
+            self._block = None
+
+    def prepare(self, frame):
+        """Convert the RGB frame to BGR straight into the shared memory block"""
+        size = frame.shape[0] * frame.shape[1] * 3
+        if self._block is None or self._block.size < size:
+            self.close()
+            self._block = shared_memory.SharedMemory(create=True, size=size)
+        shape = (frame.shape[0], frame.shape[1], 3)
+        bgr = np.ndarray(shape, dtype=np.uint8, buffer=self._block.buf)
+        cv2.cvtColor(np.ascontiguousarray(frame), cv2.COLOR_RGB2BGR, dst=bgr)
+        return SharedFrame(self._block, shape, next(self._frame_ids), _wrap_prepared(self.local_matcher, bgr))
+
+    def match(self, haystack, template, confidence, region=None):
+        return self.match_many(haystack, [(template, confidence, region)])[0]
+
+    def _job_pixels(self, haystack, region):
+        if region is None:
+            return haystack.shape[0] * haystack.shape[1]
+        return region[2] * region[3]
+
+    def match_many(self, haystack, jobs):
+        """
+        Match several templates at once, spreading the large searches over the workers.
+
+        Args:
+            haystack: SharedFrame returned by prepare()
+            jobs: List of (template, confidence, region)
+
+        Returns:
+            list: MatchResult per job, in order
+        """
+        results = [None] * len(jobs)
+        remote = []
+        for index, (template, confidence, region) in enumerate(jobs):
+            if self._job_pixels(haystack, region) <= self.inline_max_pixels:
+                results[index] = self.local_matcher.match(haystack.haystack, template, confidence, region)
+            else:
+                remote.append(index)
+
+        # One batch per worker, largest searches spread first
+        remote.sort(key=lambda index: -self._job_pixels(haystack, jobs[index][2]))
+        batches = [remote[worker::self.workers] for worker in range(self.workers)]
+        futures = []
+        for batch in batches:
+            if not batch:
+                continue
+            payload = [(jobs[index][0].path, jobs[index][1], jobs[index][2]) for index in batch]
+            futures.append((batch, self.pool.submit(_worker_match, haystack.block.name, haystack.shape, haystack.frame_id, payload)))
+
+        for batch, future in futures:
+            for index, (box, score) in zip(batch, future.result()):
+                results[index] = MatchResult(jobs[index][0].name, Box(*box) if box else None, score)
+        return results
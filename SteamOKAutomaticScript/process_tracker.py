@@ -0,0 +1,493 @@
+"""
+Incremental process tracker for the SteamOKAutomaticScript.
+A background thread keeps a table of the running processes keyed by
+(pid, create_time). Each cycle only lists the processes (psutil's process
+cache tells a reused PID from the process it replaced); processes are opened
+and their executable path looked up once, when they first appear, instead of
+walking every process for its exe before and after a game launch. New
+processes under a watched folder are pushed to subscribers, and the CPU and
+memory of those processes are sampled every cycle, so ranking candidates
+never has to block on cpu_percent(interval=...). A known parent (a launched
+executable, or steam.exe) can also be followed through every process it
+starts, including launchers that hand off to the real game and exit.
+"""
+import os
+import re
+import time
+import queue
+import logging
+import threading
+
+import psutil
+
+# Get logger
+logger = logging.getLogger()
+
+MB = 1024 * 1024
+
+# Executables of a packaged Unreal Engine game: <Project>/Binaries/Win64/<Project>(-Win64-Shipping).exe
+UNREAL_EXE_PATTERN = re.compile(r'[\\/](?P<project>[^\\/]+)[\\/]Binaries[\\/](?:Win64|WinGDK)[\\/](?P<exe>[^\\/]+)$', re.IGNORECASE)
+
+# Shipping build of the game: the executable that loads the game code
+UNREAL_SHIPPING_PATTERN = re.compile(r'-(?:Win64|WinGDK)-Shipping\.exe$', re.IGNORECASE)
+
+
+def _normalize_path(path):
+    return os.path.normcase(os.path.normpath(path)) if path else ''
+
+
+def is_unreal_process(process):
+    """
+    True if the process runs the executable of a packaged Unreal Engine game.
+    Engine/Binaries/Win64 holds the engine's own helpers (CrashReportClient,
+    UnrealCEFSubProcess), and the game's executable is named after its project.
+    """
+    match = UNREAL_EXE_PATTERN.search(process.exe) if process.exe else None
+    if match is None:
+        return False
+    project = match.group('project').lower()
+    return project != 'engine' and match.group('exe').lower().startswith(project)
+
+
+def is_shipping_process(process):
+    """True if the process runs a game's -Shipping executable"""
+    return is_unreal_process(process) and UNREAL_SHIPPING_PATTERN.search(process.exe) is not None
+
+
+def rank_game_processes(processes):
+    """
+    Order candidate game processes, most likely first: Unreal Engine game executables
+    before anything else (launchers, crash reporters, bootstrappers), -Shipping builds
+    first among those, then the largest working set, then the busiest CPU, as last
+    sampled by the tracker.
+
+    Args:
+        processes: Iterable of TrackedProcess
+
+    Returns:
+        list: The running processes, best candidate first
+    """
+    return sorted((process for process in processes if process.alive),
+                  key=lambda process: (is_unreal_process(process), is_shipping_process(process),
+                                       process.memory_mb, process.cpu_percent),
+                  reverse=True)
+
+
+class TrackedProcess:
+    """
+    One process of the table, with the CPU and memory figures of its last two samples.
+    """
+
+    def __init__(self, proc, create_time, name, exe, ppid, first_seen):
+        """
+        Args:
+            proc: psutil.Process handle
+            create_time: Process creation time (seconds since epoch)
+            name: Process name
+            exe: Executable path, or None if it could not be read
+            ppid: Parent PID
+            first_seen: Time the tracker first saw the process
+        """
+        self.proc = proc
+        self.pid = proc.pid
+        self.create_time = create_time
+        self.name = name
+        self.exe = exe
+        self.ppid = ppid
+        self.first_seen = first_seen
+        self.alive = True
+        self.cpu_percent = 0.0
+        self.memory_mb = 0.0
+        self.memory_delta_mb = 0.0
+        self.peak_memory_mb = 0.0
+        self.num_threads = 0
+        self.samples = 0
+        self._last_cpu = None
+
+    @property
+    def key(self):
+        """(pid, create_time): unique even when Windows reuses the PID"""
+        return (self.pid, self.create_time)
+
+    def sample(self, now):
+        """
+        Read CPU time, memory and thread count, and update the deltas since the previous sample.
+
+        Returns:
+            bool: False if the process is gone
+        """
+        try:
+            with self.proc.oneshot():
+                if self.proc.status() == psutil.STATUS_ZOMBIE:
+                    self.alive = False
+                    return False
+                cpu_times = self.proc.cpu_times()
+                memory_mb = self.proc.memory_info().rss / MB
+                num_threads = self.proc.num_threads()
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            self.alive = False
+            return False
+        except psutil.AccessDenied:
+            return True
+        cpu = cpu_times.user + cpu_times.system
+        if self._last_cpu is not None and now > self._last_cpu[0]:
+            # Percent of one core, like psutil's cpu_percent
+            self.cpu_percent = max(0.0, (cpu - self._last_cpu[1]) / (now - self._last_cpu[0]) * 100)
+            self.memory_delta_mb = memory_mb - self.memory_mb
+        self._last_cpu = (now, cpu)
+        self.memory_mb = memory_mb
+        self.peak_memory_mb = max(self.peak_memory_mb, memory_mb)
+        self.num_threads = num_threads
+        self.samples += 1
+        return True
+
+    def __repr__(self):
+        return (f"TrackedProcess({self.name}, pid={self.pid}, {self.memory_mb:.1f} MB, "
+                f"{self.cpu_percent:.0f}% CPU, exe={self.exe})")
+
+
+class ProcessSubscription:
+    """
+    New processes whose executable is under a folder, passed to a callback or queued for get() and drain().
+    """
+
+    def __init__(self, tracker, path, callback=None):
+        """
+        Args:
+            tracker: ProcessTracker the subscription belongs to
+            path: Folder the executables must be under, or None for every new process
+            callback: Optional callable receiving each TrackedProcess on the tracker thread
+        """
+        self.tracker = tracker
+        self.path = path
+        self.callback = callback
+        self.processes = []
+        self._prefix = os.path.join(_normalize_path(path), '') if path else None
+        self._queue = queue.Queue()
+
+    def covers(self, process):
+        """True if the process belongs to this subscription"""
+        if self._prefix is None:
+            return True
+        return bool(process.exe) and _normalize_path(process.exe).startswith(self._prefix)
+
+    def _deliver(self, process):
+        self.processes.append(process)
+        if self.callback is None:
+            self._queue.put(process)
+            return
+        try:
+            self.callback(process)
+        except Exception as e:
+            logger.error(f"Process event callback for {self.path} failed: {str(e)}")
+
+    def get(self, timeout=None):
+        """
+        Take the next new process, waiting up to timeout seconds.
+
+        Returns:
+            TrackedProcess, or None if nothing started in time
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Take every queued process without waiting"""
+        processes = []
+        while True:
+            try:
+                processes.append(self._queue.get_nowait())
+            except queue.Empty:
+                return processes
+
+    def alive(self):
+        """Every process delivered so far that is still running"""
+        return [process for process in self.processes if process.alive]
+
+    def close(self):
+        """Stop receiving processes"""
+        self.tracker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ProcessTreeSubscription(ProcessSubscription):
+    """
+    New processes descending from a parent, passed to a callback or queued for get() and drain().
+    Descendants that exit stay in the tree, so the children of a launcher that handed
+    off to the game and quit are still followed.
+    """
+
+    def __init__(self, tracker, root_pid, root_create_time=None, callback=None):
+        """
+        Args:
+            tracker: ProcessTracker the subscription belongs to
+            root_pid: PID of the parent to follow
+            root_create_time: Creation time of the parent, to tell it from a later process reusing its PID
+            callback: Optional callable receiving each TrackedProcess on the tracker thread
+        """
+        super().__init__(tracker, None, callback)
+        self.root_pid = root_pid
+        # pid -> create_time of every process of the tree, running or not
+        self._members = {root_pid: root_create_time}
+
+    def covers(self, process):
+        """True if the process was started by a member of the tree"""
+        if process.ppid not in self._members:
+            return False
+        parent_create_time = self._members[process.ppid]
+        if parent_create_time is None:
+            return True
+        # The parent's PID may have been reused since the member exited
+        return parent_create_time <= process.create_time
+
+    def _deliver(self, process):
+        self._members[process.pid] = process.create_time
+        super()._deliver(process)
+
+
+class ProcessTracker:
+    """
+    Table of the running processes keyed by (pid, create_time), updated incrementally
+    from psutil's process list.
+    """
+
+    def __init__(self, interval=0.5):
+        """
+        Args:
+            interval: Seconds between updates of the background thread
+        """
+        self.interval = interval
+        # (pid, create_time) -> TrackedProcess
+        self._processes = {}
+        # pid -> the TrackedProcess currently running under it
+        self._by_pid = {}
+        self._subscriptions = []
+        # Processes delivered to a subscription: their CPU and memory are sampled every update
+        self._sampled = {}
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._primed = False
+
+    def start(self):
+        """Start the background thread (no-op if already running)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="ProcessTracker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.update()
+            except Exception as e:
+                logger.debug(f"Process table update failed: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def _open(self, proc, create_time, now):
+        try:
+            with proc.oneshot():
+                name = proc.name()
+                ppid = proc.ppid()
+                try:
+                    exe = proc.exe() or None
+                except (psutil.AccessDenied, psutil.ZombieProcess, OSError):
+                    exe = None
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return None
+        return TrackedProcess(proc, create_time, name, exe, ppid, now)
+
+    def update(self):
+        """
+        Bring the table up to date: forget exited processes, open the new ones,
+        deliver them to the subscriptions and sample the subscribed processes.
+
+        Returns:
+            list: Processes that appeared since the previous update
+        """
+        with self._lock:
+            now = time.time()
+            # process_iter() re-checks the create_time of the PIDs it has seen before,
+            # so a PID reused since the previous update comes back as a new key
+            running = {}
+            for proc in psutil.process_iter():
+                try:
+                    running[(proc.pid, proc.create_time())] = proc
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    continue
+            for key in set(self._processes) - set(running):
+                self._forget(self._processes[key])
+            new = []
+            for key in set(running) - set(self._processes):
+                process = self._open(running[key], key[1], now)
+                if process is not None:
+                    self._processes[key] = process
+                    self._by_pid[process.pid] = process
+                    new.append(process)
+            # Processes running when tracking started are not "new"
+            if not self._primed:
+                self._primed = True
+                logger.info(f"Process tracker started with {len(self._processes)} running processes")
+                return []
+            new.sort(key=lambda process: process.create_time)
+            for process in new:
+                for subscription in self._subscriptions:
+                    if subscription.covers(process):
+                        self._sampled[process.key] = process
+                        process.sample(now)
+                        subscription._deliver(process)
+            for key, process in list(self._sampled.items()):
+                if process.first_seen == now:
+                    continue
+                if process.sample(now) and process.proc.is_running():
+                    continue
+                # Exited (or a zombie): the next update drops it from the table once it leaves the process list
+                process.alive = False
+                del self._sampled[key]
+            return new
+
+    def _forget(self, process):
+        """Drop an exited process from the table"""
+        process.alive = False
+        self._sampled.pop(process.key, None)
+        if self._processes.get(process.key) is process:
+            del self._processes[process.key]
+        if self._by_pid.get(process.pid) is process:
+            del self._by_pid[process.pid]
+
+    def subscribe(self, path=None, callback=None):
+        """
+        Report processes started from now on whose executable is under a folder.
+        Starts the background thread if needed; the running processes are recorded
+        before this returns, so anything launched afterwards counts as new.
+
+        Args:
+            path: Folder the executables must be under, or None for every new process
+            callback: Optional callable receiving each TrackedProcess on the tracker thread;
+                      without one, processes are queued for get() and drain()
+
+        Returns:
+            ProcessSubscription: The subscription (close it when done)
+        """
+        subscription = ProcessSubscription(self, path, callback)
+        with self._lock:
+            self.update()
+            self._subscriptions.append(subscription)
+        self.start()
+        logger.info(f"Watching for new processes under {path or 'any folder'}")
+        return subscription
+
+    def follow(self, pid, include_existing=True, callback=None):
+        """
+        Report the processes of a parent's tree: everything it starts from now on, and
+        everything those start in turn. Starts the background thread if needed.
+
+        Args:
+            pid: PID of the parent (e.g. a process just launched, or steam.exe)
+            include_existing: Deliver the parent itself and its running descendants right away
+                              (for a process just launched); otherwise only processes started from now on
+            callback: Optional callable receiving each TrackedProcess on the tracker thread;
+                      without one, processes are queued for get() and drain()
+
+        Returns:
+            ProcessTreeSubscription: The subscription (close it when done)
+        """
+        with self._lock:
+            self.update()
+            root = self._by_pid.get(pid)
+            subscription = ProcessTreeSubscription(self, pid, root.create_time if root else None, callback)
+            if include_existing and root is not None:
+                now = time.time()
+                pending, queued = [root], {root.key}
+                while pending:
+                    process = pending.pop(0)
+                    self._sampled[process.key] = process
+                    process.sample(now)
+                    subscription._deliver(process)
+                    for child in self._processes.values():
+                        if child.key not in queued and subscription.covers(child):
+                            queued.add(child.key)
+                            pending.append(child)
+            self._subscriptions.append(subscription)
+        self.start()
+        logger.info(f"Following the processes started by PID {pid}")
+        return subscription
+
+    def find(self, *names):
+        """
+        The earliest started running process with one of the names (case-insensitive).
+
+        Returns:
+            TrackedProcess, or None
+        """
+        wanted = {name.lower() for name in names}
+        with self._lock:
+            if not self._primed:
+                self.update()
+            matches = [process for process in self._processes.values() if process.alive and process.name.lower() in wanted]
+        return min(matches, key=lambda process: process.create_time, default=None)
+
+    def unsubscribe(self, subscription):
+        """Stop delivering to a subscription"""
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            keep = {process.key for other in self._subscriptions for process in other.processes}
+            for key in [key for key in self._sampled if key not in keep]:
+                del self._sampled[key]
+
+    def get(self, pid):
+        """The tracked process currently running under a PID, or None"""
+        with self._lock:
+            return self._by_pid.get(pid)
+
+    def processes(self):
+        """Every tracked process"""
+        with self._lock:
+            return list(self._processes.values())
+
+    def children(self, pid):
+        """Tracked processes whose parent is the PID"""
+        with self._lock:
+            parent = self._by_pid.get(pid)
+            return [process for process in self._processes.values()
+                    if process.ppid == pid and (parent is None or process.create_time >= parent.create_time)]
+
+
+# Global tracker storage
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_process_tracker(config):
+    """
+    Get the process-wide process tracker.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        ProcessTracker: The tracker
+    """
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            tracker_config = config.get('process_tracker') or {}
+            _tracker = ProcessTracker(tracker_config.get('interval', 0.5))
+    return _tracker
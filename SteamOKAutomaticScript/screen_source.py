@@ -0,0 +1,228 @@
+"""
+Screen sources for the SteamOKAutomaticScript.
+Detection reads frames from a screen source instead of calling pyautogui directly:
+the live source grabs the real screen through a capture backend (see
+capture_backends.py), the replay source plays back a recorded
+session (e.g. a screenshots/<Game>_<ts>/ folder) so the detection paths can be
+benchmarked and profiled offline.
+"""
+import os
+import re
+import time
+import logging
+import threading
+
+import yaml
+import numpy as np
+from PIL import Image
+
+# The live-only modules (capture_backends, window_utils) are imported by the live
+# source itself: they need a display, and the replay source must work without one
+
+# Get logger
+logger = logging.getLogger()
+
+# Base directory that relative replay paths are resolved against
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Debug screenshots are saved as <type>_<HHMMSS>.png
+SCREENSHOT_TIME_PATTERN = re.compile(r'_(\d{2})(\d{2})(\d{2})$')
+
+# Global source storage
+_source = None
+_source_lock = threading.Lock()
+
+
+class LiveScreenSource:
+    """
+    Grabs frames from the real screen through a capture backend.
+    """
+    name = 'live'
+
+    def __init__(self, backend=None):
+        """
+        Args:
+            backend: Capture backend instance (defaults to the best available one)
+        """
+        if backend is None:
+            from capture_backends import create_capture_backend
+            backend = create_capture_backend()
+        self.backend = backend
+
+    def grab(self, region=None):
+        """
+        Capture the screen.
+
+        Args:
+            region: Optional (left, top, width, height) to capture instead of the whole screen
+
+        Returns:
+            numpy.ndarray: RGB frame of the captured area
+        """
+        return self.backend.grab(region)
+
+    def window_region(self, title):
+        """Screen rectangle of a window, or None if it is not visible"""
+        from window_utils import get_window_region
+        return get_window_region(title)
+
+
+class ReplayScreenSource:
+    """
+    Plays back a directory of PNG frames on a timeline.
+    The timeline comes from a timing script if given, otherwise from the HHMMSS
+    suffix of debug screenshot names (falling back to file modification times).
+    """
+    name = 'replay'
+
+    def __init__(self, directory, script=None, speed=1.0, loop=False, windows=None):
+        """
+        Args:
+            directory: Folder holding the recorded PNG frames
+            script: Optional YAML/JSON timing script: a list of {frame, at} entries,
+                    where at is the second (from replay start) the frame appears
+            speed: Playback speed multiplier
+            loop: Restart from the first frame after the last one instead of holding it
+            windows: Optional window title -> [left, top, width, height] in the recorded
+                     frames; windows not listed are searched on the whole frame
+        """
+        if not os.path.isabs(directory):
+            directory = os.path.join(BASE_DIR, directory)
+        self.directory = directory
+        self.speed = speed
+        self.loop = loop
+        self.windows = windows or {}
+        self.timeline = self._load_script(script) if script else self._timeline_from_files()
+        if not self.timeline:
+            raise ValueError(f"No frames to replay in {directory}")
+        self._images = {}
+        self._start_time = None
+        logger.info(f"Replaying {len(self.timeline)} frames from {directory} "
+                    f"({self.timeline[-1][0]:.1f}s at {speed}x)")
+
+    def _load_script(self, script):
+        if not os.path.isabs(script):
+            script = os.path.join(self.directory, script)
+        with open(script, 'r', encoding='utf-8') as f:
+            entries = yaml.safe_load(f) or []
+        timeline = [(float(entry['at']), os.path.join(self.directory, entry['frame'])) for entry in entries]
+        return sorted(timeline, key=lambda item: item[0])
+
+    def _timeline_from_files(self):
+        frames = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.lower().endswith('.png'):
+                continue
+            path = os.path.join(self.directory, file_name)
+            match = SCREENSHOT_TIME_PATTERN.search(os.path.splitext(file_name)[0])
+            if match:
+                hours, minutes, seconds = (int(part) for part in match.groups())
+                timestamp = hours * 3600 + minutes * 60 + seconds
+            else:
+                timestamp = os.path.getmtime(path)
+            frames.append((timestamp, path))
+        frames.sort()
+        if not frames:
+            return []
+        first = frames[0][0]
+        return [(timestamp - first, path) for timestamp, path in frames]
+
+    def restart(self):
+        """Start the playback clock again from the first frame"""
+        self._start_time = time.time()
+
+    @property
+    def elapsed(self):
+        """Seconds of the recording played back so far"""
+        if self._start_time is None:
+            self.restart()
+        elapsed = (time.time() - self._start_time) * self.speed
+        duration = self.timeline[-1][0]
+        if self.loop and duration > 0:
+            elapsed %= duration
+        return elapsed
+
+    @property
+    def finished(self):
+        """True once the last frame is showing (never for a looping replay)"""
+        return not self.loop and self.elapsed >= self.timeline[-1][0]
+
+    def current_path(self):
+        """Path of the frame showing at the current playback time"""
+        elapsed = self.elapsed
+        current = self.timeline[0][1]
+        for at, path in self.timeline:
+            if at > elapsed:
+                break
+            current = path
+        return current
+
+    def window_region(self, title):
+        """Recorded rectangle of a window, or None to search the whole frame"""
+        region = self.windows.get(title)
+        return tuple(region) if region else None
+
+    def _decode(self, path):
+        if path not in self._images:
+            with Image.open(path) as img:
+                self._images[path] = np.asarray(img.convert('RGB'))
+        return self._images[path]
+
+    def grab(self, region=None):
+        """
+        Return the recorded frame for the current playback time.
+
+        Args:
+            region: Optional (left, top, width, height) to cut out of the frame
+
+        Returns:
+            numpy.ndarray: RGB frame of the requested area
+        """
+        frame = self._decode(self.current_path())
+        if region is None:
+            return frame
+        left, top, width, height = region
+        return frame[top:top + height, left:left + width]
+
+
+def create_screen_source(config):
+    """
+    Create the screen source selected in the configuration.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        The screen source instance
+    """
+    source_config = config.get('screen_source') or {}
+    backend = source_config.get('backend', 'live')
+    if backend == 'replay':
+        replay_config = source_config.get('replay') or {}
+        return ReplayScreenSource(
+            replay_config['directory'],
+            script=replay_config.get('script'),
+            speed=replay_config.get('speed', 1.0),
+            loop=replay_config.get('loop', False),
+            windows=replay_config.get('windows')
+        )
+    from capture_backends import create_capture_backend
+    live_config = source_config.get('live') or {}
+    return LiveScreenSource(create_capture_backend(live_config.get('capture_backend', 'auto'), live_config.get('display')))
+
+
+def get_screen_source(config):
+    """
+    Get the process-wide screen source, creating it from the configuration if needed.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        The shared screen source
+    """
+    global _source
+    with _source_lock:
+        if _source is None:
+            _source = create_screen_source(config)
+    return _source
@@ -0,0 +1,556 @@
+"""
+Steam manifest reading for the SteamOKAutomaticScript.
+Parses Valve's text KeyValues format (appmanifest_<appid>.acf,
+libraryfolders.vdf) into an index of every installed app across the Steam
+libraries, and tracks the appmanifest of a running installation: StateFlags
+plus the byte counters give exact progress and completion. Files are only
+re-parsed when their modification time changes.
+"""
+import os
+import re
+import time
+import logging
+import threading
+
+from tree_scanner import RACY_MTIME_SECONDS
+
+# Get logger
+logger = logging.getLogger()
+
+# AppState StateFlags bits (EAppState)
+STATE_UPDATE_REQUIRED = 2
+STATE_FULLY_INSTALLED = 4
+STATE_UPDATE_RUNNING = 256
+STATE_UPDATE_PAUSED = 512
+STATE_UPDATE_STARTED = 1024
+STATE_DOWNLOADING = 1048576
+STATE_STAGING = 2097152
+STATE_COMMITTING = 4194304
+
+# Steam's own tools and runtimes that show up as apps but are never games
+STEAM_TOOL_APPIDS = {
+    '228980',   # Steamworks Common Redistributables
+    '250820',   # SteamVR
+    '1070560',  # Steam Linux Runtime
+    '1391110',  # Steam Linux Runtime - Soldier
+    '1628350',  # Steam Linux Runtime - Sniper
+}
+
+_TOKEN_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])|//[^\n]*|([^\s{}"]+)')
+_ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', '"': '"'}
+
+
+def _unescape(text):
+    return re.sub(r'\\(.)', lambda match: _ESCAPES.get(match.group(1), match.group(0)), text)
+
+
+def parse_vdf(text):
+    """
+    Parse Valve KeyValues text into nested dictionaries.
+
+    Args:
+        text: File contents
+
+    Returns:
+        dict: Keys map to strings or nested dicts; a repeated key keeps its last value
+    """
+    root = {}
+    stack = [root]
+    key = None
+    for match in _TOKEN_PATTERN.finditer(text):
+        quoted, brace, bare = match.groups()
+        if brace == '{':
+            section = {}
+            if key is not None:
+                stack[-1][key] = section
+                key = None
+            stack.append(section)
+        elif brace == '}':
+            if len(stack) > 1:
+                stack.pop()
+            key = None
+        elif quoted is not None or bare is not None:
+            token = _unescape(quoted) if quoted is not None else bare
+            if key is None:
+                key = token
+            else:
+                stack[-1][key] = token
+                key = None
+    return root
+
+
+def load_vdf(path):
+    """Parse a KeyValues file"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return parse_vdf(f.read())
+
+
+def _get(section, key, default=None):
+    """Case-insensitive key lookup (Steam is not consistent about key case)"""
+    if key in section:
+        return section[key]
+    lowered = key.lower()
+    for name, value in section.items():
+        if name.lower() == lowered:
+            return value
+    return default
+
+
+def _int(section, key):
+    try:
+        return int(_get(section, key, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class AppManifest:
+    """
+    The AppState of one appmanifest_<appid>.acf.
+    """
+
+    def __init__(self, path, state):
+        """
+        Args:
+            path: Path of the manifest file
+            state: Parsed AppState section
+        """
+        self.path = path
+        self.appid = _get(state, 'appid')
+        self.name = _get(state, 'name', '')
+        self.installdir = _get(state, 'installdir', '')
+        self.state_flags = _int(state, 'StateFlags')
+        self.bytes_to_download = _int(state, 'BytesToDownload')
+        self.bytes_downloaded = _int(state, 'BytesDownloaded')
+        self.bytes_to_stage = _int(state, 'BytesToStage')
+        self.bytes_staged = _int(state, 'BytesStaged')
+        self.size_on_disk = _int(state, 'SizeOnDisk')
+        self.last_updated = _int(state, 'LastUpdated')
+
+    @classmethod
+    def load(cls, path):
+        """Parse a manifest file"""
+        data = load_vdf(path)
+        return cls(path, _get(data, 'AppState', {}))
+
+    @property
+    def fully_installed(self):
+        """True when Steam considers the app installed with nothing left to update"""
+        busy = STATE_UPDATE_REQUIRED | STATE_UPDATE_RUNNING | STATE_UPDATE_STARTED | STATE_DOWNLOADING | STATE_STAGING | STATE_COMMITTING
+        return bool(self.state_flags & STATE_FULLY_INSTALLED) and not self.state_flags & busy
+
+    @property
+    def steamapps_dir(self):
+        """The steamapps folder (library) the manifest belongs to"""
+        return os.path.dirname(self.path)
+
+    @property
+    def install_path(self):
+        """steamapps/common/<installdir>, or None if the manifest has no installdir"""
+        return os.path.join(self.steamapps_dir, 'common', self.installdir) if self.installdir else None
+
+    @property
+    def download_path(self):
+        """steamapps/downloading/<appid>, where Steam stages the app's downloads"""
+        return os.path.join(self.steamapps_dir, 'downloading', str(self.appid))
+
+    @property
+    def updating(self):
+        """True while Steam is downloading, staging or committing an update of the app"""
+        busy = STATE_UPDATE_RUNNING | STATE_UPDATE_STARTED | STATE_DOWNLOADING | STATE_STAGING | STATE_COMMITTING
+        return bool(self.state_flags & busy)
+
+    @property
+    def paused(self):
+        return bool(self.state_flags & STATE_UPDATE_PAUSED)
+
+    @property
+    def progress(self):
+        """
+        Share of the update done, 0 to 1, or None if Steam has not sized it yet.
+        Downloading counts for the first part, staging (writing files) for the rest.
+        """
+        if self.fully_installed:
+            return 1.0
+        total = self.bytes_to_download + self.bytes_to_stage
+        if total <= 0:
+            return None
+        return min(1.0, (self.bytes_downloaded + self.bytes_staged) / total)
+
+    def __repr__(self):
+        return f"AppManifest({self.appid} {self.name!r}, flags={self.state_flags}, progress={self.progress})"
+
+
+class AppManifestWatcher:
+    """
+    Keeps the parsed state of one manifest, re-reading it only when its mtime or size changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = None
+        self._stamp = None
+        # Statistics
+        self.reads = 0
+
+    def stamp(self):
+        """(mtime, size) of the file, or None if it does not exist"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self):
+        """
+        Get the current manifest.
+
+        Returns:
+            AppManifest, or None if the file is gone. A manifest Steam is halfway
+            through writing keeps the last good state.
+        """
+        stamp = self.stamp()
+        if stamp is None:
+            self.manifest, self._stamp = None, None
+            return None
+        if stamp != self._stamp:
+            try:
+                manifest = AppManifest.load(self.path)
+            except OSError as e:
+                logger.debug(f"Could not read {self.path}: {str(e)}")
+                return self.manifest
+            self.reads += 1
+            if manifest.appid is not None:
+                self.manifest, self._stamp = manifest, stamp
+        return self.manifest
+
+    def bytes_written(self):
+        """Bytes downloaded plus bytes staged so far, or None without a manifest"""
+        manifest = self.poll()
+        if manifest is None:
+            return None
+        return manifest.bytes_downloaded + manifest.bytes_staged
+
+
+def _normalize_name(name):
+    return re.sub(r'[^0-9a-z]+', '', (name or '').lower())
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SteamLibraryIndex:
+    """
+    Every app installed across the Steam libraries, read from libraryfolders.vdf
+    and the appmanifest_*.acf files. refresh() only re-reads what changed: the
+    library list when libraryfolders.vdf changes, a library's manifest list when
+    its steamapps folder's mtime changes, and a manifest when its own mtime or
+    size changes - a few stat calls when nothing happened.
+    """
+
+    def __init__(self, steamapps_dir):
+        """
+        Args:
+            steamapps_dir: The steamapps folder of the Steam installation (holding libraryfolders.vdf)
+        """
+        self.steamapps_dir = os.path.normpath(steamapps_dir)
+        self.libraries = [self.steamapps_dir]
+        self._lock = threading.RLock()
+        self._libraryfolders_stamp = False
+        # steamapps folder -> (mtime_ns or None to force a re-list, manifest paths)
+        self._listings = {}
+        # Manifest path -> AppManifestWatcher
+        self._watchers = {}
+        # appid -> AppManifest
+        self._apps = {}
+
+    def _refresh_libraries(self):
+        path = os.path.join(self.steamapps_dir, 'libraryfolders.vdf')
+        stamp = _mtime_ns(path)
+        if stamp == self._libraryfolders_stamp:
+            return
+        self._libraryfolders_stamp = stamp
+        libraries = [self.steamapps_dir]
+        if stamp is not None:
+            try:
+                folders = _get(load_vdf(path), 'libraryfolders') or {}
+            except OSError as e:
+                logger.debug(f"Could not read {path}: {str(e)}")
+                folders = {}
+            for key, folder in folders.items():
+                # Current format: "0" { "path" "D:\\SteamLibrary" ... }; old format: "1" "D:\\SteamLibrary"
+                library = _get(folder, 'path') if isinstance(folder, dict) else (folder if key.isdigit() else None)
+                if not library:
+                    continue
+                steamapps = os.path.normpath(os.path.join(library, 'steamapps'))
+                if os.path.normcase(steamapps) not in {os.path.normcase(known) for known in libraries}:
+                    libraries.append(steamapps)
+        if libraries != self.libraries:
+            logger.info(f"Steam libraries: {', '.join(libraries)}")
+        self.libraries = libraries
+
+    def _manifests_in(self, library, now):
+        stamp = _mtime_ns(library)
+        cached = self._listings.get(library)
+        if cached is not None and cached[0] is not None and cached[0] == stamp:
+            return cached[1]
+        paths = []
+        if stamp is not None:
+            try:
+                with os.scandir(library) as entries:
+                    paths = [entry.path for entry in entries
+                             if entry.name.startswith('appmanifest_') and entry.name.endswith('.acf')]
+            except OSError as e:
+                logger.debug(f"Could not list {library}: {str(e)}")
+        # A manifest added within the same mtime tick as the listing would be missed: list again next time
+        racy = stamp is None or time.time() - stamp / 1e9 <= RACY_MTIME_SECONDS
+        self._listings[library] = (None if racy else stamp, paths)
+        return paths
+
+    def refresh(self):
+        """
+        Bring the index up to date with the files on disk.
+
+        Returns:
+            SteamLibraryIndex: self, so queries can be chained
+        """
+        with self._lock:
+            self._refresh_libraries()
+            now = time.time()
+            paths = [path for library in self.libraries for path in self._manifests_in(library, now)]
+            apps = {}
+            for path in paths:
+                manifest = self.watcher(path).poll()
+                if manifest is not None:
+                    apps[str(manifest.appid)] = manifest
+            for path in set(self._watchers) - set(paths):
+                del self._watchers[path]
+            for library in set(self._listings) - set(self.libraries):
+                del self._listings[library]
+            self._apps = apps
+        return self
+
+    def watcher(self, path):
+        """The AppManifestWatcher of a manifest, shared by everything reading it through the index"""
+        with self._lock:
+            if path not in self._watchers:
+                self._watchers[path] = AppManifestWatcher(path)
+            return self._watchers[path]
+
+    def manifest_paths(self):
+        """Paths of all manifests seen by the last refresh()"""
+        with self._lock:
+            return [path for library in self.libraries for path in (self._listings.get(library) or (None, []))[1]]
+
+    def apps(self):
+        """All installed apps (AppManifest) as of the last refresh()"""
+        return list(self._apps.values())
+
+    def get(self, appid):
+        """The AppManifest of an appid, or None"""
+        return self._apps.get(str(appid))
+
+    def find(self, name):
+        """
+        Look an app up by name or installdir (ignoring case, spaces and punctuation).
+
+        Returns:
+            AppManifest, or None
+        """
+        wanted = _normalize_name(name)
+        if not wanted:
+            return None
+        for manifest in self._apps.values():
+            if wanted in (_normalize_name(manifest.name), _normalize_name(manifest.installdir)):
+                return manifest
+        return None
+
+    def games(self):
+        """Installed apps that are not Steam's own tools and runtimes"""
+        return [manifest for manifest in self._apps.values() if str(manifest.appid) not in STEAM_TOOL_APPIDS]
+
+    def latest_installed(self):
+        """
+        The fully installed game Steam updated most recently.
+
+        Returns:
+            AppManifest, or None if no game is fully installed
+        """
+        installed = [manifest for manifest in self.games() if manifest.fully_installed and manifest.installdir]
+        return max(installed, key=lambda manifest: manifest.last_updated or 0, default=None)
+
+
+# Global library index storage
+_library_indexes = {}
+_library_indexes_lock = threading.Lock()
+
+
+def get_steam_library_index(steamapps_dir):
+    """
+    Get the process-wide library index of a Steam installation, created on first use.
+
+    Args:
+        steamapps_dir: The steamapps folder of the Steam installation
+
+    Returns:
+        SteamLibraryIndex: The shared index
+    """
+    key = os.path.normcase(os.path.normpath(steamapps_dir))
+    with _library_indexes_lock:
+        if key not in _library_indexes:
+            _library_indexes[key] = SteamLibraryIndex(steamapps_dir)
+        return _library_indexes[key]
+
+
+class SteamAppsMonitor:
+    """
+    Finds and tracks the appmanifest of the app being installed in the Steam libraries.
+    Call snapshot() right before starting an installation; afterwards current()
+    returns the manifest of the game by name, or else a manifest that appeared
+    since the snapshot or started updating after it. A manifest picked without a
+    name match is dropped again if its app never makes progress.
+    """
+
+    def __init__(self, steamapps_dir, library_index=None, reidentify_after=180):
+        """
+        Args:
+            steamapps_dir: The steamapps folder of the Steam installation
+            library_index: SteamLibraryIndex to read the manifests through (defaults to the shared one)
+            reidentify_after: Seconds a manifest picked without a name match may show
+                              no progress before another one is looked for
+        """
+        self.steamapps_dir = steamapps_dir
+        self.library_index = library_index or get_steam_library_index(steamapps_dir)
+        self.reidentify_after = reidentify_after
+        self._before = {}
+        self._installed_before = set()
+        # Manifest path -> stamp when it was dropped for making no progress
+        self._rejected = {}
+        self._target = None
+        # (progress counters, time they last changed) of a target picked without a name match
+        self._unconfirmed = None
+
+    def _manifest_paths(self):
+        return self.library_index.refresh().manifest_paths()
+
+    def _watcher(self, path):
+        return self.library_index.watcher(path)
+
+    def snapshot(self):
+        """Record the manifests that exist before the installation starts"""
+        self._target = None
+        self._unconfirmed = None
+        self._rejected = {}
+        self._before = {}
+        self._installed_before = set()
+        for path in self._manifest_paths():
+            watcher = self._watcher(path)
+            self._before[path] = watcher.stamp()
+            manifest = watcher.poll()
+            if manifest is not None and manifest.fully_installed:
+                self._installed_before.add(path)
+        logger.info(f"Found {len(self._before)} existing app manifests in {len(self.library_index.libraries)} Steam libraries")
+
+    def _identify(self, game_name):
+        """
+        Returns:
+            (manifest path, True if it matched by name), or (None, False)
+        """
+        wanted = _normalize_name(game_name)
+        new, changed = [], []
+        for path in self._manifest_paths():
+            watcher = self._watcher(path)
+            stamp = watcher.stamp()
+            if path in self._rejected and self._rejected[path] == stamp:
+                # Dropped for making no progress and not written since
+                continue
+            if path in self._before and stamp == self._before[path]:
+                # Untouched since the snapshot: only a name match can make it ours
+                if wanted and _normalize_name(getattr(watcher.poll(), 'name', '')) == wanted:
+                    return path, True
+                continue
+            manifest = watcher.poll()
+            if manifest is None:
+                continue
+            if wanted and _normalize_name(manifest.name) == wanted:
+                return path, True
+            if path not in self._before:
+                new.append((stamp, path))
+            elif path not in self._installed_before and manifest.updating:
+                # Steam rewrites other apps' manifests too: only one this update is running in counts
+                changed.append((stamp, path))
+        # Steam writes the manifest of a new install right away; an update rewrites an old one
+        for candidates in (new, changed):
+            if candidates:
+                return max(candidates)[1], False
+        return None, False
+
+    @staticmethod
+    def _counters(manifest):
+        if manifest is None:
+            return None
+        return (manifest.bytes_downloaded, manifest.bytes_staged, manifest.fully_installed)
+
+    def _check_progress(self, manifest):
+        """Drop a target picked without a name match once it has shown no progress for too long"""
+        counters = self._counters(manifest)
+        now = time.time()
+        if counters != self._unconfirmed[0]:
+            if self._unconfirmed[0] is not None and counters is not None:
+                # The app is moving: it is the one being installed
+                self._unconfirmed = None
+                return
+            self._unconfirmed = (counters, now)
+            return
+        if now - self._unconfirmed[1] < self.reidentify_after:
+            return
+        logger.warning(f"{os.path.basename(self._target)} made no progress for {self.reidentify_after}s, looking for another manifest")
+        self._rejected[self._target] = self._watcher(self._target).stamp()
+        self._target = None
+        self._unconfirmed = None
+
+    def current(self, game_name=None):
+        """
+        Get the manifest of the installation in progress.
+
+        Args:
+            game_name: Game being installed, matched against the manifests' name field
+
+        Returns:
+            AppManifest, or None if none can be attributed to the installation yet
+        """
+        if self._target is not None and self._unconfirmed is not None:
+            self._check_progress(self._watcher(self._target).poll())
+        if self._target is None:
+            self._target, by_name = self._identify(game_name)
+            if self._target is None:
+                return None
+            manifest = self._watcher(self._target).poll()
+            self._unconfirmed = None if by_name else (self._counters(manifest), time.time())
+            logger.info(f"Tracking installation through {os.path.basename(self._target)} ({manifest.name if manifest else '?'})")
+        return self._watcher(self._target).poll()
+
+    def wait_until_installed(self, timeout, interval=0.5):
+        """
+        Sleep until the tracked manifest reports the app fully installed or the timeout passes.
+        Only the file's stat is polled; it is parsed again only when it changed.
+
+        Returns:
+            bool: True if the installation completed
+        """
+        if self._target is None:
+            time.sleep(timeout)
+            return False
+        watcher = self._watcher(self._target)
+        deadline = time.time() + timeout
+        while True:
+            manifest = watcher.poll()
+            if manifest is not None and manifest.fully_installed:
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
@@ -0,0 +1,316 @@
+"""
+Template matching benchmark for the SteamOKAutomaticScript.
+Runs every matcher configuration against a labelled corpus of captured frames and
+reports match latency percentiles (per template and per all-template batch, the
+unit a locate_many poll pays for) plus precision/recall per template and per
+confidence level.
+
+Corpus layout: a folder of PNG frames (e.g. collected from screenshots/) with a
+labels.yaml next to them:
+
+    frames:
+      search_results_101530.png:
+        steamok_search_box: [812, 96]            # left, top (size from the template)
+        steamok_game_list: [640, 180, 1011, 42]  # or a full left, top, width, height box
+      install_101602.png: {}                     # no template visible
+
+Every template not listed for a frame is expected to be absent from it.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import logging
+import argparse
+
+import yaml
+import numpy as np
+from PIL import Image
+
+from config import get_config, load_config
+from logger import setup_logging
+from template_registry import load_template_registry
+from template_matcher import Box, create_matcher
+
+# Get logger
+logger = logging.getLogger()
+
+# Confidence levels currently used by the call sites
+DEFAULT_CONFIDENCES = [0.65, 0.7, 0.72, 0.8, 0.84, 0.88, 0.9]
+
+# Matcher configurations to compare: name -> image_detector overrides
+MATCHER_CONFIGURATIONS = {
+    'pyscreeze': {'engine': 'pyscreeze'},
+    'opencv': {'engine': 'opencv'},
+    'pyramid_0.5': {'engine': 'pyramid', 'pyramid': {'scale': 0.5}},
+    'pyramid_0.25': {'engine': 'pyramid', 'pyramid': {'scale': 0.25}},
+    'fft': {'engine': 'fft'},
+    'fft_gray': {'engine': 'fft', 'fft': {'colour': False}},
+    'process_pool': {'engine': 'process_pool', 'process_pool': {'engine': 'opencv'}},
+    'process_pool_pyramid': {'engine': 'process_pool', 'process_pool': {'engine': 'pyramid'}},
+}
+
+# A hit counts as correct if it overlaps the labelled box at least this much
+MIN_IOU = 0.5
+
+
+class LabelledFrame:
+    """
+    A corpus frame plus the boxes of the templates visible in it.
+    """
+
+    def __init__(self, path, labels):
+        """
+        Args:
+            path: Path of the PNG frame
+            labels: Template name -> [left, top] or [left, top, width, height]
+        """
+        self.path = path
+        self.name = os.path.basename(path)
+        self.labels = labels or {}
+        self._image = None
+
+    @property
+    def image(self):
+        """RGB frame array (decoded on first use)"""
+        if self._image is None:
+            with Image.open(self.path) as img:
+                self._image = np.asarray(img.convert('RGB'))
+        return self._image
+
+    def expected_box(self, template):
+        """Labelled box of a template in this frame, or None if it is absent"""
+        label = self.labels.get(template.name)
+        if not label:
+            return None
+        if len(label) == 2:
+            return Box(label[0], label[1], template.width, template.height)
+        return Box(*label)
+
+
+def load_corpus(directory):
+    """
+    Load a labelled corpus.
+
+    Args:
+        directory: Folder holding the frames and labels.yaml
+
+    Returns:
+        list: LabelledFrame objects, in file name order
+    """
+    with open(os.path.join(directory, 'labels.yaml'), 'r', encoding='utf-8') as f:
+        labels = (yaml.safe_load(f) or {}).get('frames') or {}
+    frames = [LabelledFrame(os.path.join(directory, name), labels[name]) for name in sorted(labels)]
+    logger.info(f"Loaded {len(frames)} labelled frames from {directory}")
+    return frames
+
+
+def box_iou(first, second):
+    """Intersection over union of two (left, top, width, height) boxes"""
+    left = max(first[0], second[0])
+    top = max(first[1], second[1])
+    right = min(first[0] + first[2], second[0] + second[2])
+    bottom = min(first[1] + first[3], second[1] + second[3])
+    if right <= left or bottom <= top:
+        return 0.0
+    intersection = (right - left) * (bottom - top)
+    return intersection / (first[2] * first[3] + second[2] * second[3] - intersection)
+
+
+def latency_summary(samples):
+    """
+    Summarise latency samples in seconds.
+
+    Returns:
+        dict: count, mean, p50, p90 and p99 in milliseconds
+    """
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples) * 1000
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        'count': len(samples),
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(p50), 3),
+        'p90': round(float(p90), 3),
+        'p99': round(float(p99), 3),
+    }
+
+
+def _rates(counts):
+    predicted = counts['tp'] + counts['fp']
+    expected = counts['tp'] + counts['fn']
+    counts['precision'] = round(counts['tp'] / predicted, 3) if predicted else None
+    counts['recall'] = round(counts['tp'] / expected, 3) if expected else None
+    return counts
+
+
+def benchmark_configuration(config, frames, templates, confidences):
+    """
+    Run one matcher configuration over the corpus.
+
+    Args:
+        config: Configuration dictionary the matcher is created from
+        frames: LabelledFrame list
+        templates: Templates to match
+        confidences: Confidence levels to evaluate
+
+    Returns:
+        dict: Latency summaries and per-template / per-confidence counts
+    """
+    matcher = create_matcher(config)
+    prepare_times = []
+    batch_times = []
+    match_times = []
+    template_times = {template.name: [] for template in templates}
+    counts = {
+        template.name: {confidence: {'tp': 0, 'fp': 0, 'fn': 0, 'tn': 0} for confidence in confidences}
+        for template in templates
+    }
+
+    for frame in frames:
+        start = time.perf_counter()
+        haystack = matcher.prepare(frame.image)
+        prepare_times.append(time.perf_counter() - start)
+
+        for confidence in confidences:
+            # One batch per frame and confidence, like a locate_many poll over all templates
+            if hasattr(matcher, 'match_many'):
+                start = time.perf_counter()
+                results = matcher.match_many(haystack, [(template, confidence, None) for template in templates])
+                elapsed = time.perf_counter() - start
+                batch_times.append(elapsed)
+                # Parallel engines only have an amortised per-template latency
+                elapsed_per_template = [elapsed / len(templates)] * len(templates)
+            else:
+                results = []
+                elapsed_per_template = []
+                for template in templates:
+                    start = time.perf_counter()
+                    results.append(matcher.match(haystack, template, confidence))
+                    elapsed_per_template.append(time.perf_counter() - start)
+                batch_times.append(sum(elapsed_per_template))
+
+            for template, result, elapsed in zip(templates, results, elapsed_per_template):
+                match_times.append(elapsed)
+                template_times[template.name].append(elapsed)
+
+                expected = frame.expected_box(template)
+                bucket = counts[template.name][confidence]
+                if result.found and expected is not None and box_iou(result.box, expected) >= MIN_IOU:
+                    bucket['tp'] += 1
+                elif result.found:
+                    # A hit on an absent template, or in the wrong place
+                    bucket['fp'] += 1
+                    if expected is not None:
+                        bucket['fn'] += 1
+                elif expected is not None:
+                    bucket['fn'] += 1
+                else:
+                    bucket['tn'] += 1
+
+    by_confidence = {}
+    for confidence in confidences:
+        total = {'tp': 0, 'fp': 0, 'fn': 0, 'tn': 0}
+        for template in templates:
+            for key in total:
+                total[key] += counts[template.name][confidence][key]
+        by_confidence[confidence] = _rates(total)
+
+    return {
+        'engine': getattr(matcher, 'name', type(matcher).__name__),
+        'prepare_latency_ms': latency_summary(prepare_times),
+        'match_latency_ms': latency_summary(match_times),
+        'batch_latency_ms': latency_summary(batch_times),
+        'by_confidence': by_confidence,
+        'templates': {
+            name: {
+                'latency_ms': latency_summary(template_times[name]),
+                'confidence': {confidence: _rates(bucket) for confidence, bucket in levels.items()},
+            }
+            for name, levels in counts.items()
+        },
+    }
+
+
+def run_benchmark(config, corpus_dir, configurations=None, confidences=None, template_names=None):
+    """
+    Benchmark the selected matcher configurations against a labelled corpus.
+
+    Args:
+        config: The loaded configuration dictionary
+        corpus_dir: Folder holding the frames and labels.yaml
+        configurations: Names from MATCHER_CONFIGURATIONS (defaults to all of them)
+        confidences: Confidence levels to evaluate (defaults to DEFAULT_CONFIDENCES)
+        template_names: Templates to benchmark (defaults to every loaded template)
+
+    Returns:
+        dict: Configuration name -> benchmark report
+    """
+    configurations = configurations or list(MATCHER_CONFIGURATIONS)
+    confidences = confidences or DEFAULT_CONFIDENCES
+    registry = load_template_registry(config)
+    templates = [registry.get(name) for name in template_names] if template_names else registry.templates()
+    frames = load_corpus(corpus_dir)
+
+    report = {}
+    for name in configurations:
+        configuration = copy.deepcopy(config)
+        configuration['image_detector'].update(copy.deepcopy(MATCHER_CONFIGURATIONS[name]))
+        logger.info(f"Benchmarking matcher configuration {name}")
+        report[name] = benchmark_configuration(configuration, frames, templates, confidences)
+    return report
+
+
+def print_report(report):
+    """Print a benchmark report as plain-text tables"""
+    for name, result in report.items():
+        latency = result['match_latency_ms']
+        print(f"\n=== {name} (engine: {result['engine']}) ===")
+        print(f"match latency ms: p50={latency.get('p50')} p90={latency.get('p90')} "
+              f"p99={latency.get('p99')} mean={latency.get('mean')} n={latency.get('count')}")
+        batch = result['batch_latency_ms']
+        print(f"all-template batch ms: p50={batch.get('p50')} p90={batch.get('p90')} p99={batch.get('p99')}")
+        print(f"frame prepare ms: p50={result['prepare_latency_ms'].get('p50')}")
+
+        confidences = list(result['by_confidence'])
+        print(f"{'template':<32}{'p50 ms':>8}  " + "  ".join(f"{confidence:>11}" for confidence in confidences))
+        rows = list(result['templates'].items()) + [('ALL', {'latency_ms': latency, 'confidence': result['by_confidence']})]
+        for template_name, stats in rows:
+            cells = []
+            for confidence in confidences:
+                bucket = stats['confidence'][confidence]
+                precision = '-' if bucket['precision'] is None else f"{bucket['precision']:.2f}"
+                recall = '-' if bucket['recall'] is None else f"{bucket['recall']:.2f}"
+                cells.append(f"{precision:>5}/{recall:<5}")
+            print(f"{template_name:<32}{stats['latency_ms'].get('p50', '-'):>8}  " + "  ".join(cells))
+    print("\ncells are precision/recall")
+
+
+def main():
+    """Command line entry point of the benchmark"""
+    parser = argparse.ArgumentParser(description='Benchmark template matchers on a labelled screenshot corpus')
+    parser.add_argument('corpus', help='Folder holding the labelled frames and labels.yaml')
+    parser.add_argument('--config', help='Path to custom configuration file')
+    parser.add_argument('--configurations', nargs='+', choices=list(MATCHER_CONFIGURATIONS),
+                        help='Matcher configurations to run (default: all)')
+    parser.add_argument('--confidences', nargs='+', type=float, help='Confidence levels to evaluate')
+    parser.add_argument('--templates', nargs='+', help='Template names to benchmark (default: all)')
+    parser.add_argument('--output', help='Write the full report to this JSON file')
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config else get_config()
+    setup_logging()
+
+    report = run_benchmark(config, args.corpus, args.configurations, args.confidences, args.templates)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Per-template confidence calibration for the SteamOKAutomaticScript.
+Replays a labelled corpus (same layout as template_benchmark.py), collects the
+match scores of every template where it is present and where it is absent, and
+picks the threshold that best separates the two. The results are written to
+image_detector.templates.<name>.confidence in config.yaml, keeping its comments.
+"""
+import os
+import re
+import sys
+import logging
+import argparse
+
+import numpy as np
+
+from config import get_config, load_config
+from logger import setup_logging
+from template_registry import CV2_AVAILABLE, load_template_registry
+from template_matcher import FFTMatcher, OpenCVMatcher
+from template_benchmark import load_corpus
+
+# Get logger
+logger = logging.getLogger()
+
+# Default configuration file written by the calibration
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'config.yaml')
+
+# Pixels around a labelled box searched for the template's true score
+LABEL_PADDING = 4
+
+# Confidence passed to the matcher so it always reports a score and never a hit
+SCORE_ONLY = 1.01
+
+
+def collect_scores(frames, templates, matcher):
+    """
+    Collect true-match and false-match scores of each template.
+
+    Args:
+        frames: LabelledFrame list
+        templates: Templates to calibrate
+        matcher: Engine reporting TM_CCOEFF_NORMED scores (OpenCVMatcher or FFTMatcher)
+
+    Returns:
+        dict: template name -> (true scores, false scores)
+    """
+    scores = {template.name: ([], []) for template in templates}
+    for frame in frames:
+        haystack = matcher.prepare(frame.image)
+        height, width = haystack.shape[:2]
+        for template in templates:
+            true_scores, false_scores = scores[template.name]
+            expected = frame.expected_box(template)
+            if expected is None:
+                # Best score anywhere in a frame without the template is a false match
+                result = matcher.match(haystack, template, SCORE_ONLY)
+                if result.score is not None:
+                    false_scores.append(result.score)
+                continue
+            left = max(0, expected[0] - LABEL_PADDING)
+            top = max(0, expected[1] - LABEL_PADDING)
+            region = (
+                left, top,
+                min(width, expected[0] + expected[2] + LABEL_PADDING) - left,
+                min(height, expected[1] + expected[3] + LABEL_PADDING) - top
+            )
+            result = matcher.match(haystack, template, SCORE_ONLY, region)
+            if result.score is not None:
+                true_scores.append(result.score)
+    return scores
+
+
+def choose_threshold(true_scores, false_scores, margin=0.05, bounds=(0.5, 0.99)):
+    """
+    Pick the threshold that best separates true from false match scores.
+    If the two sets do not overlap, the threshold sits in the middle of the gap;
+    otherwise it maximises true-positive rate minus false-positive rate.
+
+    Args:
+        true_scores: Scores at labelled locations
+        false_scores: Best scores in frames without the template
+        margin: Distance kept below the weakest true score when there are no false scores
+        bounds: (lowest, highest) threshold allowed
+
+    Returns:
+        (threshold, separation) where separation is the score gap (negative if the sets overlap),
+        or (None, None) without any true scores
+    """
+    if not true_scores:
+        return None, None
+    true_scores = np.asarray(true_scores)
+    lowest_true = float(true_scores.min())
+    if not false_scores:
+        threshold, separation = lowest_true - margin, None
+    else:
+        false_scores = np.asarray(false_scores)
+        highest_false = float(false_scores.max())
+        separation = lowest_true - highest_false
+        if separation > 0:
+            threshold = (lowest_true + highest_false) / 2
+        else:
+            candidates = np.unique(np.concatenate([true_scores, false_scores]))
+            true_rate = (true_scores[None, :] >= candidates[:, None]).mean(axis=1)
+            false_rate = (false_scores[None, :] >= candidates[:, None]).mean(axis=1)
+            threshold = float(candidates[np.argmax(true_rate - false_rate)])
+    return round(min(max(threshold, bounds[0]), bounds[1]), 3), separation
+
+
+def calibrate(config, corpus_dir, template_names=None, margin=0.05):
+    """
+    Compute a confidence threshold for every template with labelled examples.
+
+    Args:
+        config: The loaded configuration dictionary
+        corpus_dir: Folder holding the frames and labels.yaml
+        template_names: Templates to calibrate (defaults to every loaded template)
+        margin: See choose_threshold()
+
+    Returns:
+        dict: template name -> {confidence, separation, true, false}
+    """
+    # Both engines report the same scores; the FFT one keeps calibration working without OpenCV
+    matcher = OpenCVMatcher() if CV2_AVAILABLE else FFTMatcher(config)
+    registry = load_template_registry(config)
+    templates = [registry.get(name) for name in template_names] if template_names else registry.templates()
+    frames = load_corpus(corpus_dir)
+
+    results = {}
+    for name, (true_scores, false_scores) in collect_scores(frames, templates, matcher).items():
+        threshold, separation = choose_threshold(true_scores, false_scores, margin)
+        if threshold is None:
+            logger.info(f"No labelled examples of {name}, keeping its current confidence")
+            continue
+        results[name] = {
+            'confidence': threshold,
+            'separation': separation,
+            'true': len(true_scores),
+            'false': len(false_scores),
+        }
+        if separation is not None and separation <= 0:
+            logger.warning(f"{name}: true and false match scores overlap by {-separation:.3f}")
+    return results
+
+
+def write_template_confidences(config_path, thresholds):
+    """
+    Write confidences into image_detector.templates of a YAML configuration file.
+    Edits the file line by line so comments and layout are preserved.
+
+    Args:
+        config_path: Path of the config.yaml to update
+        thresholds: template name -> confidence
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+
+    def block_end(start, indent):
+        # First line after start that is indented at most `indent` (ignoring blanks and comments)
+        index = start + 1
+        while index < len(lines):
+            stripped = lines[index].strip()
+            if stripped and not stripped.startswith('#') and len(lines[index]) - len(lines[index].lstrip()) <= indent:
+                break
+            index += 1
+        return index
+
+    def find_key(key, start, end, indent):
+        pattern = re.compile(rf"^ {{{indent}}}{re.escape(key)}:")
+        for index in range(start, end):
+            if pattern.match(lines[index]):
+                return index
+        return None
+
+    detector_index = find_key('image_detector', 0, len(lines), 0)
+    if detector_index is None:
+        raise ValueError(f"No image_detector section in {config_path}")
+    detector_end = block_end(detector_index, 0)
+    templates_index = find_key('templates', detector_index + 1, detector_end, 2)
+    if templates_index is None:
+        lines.insert(detector_end, "  templates:")
+        templates_index = detector_end
+
+    for name, confidence in thresholds.items():
+        templates_end = block_end(templates_index, 2)
+        template_index = find_key(name, templates_index + 1, templates_end, 4)
+        if template_index is None:
+            # Append a new template block after the last non-blank template line
+            insert_at = templates_end
+            while insert_at > templates_index + 1 and not lines[insert_at - 1].strip():
+                insert_at -= 1
+            lines[insert_at:insert_at] = [f"    {name}:", f"      confidence: {confidence}"]
+            continue
+        template_end = block_end(template_index, 4)
+        confidence_index = find_key('confidence', template_index + 1, template_end, 6)
+        if confidence_index is None:
+            lines.insert(template_index + 1, f"      confidence: {confidence}")
+        else:
+            lines[confidence_index] = f"      confidence: {confidence}"
+
+    with open(config_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    logger.info(f"Wrote {len(thresholds)} template confidences to {config_path}")
+
+
+def main():
+    """Command line entry point of the calibration"""
+    parser = argparse.ArgumentParser(description='Calibrate per-template confidence thresholds on a labelled corpus')
+    parser.add_argument('corpus', help='Folder holding the labelled frames and labels.yaml')
+    parser.add_argument('--config', help='Path to custom configuration file (also the file that is updated)')
+    parser.add_argument('--templates', nargs='+', help='Template names to calibrate (default: all)')
+    parser.add_argument('--margin', type=float, default=0.05,
+                        help='Distance below the weakest true score when a template has no negative examples')
+    parser.add_argument('--dry-run', action='store_true', help='Print the thresholds without writing the configuration')
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config else get_config()
+    setup_logging()
+
+    results = calibrate(config, args.corpus, args.templates, args.margin)
+    current = config['image_detector'].get('templates') or {}
+    default_confidence = config['image_detector']['default_confidence']
+    print(f"{'template':<32}{'current':>8}{'new':>8}{'gap':>8}{'true':>6}{'false':>6}")
+    for name, result in sorted(results.items()):
+        before = (current.get(name) or {}).get('confidence', default_confidence)
+        separation = '-' if result['separation'] is None else f"{result['separation']:.3f}"
+        print(f"{name:<32}{before:>8}{result['confidence']:>8}{separation:>8}{result['true']:>6}{result['false']:>6}")
+
+    if not args.dry_run and results:
+        write_template_confidences(args.config or DEFAULT_CONFIG_PATH,
+                                   {name: result['confidence'] for name, result in results.items()})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,430 @@
+"""
+Template matching engines for the SteamOKAutomaticScript.
+Each engine matches a decoded template against an already captured frame and
+reports both the hit box and the match score.
+"""
+import math
+import logging
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from template_registry import CV2_AVAILABLE
+
+if CV2_AVAILABLE:
+    import cv2
+
+# Get logger
+logger = logging.getLogger()
+
+# Luminance weights of the B, G and R channels, for the grayscale FFT mode
+GRAY_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+# Cached template spectra per FFTMatcher before the cache is reset
+MAX_TEMPLATE_SPECTRA = 256
+
+# Same layout as pyscreeze's Box, so pg.center() works on it unchanged
+Box = namedtuple('Box', ['left', 'top', 'width', 'height'])
+
+
+class MatchResult(namedtuple('MatchResult', ['name', 'box', 'score'])):
+    """
+    Result of matching one template against a frame.
+    box is None on a miss; score is None if the engine cannot report one.
+    """
+    __slots__ = ()
+
+    @property
+    def found(self):
+        return self.box is not None
+
+    def __bool__(self):
+        return self.found
+
+
+class MatchResults(dict):
+    """
+    Results of one locate_many poll, keyed by the requested template.
+    changed is False when nothing in the searched areas changed since the previous poll.
+    """
+    changed = True
+
+
+class OpenCVMatcher:
+    """
+    Normalised cross-correlation via cv2.matchTemplate (the same method pyautogui uses).
+    """
+    name = 'opencv'
+
+    def prepare(self, frame):
+        """Convert an RGB frame to the BGR layout OpenCV works on"""
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+
+    def match(self, haystack, template, confidence, region=None):
+        """
+        Match a template against a prepared frame.
+
+        Args:
+            haystack: Frame returned by prepare()
+            template: Template from the registry
+            confidence: Minimum score for a hit
+            region: Optional (left, top, width, height) of the frame to search
+
+        Returns:
+            MatchResult: Hit box in frame coordinates and the best score
+        """
+        left, top = 0, 0
+        if region is not None:
+            left, top, width, height = region
+            haystack = haystack[top:top + height, left:left + width]
+        if template.height > haystack.shape[0] or template.width > haystack.shape[1]:
+            return MatchResult(template.name, None, None)
+        result = cv2.matchTemplate(haystack, template.bgr, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score >= confidence:
+            return MatchResult(template.name, Box(left + x, top + y, template.width, template.height), score)
+        return MatchResult(template.name, None, score)
+
+
+class PyramidFrame:
+    """
+    A prepared frame plus its lazily built downscaled levels.
+    """
+
+    def __init__(self, full):
+        self.full = full
+        self._levels = {}
+
+    def level(self, scale):
+        """Return the frame downscaled by the given factor (cached per frame)"""
+        if scale not in self._levels:
+            self._levels[scale] = cv2.resize(self.full, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return self._levels[scale]
+
+
+class PyramidMatcher(OpenCVMatcher):
+    """
+    Coarse-to-fine matching: search a downscaled level of the frame first, then
+    refine only the neighbourhoods of the best coarse candidates at full resolution.
+    Boxes and scores are reported at full resolution, exactly like OpenCVMatcher.
+    """
+    name = 'pyramid'
+
+    def __init__(self, config):
+        detector_config = config['image_detector']
+        pyramid_config = detector_config.get('pyramid') or {}
+        self.default_scale = pyramid_config.get('scale', 0.5)
+        self.coarse_margin = pyramid_config.get('coarse_margin', 0.15)
+        self.max_candidates = pyramid_config.get('max_candidates', 3)
+        self.min_template_size = pyramid_config.get('min_template_size', 12)
+        self.template_config = detector_config.get('templates') or {}
+
+    def prepare(self, frame):
+        return PyramidFrame(super().prepare(frame))
+
+    def scale_for(self, template):
+        """Coarse level scale of a template (per-template pyramid_scale overrides the default)"""
+        settings = self.template_config.get(template.name) or {}
+        return settings.get('pyramid_scale', self.default_scale)
+
+    def _template_level(self, template, scale):
+        if scale not in template.levels:
+            template.levels[scale] = cv2.resize(template.bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return template.levels[scale]
+
+    def match(self, haystack, template, confidence, region=None):
+        full = haystack.full
+        scale = self.scale_for(template)
+        if scale >= 1:
+            return super().match(full, template, confidence, region)
+
+        coarse_template = self._template_level(template, scale)
+        if min(coarse_template.shape[:2]) < self.min_template_size:
+            # Too few pixels left to match reliably at the coarse level
+            return super().match(full, template, confidence, region)
+
+        left, top, width, height = region or (0, 0, full.shape[1], full.shape[0])
+        coarse_left, coarse_top = int(left * scale), int(top * scale)
+        coarse = haystack.level(scale)[
+            coarse_top:int((top + height) * scale),
+            coarse_left:int((left + width) * scale)
+        ]
+        if coarse_template.shape[0] > coarse.shape[0] or coarse_template.shape[1] > coarse.shape[1]:
+            return super().match(full, template, confidence, region)
+
+        result = cv2.matchTemplate(coarse, coarse_template, cv2.TM_CCOEFF_NORMED)
+        candidates, _ = _find_peaks(
+            result, confidence - self.coarse_margin, self.max_candidates,
+            coarse_template.shape[1], coarse_template.shape[0]
+        )
+        if not candidates:
+            # Nothing passes at the coarse level: still refine the best coarse peak,
+            # so the score of a miss is a full-resolution one like OpenCVMatcher's
+            candidates = [cv2.minMaxLoc(result)[3]]
+
+        # Refine each candidate in a small full-resolution window around it
+        pad = int(math.ceil(1 / scale)) + 1
+        best = None
+        for x, y in candidates:
+            refine_left = max(left, int((coarse_left + x) / scale) - pad)
+            refine_top = max(top, int((coarse_top + y) / scale) - pad)
+            refine_right = min(left + width, refine_left + template.width + 2 * pad)
+            refine_bottom = min(top + height, refine_top + template.height + 2 * pad)
+            candidate = super().match(
+                full, template, confidence,
+                (refine_left, refine_top, refine_right - refine_left, refine_bottom - refine_top)
+            )
+            if best is None or (candidate.score or 0) > (best.score or 0):
+                best = candidate
+        return best
+
+
+def _find_peaks(result, threshold, limit, suppress_width, suppress_height):
+    """
+    Find up to `limit` local maxima above threshold in a matchTemplate result,
+    suppressing a template-sized neighbourhood around each one.
+
+    Returns:
+        (list of (x, y) peaks, best score in the result)
+    """
+    result = result.copy()
+    _, best_score, _, _ = cv2.minMaxLoc(result)
+    peaks = []
+    for _ in range(limit):
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score < threshold:
+            break
+        peaks.append((x, y))
+        result[max(0, y - suppress_height):y + suppress_height + 1,
+               max(0, x - suppress_width):x + suppress_width + 1] = -1
+    return peaks, best_score
+
+
+def _fast_length(n):
+    """Smallest FFT-friendly length (only prime factors 2, 3 and 5) of at least n"""
+    while True:
+        remainder = n
+        for prime in (2, 3, 5):
+            while remainder % prime == 0:
+                remainder //= prime
+        if remainder == 1:
+            return n
+        n += 1
+
+
+def _window_sums(integral, height, width):
+    """Sums over every height x width window, from a zero-padded summed-area table"""
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+class FFTFrame:
+    """
+    A prepared frame for FFTMatcher: the BGR pixels plus, per searched area, the
+    summed-area tables and spectrum shared by every template searched there.
+    """
+
+    def __init__(self, bgr, colour=True):
+        self.bgr = bgr
+        self.shape = bgr.shape
+        self.colour = colour
+        self._statistics = {}
+        self._spectra = {}
+
+    def pixels(self, area):
+        """Float channels of an area: (height, width, 3) in colour mode, (height, width, 1) in gray"""
+        left, top, width, height = area
+        pixels = self.bgr[top:top + height, left:left + width]
+        if self.colour:
+            return pixels.astype(np.float32)
+        return (pixels @ GRAY_WEIGHTS)[:, :, None]
+
+    def statistics(self, area):
+        """
+        Summed-area tables of an area (cached per frame).
+
+        Returns:
+            (per-channel sums, sums of squares over all channels), each zero-padded
+            by one row and column so window sums need no bounds checks
+        """
+        if area not in self._statistics:
+            pixels = self.pixels(area).astype(np.float64)
+            sums = np.zeros((pixels.shape[0] + 1, pixels.shape[1] + 1, pixels.shape[2]))
+            sums[1:, 1:] = pixels.cumsum(axis=0).cumsum(axis=1)
+            squares = np.zeros(sums.shape[:2])
+            squares[1:, 1:] = (pixels * pixels).sum(axis=2).cumsum(axis=0).cumsum(axis=1)
+            self._statistics[area] = (sums, squares)
+        return self._statistics[area]
+
+    def spectrum(self, area, size):
+        """Per-channel real FFT of an area, zero-padded to size (cached per frame)"""
+        key = (area, size)
+        if key not in self._spectra:
+            self._spectra[key] = np.fft.rfft2(self.pixels(area), s=size, axes=(0, 1))
+        return self._spectra[key]
+
+
+class FFTMatcher:
+    """
+    First-party normalised cross-correlation in NumPy, independent of OpenCV.
+    Scores are the same TM_CCOEFF_NORMED values OpenCVMatcher reports (in colour
+    mode), so configured confidences carry over. Window means and variances come
+    from summed-area tables; placements whose variance is below min_std are
+    rejected up front and the correlation is only computed, via FFT, over the
+    bounding box of the placements left.
+    """
+    name = 'fft'
+
+    def __init__(self, config):
+        fft_config = config['image_detector'].get('fft') or {}
+        self.colour = fft_config.get('colour', True)
+        self.min_variance = fft_config.get('min_std', 2.0) ** 2
+        self._templates = {}
+        self._spectra = {}
+        # Statistics
+        self.searches = 0
+        self.rejected = 0
+
+    def prepare(self, frame):
+        """Wrap an RGB frame (channels reversed, so templates are compared in their BGR layout)"""
+        return FFTFrame(frame[:, :, ::-1], self.colour)
+
+    def _template_data(self, template):
+        # Zero-mean template channels and their sum of squares
+        if template.path not in self._templates:
+            pixels = template.bgr.astype(np.float32) if self.colour else (template.bgr @ GRAY_WEIGHTS)[:, :, None]
+            centred = pixels - pixels.mean(axis=(0, 1))
+            self._templates[template.path] = (centred, float((centred.astype(np.float64) ** 2).sum()))
+        return self._templates[template.path]
+
+    def _template_spectrum(self, template, size):
+        key = (template.path, size)
+        if key not in self._spectra:
+            if len(self._spectra) > MAX_TEMPLATE_SPECTRA:
+                self._spectra.clear()
+            centred, _ = self._template_data(template)
+            self._spectra[key] = np.conj(np.fft.rfft2(centred, s=size, axes=(0, 1)))
+        return self._spectra[key]
+
+    def match(self, haystack, template, confidence, region=None):
+        """
+        Match a template against a prepared frame.
+
+        Args:
+            haystack: FFTFrame returned by prepare()
+            template: Template from the registry
+            confidence: Minimum score for a hit
+            region: Optional (left, top, width, height) of the frame to search
+
+        Returns:
+            MatchResult: Hit box in frame coordinates and the best score
+        """
+        left, top, width, height = region or (0, 0, haystack.shape[1], haystack.shape[0])
+        if template.height > height or template.width > width:
+            return MatchResult(template.name, None, None)
+        centred, template_energy = self._template_data(template)
+        if template_energy <= 0:
+            logger.debug(f"{template.name} is a flat colour, NCC cannot score it")
+            return MatchResult(template.name, None, None)
+        self.searches += 1
+
+        # Per-placement energy of the frame window around its own mean, from the summed-area tables
+        pixel_count = template.width * template.height
+        sums, squares = haystack.statistics((left, top, width, height))
+        window_sums = _window_sums(sums, template.height, template.width)
+        window_energy = _window_sums(squares, template.height, template.width) - (window_sums ** 2).sum(axis=2) / pixel_count
+        valid = window_energy >= self.min_variance * pixel_count * centred.shape[2]
+        if not valid.any():
+            # Flat everywhere: nothing template-like can be there
+            self.rejected += 1
+            return MatchResult(template.name, None, 0.0)
+
+        # Correlate only over the bounding box of the placements that passed
+        rows = np.flatnonzero(valid.any(axis=1))
+        cols = np.flatnonzero(valid.any(axis=0))
+        row_first, row_last, col_first, col_last = rows[0], rows[-1], cols[0], cols[-1]
+        area = (
+            left + int(col_first), top + int(row_first),
+            int(col_last - col_first) + template.width, int(row_last - row_first) + template.height
+        )
+        size = (_fast_length(area[3]), _fast_length(area[2]))
+        spectrum = (haystack.spectrum(area, size) * self._template_spectrum(template, size)).sum(axis=2)
+        correlation = np.fft.irfft2(spectrum, s=size)[:row_last - row_first + 1, :col_last - col_first + 1]
+
+        energy = window_energy[row_first:row_last + 1, col_first:col_last + 1]
+        scores = np.full(correlation.shape, -1.0)
+        passed = valid[row_first:row_last + 1, col_first:col_last + 1]
+        scores[passed] = correlation[passed] / np.sqrt(template_energy * energy[passed])
+        y, x = np.unravel_index(np.argmax(scores), scores.shape)
+        score = float(min(scores[y, x], 1.0))
+        if score >= confidence:
+            box = Box(area[0] + int(x), area[1] + int(y), template.width, template.height)
+            return MatchResult(template.name, box, score)
+        return MatchResult(template.name, None, score)
+
+
+class PyscreezeMatcher:
+    """
+    pyautogui's own matcher, kept as a benchmark baseline.
+    Without OpenCV it is a Pillow matcher that ignores confidence; it never reports a score.
+    """
+    name = 'pyscreeze'
+
+    def prepare(self, frame):
+        return Image.fromarray(frame)
+
+    def match(self, haystack, template, confidence, region=None):
+        # Imported here: pyautogui needs a display, the other engines do not
+        import pyautogui as pg
+        left, top = 0, 0
+        if region is not None:
+            left, top, width, height = region
+            haystack = haystack.crop((left, top, left + width, top + height))
+        try:
+            location = pg.locate(template.needle, haystack, confidence=confidence)
+        except pg.ImageNotFoundException:
+            location = None
+        if location:
+            return MatchResult(template.name, Box(left + location[0], top + location[1], location[2], location[3]), None)
+        return MatchResult(template.name, None, None)
+
+
+def match_batch(matcher, haystack, jobs):
+    """
+    Run several (template, confidence, region) jobs against one prepared frame.
+    Engines that can match in parallel provide match_many(); the rest run in order.
+
+    Returns:
+        list: MatchResult per job, in order
+    """
+    if hasattr(matcher, 'match_many'):
+        return matcher.match_many(haystack, jobs)
+    return [matcher.match(haystack, template, confidence, region) for template, confidence, region in jobs]
+
+
+def create_matcher(config):
+    """
+    Create the matching engine selected in the configuration.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        The matcher instance
+    """
+    engine = config['image_detector'].get('engine', 'opencv')
+    if engine == 'pyscreeze':
+        return PyscreezeMatcher()
+    if engine == 'fft':
+        return FFTMatcher(config)
+    if CV2_AVAILABLE:
+        if engine == 'process_pool':
+            # Imported lazily: the pool module imports this one
+            from match_pool import ProcessPoolMatcher
+            return ProcessPoolMatcher(config)
+        if engine == 'pyramid':
+            return PyramidMatcher(config)
+        return OpenCVMatcher()
+    logger.warning(f"OpenCV not available, using the NumPy FFT matcher instead of the {engine} engine")
+    return FFTMatcher(config)
@@ -0,0 +1,269 @@
+"""
+Precompiled template pack for the SteamOKAutomaticScript.
+A build step compiles every template referenced in the configuration into one
+file holding the RGB, BGR and grayscale arrays, pyramid levels, colour
+signatures and transparency masks. At startup the pack is memory-mapped once
+and the registry hands out read-only views into it, so every component and
+every matching worker process shares the same pages instead of decoding PNGs.
+
+File layout: 8-byte magic, little-endian uint64 header length, JSON header,
+then the raw arrays, each aligned to ALIGNMENT bytes. Array offsets in the
+header are relative to the start of the data section.
+"""
+import os
+import sys
+import json
+import struct
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from config import get_config, load_config
+from logger import setup_logging
+from colour_prefilter import ColourPrefilter, ColourSignature
+
+# OpenCV is optional - without it the pack is built without pyramid levels
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+# Get logger
+logger = logging.getLogger()
+
+# Base directory that relative pack and template paths are resolved against
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PACK_MAGIC = b'SOKTPK01'
+ALIGNMENT = 64
+
+# Global pack storage, keyed by pack path
+_packs = {}
+_pack_lock = threading.Lock()
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def pack_path(config):
+    """Absolute path of the configured template pack"""
+    pack_config = config['image_detector'].get('template_pack') or {}
+    path = pack_config.get('path', 'cache/templates.pack')
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    return path
+
+
+def _relative_source(path):
+    """Template path as stored in the pack: relative to the script directory where possible"""
+    try:
+        relative = os.path.relpath(path, BASE_DIR)
+    except ValueError:
+        # Different drive on Windows
+        return path
+    return path if relative.startswith('..') else relative.replace(os.sep, '/')
+
+
+def _pyramid_scales(config, template):
+    """Coarse level scales the pyramid matcher will ask for this template"""
+    detector_config = config['image_detector']
+    default_scale = (detector_config.get('pyramid') or {}).get('scale', 0.5)
+    settings = (detector_config.get('templates') or {}).get(template.name) or {}
+    scale = settings.get('pyramid_scale', default_scale)
+    return [scale] if scale < 1 else []
+
+
+def build_template_pack(config, output_path=None):
+    """
+    Compile every template referenced in the configuration into a pack file.
+
+    Args:
+        config: The loaded configuration dictionary
+        output_path: Pack file to write (defaults to image_detector.template_pack.path)
+
+    Returns:
+        str: Path of the written pack
+    """
+    # Imported here because the registry itself loads templates from packs
+    from template_registry import TemplateRegistry
+
+    output_path = output_path or pack_path(config)
+    registry = TemplateRegistry()
+    registry.load_from_config(config)
+    prefilter = ColourPrefilter(config)
+
+    arrays = []
+    offset = 0
+
+    def add(array):
+        nonlocal offset
+        array = np.ascontiguousarray(array)
+        offset = _align(offset)
+        description = {'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.str}
+        arrays.append((offset, array))
+        offset += array.nbytes
+        return description
+
+    entries = []
+    for template in registry.templates():
+        stat = os.stat(template.path)
+        entry = {
+            'path': _relative_source(template.path),
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'arrays': {'rgb': add(template.rgb), 'bgr': add(template.bgr), 'gray': add(template.gray)},
+            'levels': {},
+            'signatures': [],
+        }
+        if template.mask is not None:
+            entry['arrays']['mask'] = add(template.mask)
+        if CV2_AVAILABLE:
+            for scale in _pyramid_scales(config, template):
+                level = cv2.resize(template.bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                entry['levels'][repr(scale)] = add(level)
+        signature = prefilter.signature(template)
+        entry['signatures'].append({
+            'key': [prefilter.bits, prefilter.min_fraction, prefilter.max_colours],
+            'bins': add(signature.bins),
+            'counts': add(signature.counts),
+        })
+        entries.append(entry)
+
+    header = json.dumps({'version': 1, 'templates': entries}).encode('utf-8')
+    data_start = _align(len(PACK_MAGIC) + 8 + len(header))
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(PACK_MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for array_offset, array in arrays:
+            f.seek(data_start + array_offset)
+            f.write(array.tobytes())
+    os.replace(temp_path, output_path)
+    logger.info(f"Wrote template pack with {len(entries)} templates ({data_start + offset} bytes) to {output_path}")
+    return output_path
+
+
+class TemplatePack:
+    """
+    A memory-mapped template pack. Arrays handed out are read-only views of the mapping.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Path of the pack file
+        """
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._map[:len(PACK_MAGIC)]) != PACK_MAGIC:
+            raise ValueError(f"{path} is not a template pack")
+        (header_length,) = struct.unpack('<Q', bytes(self._map[len(PACK_MAGIC):len(PACK_MAGIC) + 8]))
+        header_start = len(PACK_MAGIC) + 8
+        header = json.loads(bytes(self._map[header_start:header_start + header_length]).decode('utf-8'))
+        self.data_start = _align(header_start + header_length)
+        self.entries = {}
+        for entry in header['templates']:
+            source = entry['path']
+            if not os.path.isabs(source):
+                source = os.path.join(BASE_DIR, source)
+            self.entries[os.path.normcase(os.path.abspath(source))] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _array(self, description):
+        dtype = np.dtype(description['dtype'])
+        start = self.data_start + description['offset']
+        count = int(np.prod(description['shape'])) if description['shape'] else 1
+        return self._map[start:start + count * dtype.itemsize].view(dtype).reshape(description['shape'])
+
+    def arrays(self, path):
+        """
+        Get the precompiled arrays of a template.
+
+        Args:
+            path: Normalised absolute path of the template PNG
+
+        Returns:
+            dict: rgb, bgr, gray, mask, levels and signatures, or None if the template
+                  is not in the pack or its PNG changed after the pack was built
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime != entry['mtime'] or stat.st_size != entry['size']:
+                logger.warning(f"{path} changed since the template pack was built, decoding it instead")
+                return None
+        except OSError:
+            # The PNG is gone but the pack still has its pixels
+            pass
+        arrays = entry['arrays']
+        return {
+            'rgb': self._array(arrays['rgb']),
+            'bgr': self._array(arrays['bgr']),
+            'gray': self._array(arrays['gray']),
+            'mask': self._array(arrays['mask']) if 'mask' in arrays else None,
+            'levels': {float(scale): self._array(level) for scale, level in entry['levels'].items()},
+            'signatures': {
+                tuple(signature['key']): ColourSignature(self._array(signature['bins']), self._array(signature['counts']), signature['key'][0])
+                for signature in entry['signatures']
+            },
+        }
+
+
+def get_template_pack(config):
+    """
+    Get the process-wide mapping of the configured template pack.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        TemplatePack, or None if packs are disabled or the file does not exist or is unreadable
+    """
+    pack_config = config['image_detector'].get('template_pack') or {}
+    if not pack_config.get('enabled', False):
+        return None
+    path = pack_path(config)
+    with _pack_lock:
+        if path not in _packs:
+            pack = None
+            if os.path.exists(path):
+                try:
+                    pack = TemplatePack(path)
+                    logger.info(f"Mapped template pack {path} ({len(pack)} templates)")
+                except Exception as e:
+                    logger.error(f"Failed to map template pack {path}: {str(e)}")
+            else:
+                logger.info(f"No template pack at {path}, decoding templates from PNG (build one with template_pack.py)")
+            _packs[path] = pack
+    return _packs[path]
+
+
+def main():
+    """Command line entry point of the pack build"""
+    parser = argparse.ArgumentParser(description='Compile every configured template into a memory-mappable pack')
+    parser.add_argument('--config', help='Path to custom configuration file')
+    parser.add_argument('--output', help='Pack file to write (default: image_detector.template_pack.path)')
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config else get_config()
+    setup_logging()
+
+    path = build_template_pack(config, args.output)
+    pack = TemplatePack(path)
+    print(f"Template pack {path}: {len(pack)} templates, {os.path.getsize(path)} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
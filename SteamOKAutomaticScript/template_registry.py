@@ -0,0 +1,257 @@
+"""
+Process-wide registry of decoded template images for the SteamOKAutomaticScript.
+Every PNG referenced in the configuration is decoded once and kept in memory,
+so the poll loops never have to re-open files from the png/ folder. With a
+template pack built (see template_pack.py) the arrays are views into its
+memory mapping instead, and nothing is decoded at all.
+"""
+import os
+import logging
+import threading
+
+import numpy as np
+from PIL import Image
+
+from config import get_config
+from template_pack import get_template_pack
+
+# OpenCV is optional - matching falls back to the NumPy FFT engine without it
+try:
+    import cv2  # noqa: F401
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+# Get logger
+logger = logging.getLogger()
+
+# Base directory that relative image paths in the configuration are resolved against
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Global registry storage
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def template_name(image_path):
+    """Return the lookup name of a template (file name without extension)"""
+    return os.path.splitext(os.path.basename(image_path))[0]
+
+
+def _normalize_path(image_path):
+    if not os.path.isabs(image_path):
+        image_path = os.path.join(BASE_DIR, image_path)
+    return os.path.normcase(os.path.abspath(image_path))
+
+
+class Template:
+    """
+    A decoded template image.
+    Holds the colour and grayscale pixel arrays the matcher works on.
+    """
+
+    def __init__(self, path, image):
+        """
+        Args:
+            path: Absolute path of the source PNG
+            image: Decoded PIL image
+        """
+        self.path = path
+        self.name = template_name(path)
+        self._image = image.convert('RGB')
+        self.rgb = np.asarray(self._image)
+        # OpenCV works on BGR arrays
+        self.bgr = np.ascontiguousarray(self.rgb[:, :, ::-1])
+        self.gray = np.asarray(self._image.convert('L'))
+        # Opaque pixels of templates with transparency, None if fully opaque
+        self.mask = None
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            opaque = np.asarray(image.convert('RGBA'))[:, :, 3] > 0
+            if not opaque.all():
+                self.mask = opaque
+        self.width = self._image.width
+        self.height = self._image.height
+        # Downscaled copies keyed by scale, filled lazily by the pyramid matcher
+        self.levels = {}
+        # Colour signatures keyed by quantisation settings, filled lazily by the colour prefilter
+        self.signatures = {}
+
+    @classmethod
+    def from_arrays(cls, path, rgb, bgr, gray, mask=None, levels=None, signatures=None):
+        """
+        Build a template from precompiled arrays (e.g. views into a template pack).
+
+        Args:
+            path: Absolute path of the source PNG
+            rgb, bgr, gray: Pixel arrays
+            mask: Opaque pixel mask, or None
+            levels: Precomputed pyramid levels keyed by scale
+            signatures: Precomputed colour signatures keyed by quantisation settings
+
+        Returns:
+            Template: The template
+        """
+        template = cls.__new__(cls)
+        template.path = path
+        template.name = template_name(path)
+        template._image = None
+        template.rgb = rgb
+        template.bgr = bgr
+        template.gray = gray
+        template.mask = mask
+        template.height, template.width = gray.shape[:2]
+        template.levels = dict(levels or {})
+        template.signatures = dict(signatures or {})
+        return template
+
+    @property
+    def image(self):
+        """Template as a PIL image (created on first use for packed templates)"""
+        if self._image is None:
+            self._image = Image.fromarray(np.asarray(self.rgb))
+        return self._image
+
+    @property
+    def needle(self):
+        """Template in the format pyautogui's matcher consumes without any conversion"""
+        return self.bgr if CV2_AVAILABLE else self.image
+
+    def __repr__(self):
+        return f"Template({self.name}, {self.width}x{self.height})"
+
+
+class TemplateRegistry:
+    """
+    Holds every decoded template, keyed by both normalised path and name.
+    """
+
+    def __init__(self, pack=None):
+        """
+        Args:
+            pack: Optional TemplatePack the arrays are taken from before decoding PNGs
+        """
+        self._by_path = {}
+        self._by_name = {}
+        self._lock = threading.Lock()
+        self.pack = pack
+
+    def __len__(self):
+        return len(self._by_path)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def _lookup(self, key):
+        template = self._by_name.get(key)
+        if template is None:
+            template = self._by_path.get(_normalize_path(key))
+        return template
+
+    def load(self, image_path):
+        """
+        Decode an image and add it to the registry (no-op if already loaded).
+
+        Args:
+            image_path: Absolute path, or path relative to the script directory
+
+        Returns:
+            Template: The decoded template
+        """
+        path = _normalize_path(image_path)
+        with self._lock:
+            template = self._by_path.get(path)
+            if template is None:
+                arrays = self.pack.arrays(path) if self.pack is not None else None
+                if arrays is not None:
+                    template = Template.from_arrays(path, **arrays)
+                else:
+                    with Image.open(path) as img:
+                        template = Template(path, img)
+                self._by_path[path] = template
+                self._by_name.setdefault(template.name, template)
+                source = 'template pack' if arrays is not None else path
+                logger.debug(f"Loaded template {template.name} ({template.width}x{template.height}) from {source}")
+        return template
+
+    def load_from_config(self, config):
+        """
+        Decode every PNG referenced anywhere in the configuration.
+
+        Args:
+            config: The loaded configuration dictionary
+
+        Returns:
+            int: Number of templates loaded
+        """
+        for image_path in _collect_image_paths(config):
+            try:
+                self.load(image_path)
+            except Exception as e:
+                logger.error(f"Failed to load template {image_path}: {str(e)}")
+        logger.info(f"Template registry loaded {len(self)} templates")
+        return len(self)
+
+    def get(self, key):
+        """
+        Get a template by name or path.
+        Unknown paths are decoded once and cached, so callers never hit the disk twice.
+
+        Args:
+            key: Template name (e.g. 'steam_install_button') or image path
+
+        Returns:
+            Template: The decoded template
+        """
+        template = self._lookup(key)
+        if template is None:
+            logger.warning(f"Template {key} was not preloaded, loading it now")
+            template = self.load(key)
+        return template
+
+    def templates(self):
+        """Return all loaded templates"""
+        return list(self._by_path.values())
+
+
+def _collect_image_paths(node):
+    """Recursively collect every .png path in a configuration section"""
+    paths = []
+    if isinstance(node, dict):
+        for value in node.values():
+            paths.extend(_collect_image_paths(value))
+    elif isinstance(node, list):
+        for value in node:
+            paths.extend(_collect_image_paths(value))
+    elif isinstance(node, str) and node.lower().endswith('.png'):
+        paths.append(node)
+    return paths
+
+
+def load_template_registry(config):
+    """
+    Build the process-wide registry from the configuration.
+
+    Args:
+        config: The loaded configuration dictionary
+
+    Returns:
+        TemplateRegistry: The loaded registry
+    """
+    global _registry
+    with _registry_lock:
+        registry = TemplateRegistry(get_template_pack(config))
+        registry.load_from_config(config)
+        _registry = registry
+    return _registry
+
+
+def get_template_registry():
+    """
+    Get the process-wide registry. Loads it from the default configuration if needed.
+
+    Returns:
+        TemplateRegistry: The loaded registry
+    """
+    if _registry is None:
+        return load_template_registry(get_config())
+    return _registry
@@ -0,0 +1,128 @@
+"""
+Incremental directory tree scanner for the SteamOKAutomaticScript.
+Remembers the modification time and subdirectories of every directory it has
+listed. A directory's mtime only changes when entries are added, removed or
+renamed in it, so on later scans unchanged directories are just stat'ed and
+their cached subdirectories followed; only changed directories are listed
+again. Watching a download folder of tens of thousands of files for a marker
+(e.g. an EasyAntiCheat folder) then costs one stat per directory per cycle
+instead of a full os.walk.
+"""
+import os
+import time
+import logging
+
+# Get logger
+logger = logging.getLogger()
+
+# Directories modified more recently than this are listed again on the next scan:
+# an entry added within the same mtime tick as the listing would otherwise be missed
+RACY_MTIME_SECONDS = 2
+
+
+class ScanResult:
+    """
+    Outcome of one scan of a tree.
+    """
+
+    def __init__(self, root, found, examined, listed, elapsed):
+        """
+        Args:
+            root: Scanned directory
+            found: Matching path -> match label, for everything currently in the tree
+            examined: Directory entries stat'ed or listed during this scan
+            listed: Directories whose contents had to be listed again
+            elapsed: Seconds the scan took
+        """
+        self.root = root
+        self.found = found
+        self.examined = examined
+        self.listed = listed
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return (f"ScanResult({self.root}, found={len(self.found)}, examined={self.examined}, "
+                f"listed={self.listed}, {self.elapsed * 1000:.1f}ms)")
+
+
+class IncrementalTreeScanner:
+    """
+    Finds entries matching a predicate in directory trees, re-listing only directories that changed.
+    """
+
+    def __init__(self, match):
+        """
+        Args:
+            match: Callable (name, is_dir) returning a truthy label for entries to report
+        """
+        self.match = match
+        # Directory path -> (mtime_ns or None to force a re-list, subdirectory names, matches in it)
+        self._dirs = {}
+
+    def reset(self):
+        """Forget all cached directory state"""
+        self._dirs.clear()
+
+    def _list(self, path):
+        subdirs, matches, examined = [], {}, 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                examined += 1
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    subdirs.append(entry.name)
+                label = self.match(entry.name, is_dir)
+                if label:
+                    matches[entry.path] = label
+        return tuple(subdirs), matches, examined
+
+    def scan(self, root):
+        """
+        Scan a tree, listing only directories that changed since the previous scan.
+
+        Args:
+            root: Directory to scan
+
+        Returns:
+            ScanResult: Every match currently in the tree and the cost of the scan
+        """
+        start = time.perf_counter()
+        now = time.time()
+        found = {}
+        examined = listed = 0
+        visited = set()
+        pending = [root]
+        while pending:
+            path = pending.pop()
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed since its parent was listed
+                continue
+            examined += 1
+            visited.add(path)
+            cached = self._dirs.get(path)
+            if cached is not None and cached[0] is not None and cached[0] == stat.st_mtime_ns:
+                subdirs, matches = cached[1], cached[2]
+            else:
+                try:
+                    subdirs, matches, count = self._list(path)
+                except OSError as e:
+                    logger.debug(f"Could not list {path}: {str(e)}")
+                    continue
+                examined += count
+                listed += 1
+                mtime = stat.st_mtime_ns if now - stat.st_mtime > RACY_MTIME_SECONDS else None
+                self._dirs[path] = (mtime, subdirs, matches)
+            found.update(matches)
+            pending.extend(os.path.join(path, name) for name in subdirs)
+
+        # Drop directories of this tree that no longer exist
+        prefix = os.path.join(root, '')
+        for path in [path for path in self._dirs if (path == root or path.startswith(prefix)) and path not in visited]:
+            del self._dirs[path]
+
+        return ScanResult(root, found, examined, listed, time.perf_counter() - start)
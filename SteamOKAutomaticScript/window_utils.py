@@ -5,7 +5,6 @@ Provides functions for activating, finding, and interacting with windows.
 import time
 import logging
 import pyautogui as pg
-import pygetwindow as gw
 
 # Get logger
 logger = logging.getLogger()
@@ -46,6 +45,73 @@ def activate_window_by_typing(window_name, sleep_config):
         logger.error(f"Error activating {window_name} window using Win+Type method: {str(e)}")
         return False
 
+# Window tag for templates that live in whichever game window is in front
+GAME_WINDOW = "game"
+
+# Launcher/tool windows that are never the game window
+NON_GAME_WINDOWS = ("Steam", "SteamOK", "DLL Injector")
+
+def find_window(window_title):
+    """
+    Find a window by title, preferring an exact title match over a partial one
+    
+    Args:
+        window_title: The title of the window to find, or GAME_WINDOW for the
+                      active game window
+                     
+    Returns:
+        The pygetwindow window, or None if no window matches
+    """
+    # Imported here: pygetwindow refuses to import anywhere but Windows, and the
+    # modules driving the install and the injection must import on a Linux rig too
+    import pygetwindow as gw
+
+    if window_title == GAME_WINDOW:
+        window = gw.getActiveWindow()
+        if window and window.title and window.title not in NON_GAME_WINDOWS:
+            return window
+        return None
+        
+    windows = gw.getWindowsWithTitle(window_title)
+    if not windows:
+        return None
+        
+    # Find window with exact title match if possible
+    for window in windows:
+        if window.title == window_title:
+            return window
+            
+    # If no exact match, use the first one with a partial match
+    return windows[0]
+
+def get_window_region(window_title):
+    """
+    Get the on-screen rectangle of a window, clipped to the screen
+    
+    Args:
+        window_title: The title of the window, or GAME_WINDOW
+                     
+    Returns:
+        (left, top, width, height) tuple, or None if the window is missing or minimized
+    """
+    try:
+        window = find_window(window_title)
+        if window is None or window.isMinimized:
+            return None
+            
+        screen_width, screen_height = pg.size()
+        left = max(window.left, 0)
+        top = max(window.top, 0)
+        right = min(window.left + window.width, screen_width)
+        bottom = min(window.top + window.height, screen_height)
+        if right <= left or bottom <= top:
+            return None
+        return (left, top, right - left, bottom - top)
+        
+    except Exception as e:
+        logger.debug(f"Failed to get window region - {window_title}: {str(e)}")
+        return None
+
 def activate_window_by_title(window_title, sleep_config):
     """
     Activate a window by finding it based on its title and bringing it to front
@@ -61,22 +127,11 @@ def activate_window_by_title(window_title, sleep_config):
 
         
     try:
-        windows = gw.getWindowsWithTitle(window_title)
-        if not windows:
+        target_window = find_window(window_title)
+        if target_window is None:
             logger.error(f"No windows found with title: {window_title}")
             return False
             
-        # Find window with exact title match if possible
-        target_window = None
-        for window in windows:
-            if window.title == window_title:
-                target_window = window
-                break
-                
-        # If no exact match, use the first one with a partial match
-        if target_window is None:
-            target_window = windows[0]
-            
         # Restore the window if minimized
         target_window.restore()
         time.sleep(sleep_config.get('window_activate_delay'))